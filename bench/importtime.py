@@ -0,0 +1,172 @@
+"""
+Measure how long each ``hadmin`` subcommand spends importing modules.
+
+Every subcommand runs for real in a fresh interpreter under ``python -X
+importtime``, from a scratch directory holding a copy of the test Hadoop
+configuration, so it imports what a real invocation does. Commands that talk
+to a daemon are pointed at a port nothing listens on, and those that run
+``hdfs`` fail once they find it missing, in both cases after their imports
+are done. The time spent on imports that a bare interpreter does not make is
+reported, and the script exits with 1 if any subcommand goes over its
+budget::
+
+    python bench/importtime.py
+    python bench/importtime.py --budget 40 chk-dn chk-nm
+"""
+
+from argparse import ArgumentParser
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Milliseconds a subcommand may spend on imports
+DEFAULT_BUDGET = 100.0
+
+# Tighter budgets for the commands that are run often, such as from
+# monitoring. Measured at about 35 ms for the checks and 28 ms for the
+# others, with room for noise.
+BUDGETS = {
+    'chk-dn': 50.0,
+    'chk-nm': 50.0,
+    'queuestat': 40.0,
+    'sc': 40.0
+    }
+
+DEFAULT_RUNS = 5
+
+# Nothing listens here, so connecting fails at once
+UNREACHABLE = '127.0.0.1:1'
+
+# Arguments that make each subcommand take the path a real invocation
+# does. serve would listen forever, so it only parses -h.
+ARGS = {
+    'chk-dn': [UNREACHABLE],
+    'chk-nm': [UNREACHABLE],
+    'diff': ['capacity-scheduler.xml'],
+    'genqueues': [os.path.join(ROOT, 'data', 'queues'), 'out.xml'],
+    'queuecap': ['root.a', '50'],
+    'queueoff': ['root.a'],
+    'queueon': ['root.a'],
+    'queuestat': ['root.a'],
+    'queueulim': ['root.a', '2'],
+    'quota': ['--space', '1t'],
+    'serve': ['-h'],
+    'stats-nm': [UNREACHABLE],
+    'stats-nn': [UNREACHABLE],
+    'stats-rm': [UNREACHABLE],
+    'useradd': ['bob', 'root.a'],
+    'userdel': ['trozamon', 'root.a']
+    }
+
+RUN_COMMAND = '''
+import sys
+sys.argv = ['hadmin'] + sys.argv[1:]
+import hadmin.main
+try:
+    hadmin.main.run()
+except (SystemExit, Exception):
+    # Commands fail once they try to reach a daemon or run hdfs, but only
+    # after their imports are done
+    pass
+'''
+
+
+def import_times(code, args=()):
+    """
+    Run code in a new interpreter under -X importtime, from a scratch
+    directory, and get a dict of each top-level import to its cumulative
+    import time, in milliseconds
+    """
+
+    tmpdir = tempfile.mkdtemp()
+
+    # hadmin looks for the Hadoop configuration in the current directory
+    open(os.path.join(tmpdir, 'core-site.xml'), 'w').close()
+    shutil.copy(os.path.join(ROOT, 'data', 'capacity-scheduler.xml'), tmpdir)
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+            [ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    env['XDG_CACHE_HOME'] = tmpdir
+    env['HADMIN_NO_SERVER'] = '1'
+
+    try:
+        proc = subprocess.Popen(
+                [sys.executable, '-X', 'importtime', '-c', code] + list(args),
+                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE, env=env, cwd=tmpdir)
+        _, err = proc.communicate()
+    finally:
+        shutil.rmtree(tmpdir)
+
+    ret = dict()
+    for line in err.decode('utf-8', 'replace').splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+
+        # Nested imports are indented, and already counted by their parent
+        if fields[2][1:2] != ' ':
+            ret[fields[2].strip()] = int(fields[1]) / 1000.0
+
+    return ret
+
+
+def import_time(code, args=(), startup=frozenset()):
+    """
+    Get the time code spends importing modules, leaving out the modules in
+    startup, which the interpreter imports by itself
+    """
+
+    times = import_times(code, args)
+    return sum(ms for name, ms in times.items() if name not in startup)
+
+
+def best_of(runs, code, args=(), startup=frozenset()):
+    return min(import_time(code, args, startup) for _ in range(runs))
+
+
+def commands():
+    sys.path.insert(0, ROOT)
+    import hadmin.main
+    return sorted(hadmin.main.cmds)
+
+
+def main(argv):
+    parser = ArgumentParser(prog='importtime',
+                            description='hadmin import time benchmark')
+    parser.add_argument('--budget', dest='budget', type=float, default=None,
+                        help='Milliseconds each subcommand may spend on '
+                        'imports. Defaults to ' + str(DEFAULT_BUDGET) +
+                        ', or less for the commands that are run often')
+    parser.add_argument('--runs', dest='runs', type=int, default=DEFAULT_RUNS,
+                        help='Take the best of this many runs')
+    parser.add_argument('command', nargs='*',
+                        help='Subcommands to measure. Defaults to all')
+    args = parser.parse_args(argv)
+
+    startup = frozenset(import_times('pass'))
+    over = []
+
+    for cmd in args.command or commands():
+        ms = best_of(args.runs, RUN_COMMAND, [cmd] + ARGS.get(cmd, []),
+                     startup)
+        budget = args.budget or BUDGETS.get(cmd, DEFAULT_BUDGET)
+        status = 'ok'
+
+        if ms > budget:
+            status = 'OVER BUDGET'
+            over.append(cmd)
+
+        print('%-12s %7.1f ms  %s' % (cmd, ms, status))
+
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,315 @@
+"""
+Load-test hadmin against fake Hadoop daemons.
+
+Starts a fleet of :py:mod:`hadmin.fakehadoop` daemons (a ResourceManager, a
+NameNode, a fake InfluxDB and --nodes NodeManagers and DataNodes) in another
+process. Then, for each scenario, workers call hadmin against all of them
+for a while, and the throughput and latency percentiles are printed:
+
+relay
+    A ``hadmin-stats-influxd`` relay for every daemon, pointed at it with
+    ``--host``, collecting and writing to the fake InfluxDB as fast as it
+    can instead of once per interval
+checks
+    The checks of ``chk-dn`` and ``chk-nm``, as run for each host when
+    they are given many, against every DataNode and NodeManager
+
+::
+
+    python bench/loadtest.py
+    python bench/loadtest.py --nodes 500 --latency 0.02 --jitter 0.05 \\
+        --error-rate 0.01 --slow-rate 0.05 relay
+"""
+
+from argparse import ArgumentParser
+import json
+import math
+import os
+import queue
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+
+import hadmin.fakehadoop as fakehadoop  # noqa: E402
+import hadmin.main  # noqa: E402
+
+
+DEFAULT_DURATION = 10.0
+
+DEFAULT_WORKERS = hadmin.main.CHECK_WORKERS
+
+SCENARIOS = ['relay', 'checks']
+
+PERCENTILES = [50, 95, 99]
+
+# The relay's component for each role
+COMPONENTS = {
+    'dn': 'DataNode',
+    'nm': 'NodeManager',
+    'nn': 'NameNode',
+    'rm': 'ResourceManager'
+    }
+
+
+class Fleet:
+    """
+    Runs ``python -m hadmin.fakehadoop`` with args until stopped
+    """
+
+    def __init__(self, args):
+        self.proc = subprocess.Popen(
+                [sys.executable, '-m', 'hadmin.fakehadoop'] + args,
+                cwd=ROOT, stdout=subprocess.PIPE)
+
+        line = self.proc.stdout.readline()
+        if not line:
+            self.proc.wait()
+            raise RuntimeError('the fake daemons did not start')
+
+        self.addresses = json.loads(line.decode('utf-8'))
+
+    def stop(self):
+        """
+        Stop the daemons. Returns what each role served.
+        """
+
+        self.proc.send_signal(signal.SIGTERM)
+        out = self.proc.communicate()[0].decode('utf-8').splitlines()
+
+        return json.loads(out[-1]) if out else dict()
+
+
+def relay_ops(addresses, relay_args):
+    """
+    Get a function per daemon that collects its metrics once and writes
+    them to the fake InfluxDB, returning the number of points written
+    """
+
+    from hadmin.influx import Relay
+
+    influx = 'http://' + addresses['influx'][0]
+    ops = []
+
+    for role in sorted(COMPONENTS):
+        for addr in addresses[role]:
+            args = ['--host', addr] + relay_args
+            if role == 'rm':
+                args.append('--queues')
+
+            relay = Relay(args + [influx, 'loadtest', COMPONENTS[role]])
+
+            def op(relay=relay):
+                body = relay.get_request()
+                if len(body) and relay.send(body) != 204:
+                    raise RuntimeError('write failed')
+
+                return len(body)
+
+            ops.append(op)
+
+    return ops
+
+
+def check_ops(addresses, cache):
+    """
+    Get a function per DataNode and NodeManager that checks it, returning 1
+    """
+
+    ops = []
+
+    for check, role in [(hadmin.main.check_dn, 'dn'),
+                        (hadmin.main.check_nm, 'nm')]:
+        for addr in addresses[role]:
+            def op(check=check, addr=addr):
+                check(addr, cache)
+                return 1
+
+            ops.append(op)
+
+    return ops
+
+
+def drive(ops, workers, duration):
+    """
+    Call the functions in ops round robin from workers threads for
+    duration seconds, never calling one from two threads at once. Returns
+    the latency of every call in seconds, the number of calls that raised,
+    the sum of what the others returned, and how long it all took.
+    """
+
+    idle = queue.Queue()
+    for op in ops:
+        idle.put(op)
+
+    lock = threading.Lock()
+    latencies = []
+    totals = {'failed': 0, 'items': 0}
+    deadline = time.perf_counter() + duration
+
+    def work():
+        while time.perf_counter() < deadline:
+            op = idle.get()
+            start = time.perf_counter()
+            try:
+                items = op()
+            except Exception:
+                items = None
+            elapsed = time.perf_counter() - start
+            idle.put(op)
+
+            with lock:
+                latencies.append(elapsed)
+                if items is None:
+                    totals['failed'] += 1
+                else:
+                    totals['items'] += items
+
+    threads = [threading.Thread(target=work)
+               for _ in range(min(workers, len(ops)))]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return latencies, totals['failed'], totals['items'], \
+        time.perf_counter() - start
+
+
+def percentile(values, p):
+    """
+    Get the p-th percentile of the sorted list values, by nearest rank
+    """
+
+    if not values:
+        return 0.0
+
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+
+def summarize(name, latencies, failed, items, took):
+    latencies = sorted(latencies)
+
+    ret = {
+        'calls': len(latencies),
+        'failed': failed,
+        'seconds': took,
+        'calls_per_second': len(latencies) / took,
+        'items_per_second': items / took,
+        'max_ms': latencies[-1] * 1000 if latencies else 0.0
+        }
+
+    for p in PERCENTILES:
+        ret['p' + str(p) + '_ms'] = percentile(latencies, p) * 1000
+
+    print('%-7s %7d calls %6d failed %9.1f calls/s %10.1f %s/s' %
+          (name, ret['calls'], failed, ret['calls_per_second'],
+           ret['items_per_second'], 'points' if name == 'relay' else 'hosts'))
+    tail = ['p%d %8.2f ms' % (p, ret['p%d_ms' % p]) for p in PERCENTILES]
+    print('        ' + '  '.join(tail) + '  max %8.2f ms' % ret['max_ms'])
+    sys.stdout.flush()
+
+    return ret
+
+
+def main(argv):
+    parser = ArgumentParser(prog='loadtest',
+                            description='Load-test hadmin against fake '
+                            'Hadoop daemons')
+    parser.add_argument('--nodes', dest='nodes', type=int,
+                        default=fakehadoop.DEFAULT_NODES,
+                        help='Number of NodeManagers and DataNodes')
+    parser.add_argument('--queues', dest='queues', type=int,
+                        default=fakehadoop.DEFAULT_QUEUES,
+                        help="Number of queues in the ResourceManager's "
+                        'scheduler')
+    parser.add_argument('--beans', dest='beans', type=int,
+                        default=fakehadoop.DEFAULT_BEANS,
+                        help='Number of beans in every /jmx response')
+    parser.add_argument('--duration', dest='duration', type=float,
+                        default=DEFAULT_DURATION,
+                        help='Seconds to run each scenario for')
+    parser.add_argument('--workers', dest='workers', type=int,
+                        default=DEFAULT_WORKERS,
+                        help='Number of concurrent workers')
+    parser.add_argument('--latency', dest='latency', type=float, default=0.0,
+                        help='Seconds the daemons wait before every response')
+    parser.add_argument('--jitter', dest='jitter', type=float, default=0.0,
+                        help='Seconds they wait at most on top of --latency')
+    parser.add_argument('--error-rate', dest='error_rate', type=float,
+                        default=0.0,
+                        help='Share of requests they answer with a 500')
+    parser.add_argument('--slow-rate', dest='slow_rate', type=float,
+                        default=0.0,
+                        help='Share of responses they send slowly')
+    parser.add_argument('--seed', dest='seed', type=int, default=None,
+                        help='Seed for repeatable faults')
+    parser.add_argument('--cache-ttl', dest='cache_ttl', type=float,
+                        default=None,
+                        help='Check through an in-memory snapshot cache with '
+                        'this TTL')
+    parser.add_argument('--relay-args', dest='relay_args', default='',
+                        help='More options for every relay, such as '
+                        '"--keepalive 300"')
+    parser.add_argument('--output', dest='output', default=None,
+                        help='Also save the results to this JSON file')
+    parser.add_argument('scenario', nargs='*',
+                        help='Scenarios to run. Defaults to all of: ' +
+                        ', '.join(SCENARIOS))
+    args = parser.parse_args(argv)
+
+    unknown = set(args.scenario) - set(SCENARIOS)
+    if unknown:
+        parser.error('unknown scenarios: ' + ', '.join(sorted(unknown)))
+
+    fakehadoop.raise_open_files_limit()
+
+    fleet_args = ['--nodes', args.nodes, '--queues', args.queues,
+                  '--beans', args.beans, '--latency', args.latency,
+                  '--jitter', args.jitter, '--error-rate', args.error_rate,
+                  '--slow-rate', args.slow_rate]
+    if args.seed is not None:
+        fleet_args += ['--seed', args.seed]
+
+    fleet = Fleet([str(a) for a in fleet_args])
+    results = {'args': vars(args), 'scenarios': dict()}
+
+    try:
+        for name in [s for s in SCENARIOS
+                     if not args.scenario or s in args.scenario]:
+            if name == 'relay':
+                ops = relay_ops(fleet.addresses,
+                                shlex.split(args.relay_args))
+            else:
+                cache = None
+                if args.cache_ttl is not None:
+                    from hadmin.cache import SnapshotCache
+                    cache = SnapshotCache(args.cache_ttl)
+
+                ops = check_ops(fleet.addresses, cache)
+
+            results['scenarios'][name] = summarize(
+                    name, *drive(ops, args.workers, args.duration))
+    finally:
+        results['served'] = fleet.stop()
+
+    print('Served: ' + json.dumps(results['served'], sort_keys=True))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
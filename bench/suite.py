@@ -0,0 +1,353 @@
+"""
+Benchmark hadmin's hot paths on synthetic clusters.
+
+Each case runs on inputs of several sizes generated by
+:py:mod:`hadmin.synthetic`: a number of queues, or of beans for the JMX
+cases. For every case and size, the best time of a few runs and the peak
+memory one run allocates (as tracemalloc sees it) are printed and saved to
+``bench/results/<commit>.json``. Comparing against an earlier result shows
+the cases that got slower or bigger, and exits with 1 if any got worse by
+more than the threshold::
+
+    python bench/suite.py
+    python bench/suite.py --sizes 10,1000 hxml.load queue.to_hxml
+    python bench/suite.py --compare bench/results/885fd9f.json
+"""
+
+from argparse import ArgumentParser
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+
+import hadmin.synthetic as synthetic  # noqa: E402
+
+
+RESULTS_DIR = os.path.join(ROOT, 'bench', 'results')
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 50000]
+
+DEFAULT_RUNS = 3
+
+# How much slower or bigger than before a case may get before --compare
+# calls it a regression
+DEFAULT_THRESHOLD = 1.25
+
+# Parsing YAML dominates loading a directory of queues and grows linearly,
+# so bigger sizes only make the suite slow
+MAX_YAML_SIZE = 10000
+
+
+def write_file(tmpdir, name, contents):
+    path = os.path.join(tmpdir, name)
+    with open(path, 'w') as f:
+        f.write(contents)
+
+    return path
+
+
+def hxml_load(size, tmpdir):
+    from hadmin.util import HXML
+
+    path = write_file(tmpdir, 'capacity-scheduler.xml',
+                      synthetic.capacity_scheduler_xml(size))
+
+    return lambda: HXML.from_file(path)
+
+
+def hxml_save(size, tmpdir):
+    from hadmin.util import HXML
+
+    hxml = HXML.from_str(synthetic.capacity_scheduler_xml(size))
+    path = os.path.join(tmpdir, 'saved.xml')
+
+    return lambda: hxml.save(path)
+
+
+def queue_from_hxml(size, tmpdir):
+    from hadmin.util import HXML
+    from hadmin.yarn import Queue
+
+    tree = HXML.from_str(synthetic.capacity_scheduler_xml(size)).tree
+
+    # A new HXML every time, so that each run indexes the properties again
+    return lambda: Queue.from_hxml(HXML(tree), 'root')
+
+
+def queue_to_hxml(size, tmpdir):
+    from hadmin.util import HXML
+    from hadmin.yarn import Queue
+
+    root = Queue.from_hxml(HXML.from_str(
+            synthetic.capacity_scheduler_xml(size)), 'root')
+
+    return root.to_hxml
+
+
+def conf_generate(size, tmpdir):
+    from hadmin.conf import QueueGenerator
+
+    return QueueGenerator(synthetic.queue_specs(size)).generate
+
+
+def conf_load_dir(size, tmpdir):
+    from hadmin.conf import QueueGenerator
+
+    synthetic.write_yaml_dir(tmpdir, size)
+
+    return lambda: QueueGenerator.load_dir(tmpdir)
+
+
+def jmx_load(size, tmpdir):
+    from hadmin.jmx import NameNodeJMX
+
+    raw = json.dumps(synthetic.namenode_jmx_json(size))
+
+    return lambda: NameNodeJMX(raw)
+
+
+def jmx_getitem(size, tmpdir):
+    from hadmin.jmx import NameNodeJMX
+
+    jmx = NameNodeJMX(json.dumps(synthetic.namenode_jmx_json(size)))
+
+    return jmx.metrics
+
+
+def rest_load_scheduler(size, tmpdir):
+    from hadmin.rest import ResourceManager
+
+    data = synthetic.scheduler_json(size)
+    rm = ResourceManager()
+
+    return lambda: rm.load_scheduler(data)
+
+
+def influx_write_body(size, tmpdir):
+    from hadmin.influx import WriteBody, escape_tag
+    from hadmin.rest import ResourceManager
+
+    points = ResourceManager(synthetic.scheduler_json(size)).queue_metrics()
+
+    def run():
+        body = WriteBody()
+        for queue_name, key, value in points:
+            body.add_measurement(key, value, 1500000000.0,
+                                 'queue=' + escape_tag(queue_name))
+
+        return str(body)
+
+    return run
+
+
+# Each case's name, setup and largest size. A setup takes the size and an
+# empty scratch directory, and returns the function to measure.
+CASES = [
+    ('conf.generate', conf_generate, None),
+    ('conf.load_dir', conf_load_dir, MAX_YAML_SIZE),
+    ('hxml.load', hxml_load, None),
+    ('hxml.save', hxml_save, None),
+    ('influx.write_body', influx_write_body, None),
+    ('jmx.getitem', jmx_getitem, None),
+    ('jmx.load', jmx_load, None),
+    ('queue.from_hxml', queue_from_hxml, None),
+    ('queue.to_hxml', queue_to_hxml, None),
+    ('rest.load_scheduler', rest_load_scheduler, None)
+    ]
+
+
+def measure(func, runs):
+    """
+    Get the best time of runs calls of func, in seconds, and the peak memory
+    one call allocates, in bytes
+    """
+
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return best, peak
+
+
+def run_case(setup, size, runs):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        return measure(setup(size, tmpdir), runs)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def commit():
+    """
+    Get the abbreviated hash of the checked out commit, marked as dirty if
+    hadmin has uncommitted changes, or None outside of git
+    """
+
+    try:
+        rev = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                      cwd=ROOT, stderr=subprocess.DEVNULL)
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD', '--',
+                                 'hadmin'], cwd=ROOT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return rev.decode('utf-8').strip() + ('-dirty' if dirty else '')
+
+
+def pretty_bytes(n):
+    for unit in ['B', 'K', 'M', 'G']:
+        if n < 1024 or unit == 'G':
+            break
+        n /= 1024.0
+
+    return '%.1f%s' % (n, unit)
+
+
+def load_results(path):
+    """
+    Load saved results, given a file or the commit they were taken at
+    """
+
+    if not os.path.exists(path):
+        path = os.path.join(RESULTS_DIR, path + '.json')
+
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compare(old, new, threshold):
+    """
+    Print how each measurement in new changed from old. Returns the
+    measurements that got worse by more than threshold.
+    """
+
+    worse = []
+
+    for case in sorted(new['results']):
+        for size in sorted(new['results'][case], key=int):
+            before = old['results'].get(case, {}).get(size)
+            if before is None:
+                continue
+
+            after = new['results'][case][size]
+            time_ratio = after['seconds'] / max(before['seconds'], 1e-9)
+            mem_ratio = after['peak_bytes'] / float(max(before['peak_bytes'],
+                                                        1))
+
+            flag = ''
+            if time_ratio > threshold or mem_ratio > threshold:
+                flag = 'WORSE'
+                worse.append((case, size))
+            elif time_ratio < 1 / threshold:
+                flag = 'better'
+
+            print('%-20s %6s  time %5.2fx  memory %5.2fx  %s' %
+                  (case, size, time_ratio, mem_ratio, flag))
+
+    return worse
+
+
+def main(argv):
+    parser = ArgumentParser(prog='suite',
+                            description='hadmin benchmark suite')
+    parser.add_argument('--sizes', dest='sizes', default=None,
+                        help='Comma separated sizes to run each case at. '
+                        'Defaults to ' + ','.join(map(str, DEFAULT_SIZES)))
+    parser.add_argument('--runs', dest='runs', type=int, default=DEFAULT_RUNS,
+                        help='Take the best time of this many runs')
+    parser.add_argument('--output', dest='output', default=None,
+                        help='Where to save the results. Defaults to '
+                        'bench/results/<commit>.json')
+    parser.add_argument('--no-save', dest='save', action='store_false',
+                        default=True, help="Don't save the results")
+    parser.add_argument('--compare', dest='compare', default=None,
+                        metavar='RESULTS',
+                        help='Compare with results saved earlier, given as '
+                        'a file or a commit')
+    parser.add_argument('--threshold', dest='threshold', type=float,
+                        default=DEFAULT_THRESHOLD,
+                        help='Ratio over which --compare reports a '
+                        'regression')
+    parser.add_argument('case', nargs='*',
+                        help='Cases to run. Defaults to all of: ' +
+                        ', '.join(name for name, _, _ in CASES))
+    args = parser.parse_args(argv)
+
+    sizes = DEFAULT_SIZES
+    if args.sizes:
+        sizes = [int(s) for s in args.sizes.split(',')]
+
+    cases = [c for c in CASES if not args.case or c[0] in args.case]
+    unknown = set(args.case) - set(name for name, _, _ in CASES)
+    if unknown:
+        parser.error('unknown cases: ' + ', '.join(sorted(unknown)))
+
+    results = {
+        'commit': commit(),
+        'python': platform.python_version(),
+        'taken': time.time(),
+        'runs': args.runs,
+        'results': dict()
+        }
+
+    for name, setup, max_size in cases:
+        for size in sizes:
+            if max_size is not None and size > max_size:
+                continue
+
+            seconds, peak = run_case(setup, size, args.runs)
+            results['results'].setdefault(name, dict())[str(size)] = {
+                'seconds': seconds,
+                'peak_bytes': peak
+                }
+
+            print('%-20s %6d  %10.2f ms  %8s' %
+                  (name, size, seconds * 1000, pretty_bytes(peak)))
+            sys.stdout.flush()
+
+    if args.save:
+        path = args.output
+        if path is None:
+            if not os.path.isdir(RESULTS_DIR):
+                os.makedirs(RESULTS_DIR)
+
+            path = os.path.join(RESULTS_DIR,
+                                (results['commit'] or 'latest') + '.json')
+
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+        print('Saved results to ' + path)
+
+    if args.compare:
+        print('')
+        if compare(load_results(args.compare), results, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
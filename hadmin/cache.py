@@ -0,0 +1,261 @@
+"""
+Snapshot caching
+----------------
+
+Cache the raw bodies of REST and JMX responses so that repeated reads of the
+same endpoint within a short time do not hit the daemons again.
+
+Entries are keyed by (host, path). An entry younger than the TTL is served
+straight from memory. Once it is older, the next read is sent as a
+conditional request using the ``ETag`` and ``Last-Modified`` headers the
+daemon gave us, and a ``304 Not Modified`` simply refreshes the entry.
+
+A :py:class:`SnapshotCache` may optionally be backed by a file (see
+:py:func:`default_path`) so that separate ``hadmin`` invocations share it.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+DEFAULT_TTL = 10
+
+SNAPSHOT_FILENAME = 'snapshots.json'
+
+
+def cache_dir():
+    """
+    Get the directory hadmin keeps its caches in. Honors ``XDG_CACHE_HOME``.
+    """
+
+    import hadmin.system
+
+    base = hadmin.system.getenv('XDG_CACHE_HOME')
+    if not base:
+        home = hadmin.system.getenv('HOME') or os.path.expanduser('~')
+        base = os.path.join(home, '.cache')
+
+    return os.path.join(base, 'hadmin')
+
+
+def write_json(path, obj):
+    """
+    Write obj to path as JSON, through a temporary file of its own, so that
+    readers and concurrent writers only ever see a whole file. Caches are
+    optional, so a file that cannot be written only gets a warning on
+    standard error. Returns whether it was written.
+    """
+
+    d = os.path.dirname(path) or '.'
+    tmp = None
+
+    try:
+        if not os.path.isdir(d):
+            os.makedirs(d)
+
+        fd, tmp = tempfile.mkstemp(dir=d,
+                                   prefix='.' + os.path.basename(path) + '.')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(obj, f)
+
+        os.replace(tmp, path)
+        return True
+    except (IOError, OSError) as e:
+        if tmp is not None:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+        sys.stderr.write('Warning: could not save ' + path + ': ' + str(e) +
+                         '\n')
+        return False
+
+
+def default_path():
+    """
+    Get the default location of the on-disk snapshot cache
+    """
+
+    return os.path.join(cache_dir(), SNAPSHOT_FILENAME)
+
+
+class Entry:
+    """
+    A cached response body and the validators needed to revalidate it
+    """
+
+    def __init__(self, body, fetched, etag=None, last_modified=None):
+        self.body = body
+        self.fetched = fetched
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def headers(self):
+        """
+        Headers that turn a GET for this entry into a conditional GET
+        """
+
+        ret = dict()
+
+        if self.etag:
+            ret['If-None-Match'] = self.etag
+
+        if self.last_modified:
+            ret['If-Modified-Since'] = self.last_modified
+
+        return ret
+
+    def to_dict(self):
+        return {
+            'body': self.body,
+            'fetched': self.fetched,
+            'etag': self.etag,
+            'last_modified': self.last_modified
+            }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['body'], d['fetched'], d.get('etag'),
+                   d.get('last_modified'))
+
+
+class SnapshotCache:
+    """
+    In-memory cache of endpoint bodies, optionally persisted to a file.
+
+    The TTL is in seconds. A cache may be shared by threads checking
+    several hosts at once. New and refreshed entries are only written to the
+    file by :py:meth:`flush` (or :py:meth:`close`), so a batch of fetches
+    costs a single write.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, path=None):
+        self.ttl = ttl
+        self.path = path
+        self._entries = dict()
+        self._dirty = False
+
+        if self.path:
+            self.load()
+
+    @staticmethod
+    def key(host, path):
+        return (host or '') + path
+
+    def get(self, host, path):
+        """
+        Get the cached body for (host, path) if it is still fresh, or None
+        """
+
+        entry = self._entries.get(SnapshotCache.key(host, path))
+        if entry is None:
+            return None
+
+        if time.time() - entry.fetched > self.ttl:
+            return None
+
+        return entry.body
+
+    def fetch(self, conn, host, path):
+        """
+        Get the body of path from the cache, falling back to conn.
+
+        Returns None if the daemon does not answer with a usable response.
+        """
+
+        body = self.get(host, path)
+        if body is not None:
+            return body
+
+        k = SnapshotCache.key(host, path)
+        entry = self._entries.get(k)
+        headers = dict()
+        if entry is not None:
+            headers = entry.headers()
+
+        conn.request('GET', path, headers=headers)
+        res = conn.getresponse()
+
+        if res.status == 304 and entry is not None:
+            res.read()
+            entry.fetched = time.time()
+            self._dirty = True
+            return entry.body
+
+        if res.status != 200:
+            return None
+
+        body = res.read()
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+
+        self._entries[k] = Entry(body, time.time(),
+                                 etag=res.getheader('ETag'),
+                                 last_modified=res.getheader('Last-Modified'))
+        self._dirty = True
+
+        return body
+
+    def clear(self):
+        self._entries = dict()
+        self.save()
+
+    def load(self):
+        """
+        Load entries from the backing file. A missing or unreadable file
+        results in an empty cache.
+        """
+
+        try:
+            with open(self.path, 'r') as f:
+                raw = json.load(f)
+
+            for k in raw:
+                self._entries[k] = Entry.from_dict(raw[k])
+        except (IOError, OSError, ValueError, KeyError):
+            self._entries = dict()
+
+    def save(self):
+        """
+        Write entries to the backing file, if there is one
+        """
+
+        if not self.path:
+            return
+
+        entries = list(self._entries.items())
+        write_json(self.path, dict((k, e.to_dict()) for k, e in entries))
+        self._dirty = False
+
+    def flush(self):
+        """
+        Save the entries if any were added or refreshed since the last save
+        """
+
+        if self._dirty:
+            self.save()
+
+    def close(self):
+        self.flush()
+
+
+def fetch(conn, path, cache=None, host=None):
+    """
+    GET path from conn, going through cache if one is given.
+
+    Returns the response body, or None if the response was not a 200.
+    """
+
+    if cache is not None:
+        return cache.fetch(conn, host, path)
+
+    conn.request('GET', path)
+    res = conn.getresponse()
+    if res.status == 200:
+        return res.read()
+
+    return None
@@ -0,0 +1,151 @@
+from unittest2 import TestCase
+from hadmin import mock
+from hadmin.cache import SnapshotCache, write_json
+from hadmin.jmx import DataNodeJMX
+from hadmin.rest import NodeManager, NM_INFO_PATH
+from io import StringIO
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+
+class SnapshotCacheTest(TestCase):
+
+    def testFreshEntryIsNotRefetched(self):
+        NodeManager.load_from_connection(self.conn, NM_INFO_PATH,
+                                         cache=self.cache, host='nm')
+        NodeManager.load_from_connection(self.conn, NM_INFO_PATH,
+                                         cache=self.cache, host='nm')
+        self.assertEqual(1, self.conn.requests)
+
+    def testCachedResultIsUsable(self):
+        NodeManager.load_from_connection(self.conn, NM_INFO_PATH,
+                                         cache=self.cache, host='nm')
+        nm = NodeManager.load_from_connection(self.conn, NM_INFO_PATH,
+                                              cache=self.cache, host='nm')
+        self.assertEqual(True, nm.isHealthy())
+
+    def testHostsAreSeparate(self):
+        NodeManager.load_from_connection(self.conn, NM_INFO_PATH,
+                                         cache=self.cache, host='nm1')
+        NodeManager.load_from_connection(self.conn, NM_INFO_PATH,
+                                         cache=self.cache, host='nm2')
+        self.assertEqual(2, self.conn.requests)
+
+    def testStaleEntryIsRevalidated(self):
+        self.cache.ttl = -1
+        NodeManager.load_from_connection(self.conn, NM_INFO_PATH,
+                                         cache=self.cache, host='nm')
+        nm = NodeManager.load_from_connection(self.conn, NM_INFO_PATH,
+                                              cache=self.cache, host='nm')
+        self.assertEqual(2, self.conn.requests)
+        self.assertTrue(self.conn.not_modified)
+        self.assertEqual(True, nm.isHealthy())
+
+    def testJMX(self):
+        conn = mock.ValidatingConnectionMock('data/datanode.jmx.json')
+        jmx = DataNodeJMX()
+        jmx.load_from_connection(conn, cache=self.cache, host='dn')
+        jmx = DataNodeJMX()
+        jmx.load_from_connection(conn, cache=self.cache, host='dn')
+        self.assertEqual(1, conn.requests)
+        self.assertEqual(0, jmx.getFailedVolumes())
+
+    def testOnDisk(self):
+        fname = os.path.join(self.tmpdir, 'sub', 'snapshots.json')
+        cache = SnapshotCache(ttl=60, path=fname)
+        NodeManager.load_from_connection(self.conn, NM_INFO_PATH,
+                                         cache=cache, host='nm')
+        cache.close()
+
+        cache = SnapshotCache(ttl=60, path=fname)
+        NodeManager.load_from_connection(self.conn, NM_INFO_PATH,
+                                         cache=cache, host='nm')
+        self.assertEqual(1, self.conn.requests)
+
+    def testUnwritable(self):
+        cache = SnapshotCache(ttl=60, path='/proc/nope/snapshots.json')
+
+        err = StringIO()
+        with contextlib.redirect_stderr(err):
+            NodeManager.load_from_connection(self.conn, NM_INFO_PATH,
+                                             cache=cache, host='nm')
+            cache.flush()
+
+        self.assertIn('could not save', err.getvalue())
+
+    def testSavedOnFlush(self):
+        fname = os.path.join(self.tmpdir, 'snapshots.json')
+        cache = SnapshotCache(ttl=60, path=fname)
+        for host in ['nm1', 'nm2', 'nm3']:
+            NodeManager.load_from_connection(self.conn, NM_INFO_PATH,
+                                             cache=cache, host=host)
+        self.assertEqual(3, self.conn.requests)
+        self.assertFalse(os.path.exists(fname))
+
+        cache.flush()
+        self.assertEqual(3, len(SnapshotCache(ttl=60, path=fname)._entries))
+
+        # Nothing changed since, so there is nothing to write
+        os.remove(fname)
+        cache.flush()
+        self.assertFalse(os.path.exists(fname))
+
+    def setUp(self):
+        self.conn = mock.ValidatingConnectionMock(
+                'data/nodemanager.rest.json')
+        self.cache = SnapshotCache(ttl=60)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+class WriteJSONTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testWritten(self):
+        fname = os.path.join(self.tmpdir, 'a', 'b.json')
+
+        self.assertTrue(write_json(fname, {'x': 1}))
+        with open(fname) as f:
+            self.assertEqual({'x': 1}, json.load(f))
+
+        self.assertEqual(['b.json'],
+                         os.listdir(os.path.join(self.tmpdir, 'a')))
+
+    def testConcurrentWriters(self):
+        fname = os.path.join(self.tmpdir, 'b.json')
+        results = []
+
+        def write(i):
+            for _ in range(50):
+                results.append(write_json(fname, {'writer': i}))
+
+        threads = [threading.Thread(target=write, args=(i,))
+                   for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertTrue(all(results))
+        with open(fname) as f:
+            self.assertIn(json.load(f)['writer'], range(8))
+
+        self.assertEqual(['b.json'], os.listdir(self.tmpdir))
+
+    def testFailureIsAWarning(self):
+        err = StringIO()
+        with contextlib.redirect_stderr(err):
+            self.assertFalse(write_json('/proc/nope/x', {}))
+
+        self.assertIn('/proc/nope/x', err.getvalue())
@@ -7,10 +7,130 @@ Manipulate hadmin's configuration
 """
 
 
+import hadmin.cache
 from hadmin.yarn import Queue
+import hashlib
+import json
+import marshal
 import os
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+def parse_yaml(raw):
+    """
+    Parse a YAML stream into a list of its documents, using libyaml if it is
+    available
+    """
+
+    return list(yaml.load_all(raw, Loader=SafeLoader))
+
+
+def parse_yamls(raws, processes=None):
+    """
+    Parse many YAML streams, across a pool of processes if processes is
+    greater than 1. The results are in the same order as raws.
+    """
+
+    if not processes or processes <= 1 or len(raws) < 2 * processes:
+        return [parse_yaml(raw) for raw in raws]
+
+    from multiprocessing import Pool
+
+    pool = Pool(processes)
+    try:
+        chunksize = max(1, len(raws) // (processes * 4))
+        return pool.map(parse_yaml, raws, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+
+class Manifest:
+    """
+    Remembers the content hash and parsed YAML of each queue file, so that
+    files that have not changed since the last run need not be parsed again.
+
+    If path is given, the manifest is loaded from and saved to that file.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path=None):
+        self.path = path
+        self.files = dict()
+
+        if self.path:
+            self.load()
+
+    @classmethod
+    def default_path(cls, directory):
+        """
+        Get the default manifest location for a YAML directory
+        """
+
+        d = os.path.abspath(directory).encode('utf-8')
+        name = 'genqueues-' + hashlib.sha1(d).hexdigest()[:16] + '.json'
+        return os.path.join(hadmin.cache.cache_dir(), name)
+
+    @staticmethod
+    def digest(raw):
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def lookup(self, fname, digest):
+        """
+        Get a fresh copy of the parsed contents of fname, or None if it is
+        not known or has changed
+        """
+
+        entry = self.files.get(fname)
+        if entry is None or entry['sha1'] != digest:
+            return None
+
+        return json.loads(entry['spec'])
+
+    def store(self, fname, digest, obj):
+        """
+        Remember the parsed contents of fname. Contents that cannot be
+        represented as JSON are not remembered.
+        """
+
+        try:
+            self.files[fname] = {'sha1': digest, 'spec': json.dumps(obj)}
+        except (TypeError, ValueError):
+            self.files.pop(fname, None)
+
+    def prune(self, fnames):
+        """
+        Forget every file that is not in fnames
+        """
+
+        keep = set(fnames)
+        for fname in list(self.files.keys()):
+            if fname not in keep:
+                del self.files[fname]
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                raw = json.load(f)
+
+            if raw.get('version') == Manifest.VERSION:
+                self.files = raw['files']
+        except (IOError, OSError, ValueError, KeyError):
+            self.files = dict()
+
+    def save(self):
+        if not self.path:
+            return
+
+        hadmin.cache.write_json(self.path, {'version': Manifest.VERSION,
+                                            'files': self.files})
+
 
 class QueueGenerator:
     """
@@ -20,6 +140,12 @@ class QueueGenerator:
     LONG_NAME_KEY = '__long_name'
     DONE_KEY = '__done'
 
+    NAME_KEY = 'name'
+    QUEUES_KEY = 'queues'
+
+    COMPILED_MAGIC = b'HADMINQ\x01'
+    MARSHAL_VERSION = 2
+
     ADMINS_KEY = 'admins'
     USERS_KEY = 'users'
     RUNNING_KEY = 'running'
@@ -27,12 +153,16 @@ class QueueGenerator:
     CAPACITY_MAX_KEY = 'max'
     CAPACITY_WEIGHT_KEY = 'weight'
     USER_LIMIT_FACTOR_KEY = 'user_limit'
+    QUOTA_ROOT_KEY = 'quota'
+    QUOTA_FILES_KEY = 'files'
+    QUOTA_SPACE_KEY = 'space'
 
     def __init__(self, queue_confs):
         self._inputs = queue_confs
+        self.parsed = len(queue_confs)
 
         for i in self._inputs:
-            if i[QueueGenerator.LONG_NAME_KEY][0:6] != 'root.':
+            if not i[QueueGenerator.LONG_NAME_KEY].startswith('root.'):
                 tmp = 'root.' + i[QueueGenerator.LONG_NAME_KEY]
                 i[QueueGenerator.LONG_NAME_KEY] = tmp
 
@@ -44,71 +174,216 @@ class QueueGenerator:
         return '.'.join(queue_full_name.split('.')[0:-1])
 
     @classmethod
-    def load_dir(cls, directory):
+    def specs_from_documents(cls, default_name, docs):
+        """
+        Turn the documents of one YAML file into a flat list of queue inputs
+
+        A file holding a single document without a name describes the queue
+        named default_name. Otherwise, each document names its queue with a
+        'name' key. Any queue may list subqueues under a 'queues' mapping of
+        short name to queue, and a document with nothing but 'queues' lists
+        subqueues of root.
+        """
+
+        docs = [d for d in docs if d is not None]
+        specs = []
+
+        def flatten(spec, long_name):
+            own = dict((k, v) for k, v in spec.items()
+                       if k not in (cls.NAME_KEY, cls.QUEUES_KEY))
+
+            if own:
+                if not long_name:
+                    raise ValueError("A queue in " + default_name +
+                                     " has no name")
+
+                own[cls.LONG_NAME_KEY] = long_name
+                own[cls.DONE_KEY] = False
+                specs.append(own)
+
+            children = spec.get(cls.QUEUES_KEY) or dict()
+            for child in children:
+                child_name = child
+                if long_name:
+                    child_name = '.'.join([long_name, child])
+
+                flatten(children[child], child_name)
+
+        for doc in docs:
+            name = doc.get(cls.NAME_KEY)
+            if name is None and len(docs) == 1:
+                name = default_name
+
+            own = [k for k in doc if k != cls.QUEUES_KEY]
+            if cls.NAME_KEY not in doc and not own:
+                name = ''
+
+            flatten(doc, name)
+
+        return specs
+
+    @classmethod
+    def load(cls, path, processes=None, manifest=None):
+        """
+        Load queues from a directory of YAML files, a single YAML file, or a
+        file written by :py:meth:`compile`
+        """
+
+        if os.path.isdir(path):
+            return cls.load_dir(path, processes=processes, manifest=manifest)
+
+        with open(path, 'rb') as f:
+            magic = f.read(len(cls.COMPILED_MAGIC))
+
+        if magic == cls.COMPILED_MAGIC:
+            return cls.load_compiled(path)
+
+        return cls.load_file(path)
+
+    @classmethod
+    def load_file(cls, path):
+        """
+        Load queues from a single YAML file. See
+        :py:meth:`specs_from_documents` for the layout.
+        """
+
+        with open(path, 'r') as f:
+            raw = f.read()
+
+        default_name = os.path.splitext(os.path.basename(path))[0]
+        return QueueGenerator(cls.specs_from_documents(default_name,
+                                                       parse_yaml(raw)))
+
+    @classmethod
+    def load_compiled(cls, path):
+        """
+        Load queues from a file written by :py:meth:`compile`
+        """
+
+        with open(path, 'rb') as f:
+            raw = f.read()
+
+        if raw[:len(cls.COMPILED_MAGIC)] != cls.COMPILED_MAGIC:
+            raise ValueError(path + " is not a compiled queue file")
+
+        objs = marshal.loads(raw[len(cls.COMPILED_MAGIC):])
+        for obj in objs:
+            obj[QueueGenerator.DONE_KEY] = False
+
+        gen = QueueGenerator(objs)
+        gen.parsed = 0
+        return gen
+
+    def compile(self, path):
+        """
+        Write the inputs to path in a compact binary form that
+        :py:meth:`load_compiled` reads without any YAML parsing
+        """
+
         objs = []
+        for obj in self._inputs:
+            tmp = dict(obj)
+            tmp.pop(QueueGenerator.DONE_KEY, None)
+            objs.append(tmp)
 
-        for fname in os.listdir(directory):
-            if fname[-4:] != '.yml':
-                continue
+        with open(path, 'wb') as f:
+            f.write(QueueGenerator.COMPILED_MAGIC)
+            f.write(marshal.dumps(objs, QueueGenerator.MARSHAL_VERSION))
 
-            raw = ''
+    @classmethod
+    def load_dir(cls, directory, processes=None, manifest=None):
+        """
+        Load every .yml file in directory. A file describes the queue named
+        after it, or several queues as explained in
+        :py:meth:`specs_from_documents`. Files are parsed in parallel when
+        processes is greater than 1.
+
+        If a :py:class:`Manifest` is given, files whose contents it already
+        knows are not parsed again, and it is updated and saved afterwards.
+        The number of files that had to be parsed is kept in the generator's
+        `parsed` attribute.
+        """
 
-            with open(os.path.join(directory, fname), 'r') as f:
-                queue_name = fname.replace('.yml', '')
+        fnames = sorted(f for f in os.listdir(directory) if f[-4:] == '.yml')
+        raws = []
 
+        for fname in fnames:
+            with open(os.path.join(directory, fname), 'r') as f:
                 try:
-                    raw = f.read()
+                    raws.append(f.read())
                 except UnicodeDecodeError as e:
                     e.reason += " in file " + fname
                     raise e
 
-            obj = yaml.load(raw)
-            obj[QueueGenerator.LONG_NAME_KEY] = queue_name
-            obj[QueueGenerator.DONE_KEY] = False
-            objs.append(obj)
+        docs = [None] * len(fnames)
+        digests = [None] * len(fnames)
 
-        return QueueGenerator(objs)
+        if manifest is not None:
+            for i, raw in enumerate(raws):
+                digests[i] = Manifest.digest(raw)
+                docs[i] = manifest.lookup(fnames[i], digests[i])
 
-    def generate(self):
-        self.root = self.generate_queue(self._inputs, 'root')
+        missing = [i for i, d in enumerate(docs) if d is None]
+        parsed = parse_yamls([raws[i] for i in missing], processes)
 
-        total_weights = self.compute_total_weights(self._inputs)
+        for i, d in zip(missing, parsed):
+            docs[i] = d
 
-        def get_queue(fqn):
-            if fqn == 'root':
-                return self.root
+            if manifest is not None:
+                manifest.store(fnames[i], digests[i], d)
 
-            parts = fqn.split('.')
-            i = 0
-            if parts[0] == 'root':
-                i = 1
+        if manifest is not None:
+            manifest.prune(fnames)
+            manifest.save()
+
+        objs = []
+        for fname, d in zip(fnames, docs):
+            objs += cls.specs_from_documents(fname.replace('.yml', ''), d)
 
-            q = self.root
-            for part in parts[i:]:
-                q = q.subqueue(part)
+        gen = QueueGenerator(objs)
+        gen.parsed = len(missing)
+        return gen
 
-            return q
+    def generate(self):
+        """
+        Generate the root queue and all of its subqueues from the inputs
 
-        # Go through queues that are one level deep, two levels, deep, and so
-        # on
-        level = 0
-        all_done = False
+        Returns None if some queue's parent is not described by any input.
+        """
 
-        while not all_done and level < 100:
-            all_done = True
+        specs = dict()
+        for obj in self._inputs:
+            specs.setdefault(obj[QueueGenerator.LONG_NAME_KEY], obj)
 
-            for obj in self._inputs:
-                name = obj[QueueGenerator.LONG_NAME_KEY]
-                par_name = QueueGenerator.get_parent_name(name)
+        total_weights = self.compute_total_weights(self._inputs)
+
+        self.root = self.queue_from_spec(specs.get('root'), 'root')
+        queues = {'root': self.root}
+
+        # Parents have to exist before their children can be attached, so
+        # bucket the queues by depth and build one level at a time
+        levels = []
+        for name in specs:
+            depth = name.count('.')
+            while len(levels) <= depth:
+                levels.append([])
+
+            levels[depth].append(name)
 
-                if len(par_name.split('.')) == level:
-                    q = self.generate_queue(self._inputs, name,
-                                            total_weights[par_name])
-                    get_queue(par_name).subqueues.append(q)
+        for level in levels:
+            for name in level:
+                if name == 'root':
+                    continue
 
-                all_done = all_done and obj[QueueGenerator.DONE_KEY]
+                par_name = QueueGenerator.get_parent_name(name)
+                parent = queues.get(par_name)
+                if parent is None:
+                    return None
 
-            level += 1
+                q = self.queue_from_spec(specs[name], name,
+                                         total_weights[par_name])
+                parent.subqueues.append(q)
+                queues[name] = q
 
         return self.root
 
@@ -142,22 +417,69 @@ class QueueGenerator:
 
         for obj in inputs:
             if obj[QueueGenerator.LONG_NAME_KEY] == long_name:
-                obj[QueueGenerator.DONE_KEY] = True
-                q = Queue(
-                        name=obj[QueueGenerator.LONG_NAME_KEY].split('.')[-1],
-                        users=obj[QueueGenerator.USERS_KEY],
-                        admins=obj[QueueGenerator.ADMINS_KEY],
-                        running=obj[QueueGenerator.RUNNING_KEY]
-                        )
+                return self.queue_from_spec(obj, long_name, total_weight)
+
+        return self.queue_from_spec(None, long_name)
+
+    def queue_from_spec(self, obj, long_name, total_weight=1.0):
+        """
+        Generate a queue from a single input, or a default queue if obj is
+        None. See :py:meth:`generate_queue` for the meaning of total_weight.
+        """
+
+        if obj is None:
+            return Queue(name=long_name.split('.')[-1])
+
+        obj[QueueGenerator.DONE_KEY] = True
+        q = Queue(
+                name=long_name.split('.')[-1],
+                users=obj[QueueGenerator.USERS_KEY],
+                admins=obj[QueueGenerator.ADMINS_KEY],
+                running=obj[QueueGenerator.RUNNING_KEY]
+                )
+
+        caps = obj[QueueGenerator.CAPACITY_ROOT_KEY]
+        weight = caps[QueueGenerator.CAPACITY_WEIGHT_KEY]
+        q.cap_min = (weight / total_weight) * 100.0
+        q.cap_max = caps[QueueGenerator.CAPACITY_MAX_KEY]
+
+        q.user_limit_factor = obj[QueueGenerator.USER_LIMIT_FACTOR_KEY]
+        q.user_limit_factor /= q.cap_min
+
+        return q
+
+    def user_quotas(self):
+        """
+        Get the home directory quotas of users, as a dict of username to
+        :py:class:`hadmin.quota.Quota`.
+
+        A queue's optional 'quota' mapping (with 'files' and 'space' keys)
+        applies to the home directory of each of its users. A user of
+        several queues gets the most generous quota of them.
+        """
+
+        from hadmin.hdfs import Directory
+        from hadmin.quota import Quota, parse_count, parse_size
+
+        ret = dict()
+
+        for obj in self._inputs:
+            quota = obj.get(QueueGenerator.QUOTA_ROOT_KEY)
+            if not quota:
+                continue
+
+            files = parse_count(quota.get(QueueGenerator.QUOTA_FILES_KEY))
+            space = parse_size(quota.get(QueueGenerator.QUOTA_SPACE_KEY))
 
-                caps = obj[QueueGenerator.CAPACITY_ROOT_KEY]
-                weight = caps[QueueGenerator.CAPACITY_WEIGHT_KEY]
-                q.cap_min = (weight / total_weight) * 100.0
-                q.cap_max = caps[QueueGenerator.CAPACITY_MAX_KEY]
+            for user in obj.get(QueueGenerator.USERS_KEY) or []:
+                d = Directory.from_username(user)
+                if d is None:
+                    continue
 
-                q.user_limit_factor = obj[QueueGenerator.USER_LIMIT_FACTOR_KEY]
-                q.user_limit_factor /= q.cap_min
+                q = Quota(d.path, files, space)
+                if user in ret:
+                    q = ret[user].merge(q)
 
-                return q
+                ret[user] = q
 
-        return Queue(name=long_name.split('.')[-1])
+        return ret
@@ -1,5 +1,10 @@
-from hadmin.conf import QueueGenerator
+from hadmin.conf import Manifest, QueueGenerator
+from contextlib import redirect_stderr
+from io import StringIO
 from unittest2 import TestCase
+import os
+import shutil
+import tempfile
 
 
 class QueueGeneratorTest(TestCase):
@@ -94,3 +99,152 @@ class QueueGeneratorTest(TestCase):
 
     def testDev2Running(self):
         self.assertEqual(True, self.dev2.running)
+
+
+class QueueGeneratorMultiDocumentTest(QueueGeneratorTest):
+
+    def setUp(self):
+        self.root = QueueGenerator.load('data/queues.multi.yml').generate()
+        self.prod = self.root.subqueue('prod')
+        self.dev = self.root.subqueue('dev')
+        self.dev1 = self.dev.subqueue('product1')
+        self.dev2 = self.dev.subqueue('product2')
+
+
+class QueueGeneratorTreeTest(QueueGeneratorTest):
+
+    def setUp(self):
+        self.root = QueueGenerator.load('data/queues.tree.yml').generate()
+        self.prod = self.root.subqueue('prod')
+        self.dev = self.root.subqueue('dev')
+        self.dev1 = self.dev.subqueue('product1')
+        self.dev2 = self.dev.subqueue('product2')
+
+
+class QueueGeneratorCompiledTest(QueueGeneratorTest):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        fname = os.path.join(self.tmpdir, 'queues.hqc')
+        QueueGenerator.load('data/queues').compile(fname)
+
+        self.root = QueueGenerator.load(fname).generate()
+        self.prod = self.root.subqueue('prod')
+        self.dev = self.root.subqueue('dev')
+        self.dev1 = self.dev.subqueue('product1')
+        self.dev2 = self.dev.subqueue('product2')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+class QueueGeneratorStructureTest(TestCase):
+
+    def spec(self, name, weight=1):
+        return {
+            QueueGenerator.LONG_NAME_KEY: name,
+            'admins': ['alec'],
+            'users': ['alec'],
+            'running': True,
+            'capacity': {'max': 100, 'weight': weight},
+            'user_limit': 50
+            }
+
+    def testChildBeforeParent(self):
+        gen = QueueGenerator([self.spec('a.b'), self.spec('a')])
+        root = gen.generate()
+        self.assertEqual(100.0, root.subqueue('a').subqueue('b').cap_min)
+
+    def testMissingParent(self):
+        gen = QueueGenerator([self.spec('a.b')])
+        self.assertEqual(None, gen.generate())
+
+    def testUnnamedDocument(self):
+        with self.assertRaises(ValueError):
+            QueueGenerator.specs_from_documents('file', [
+                {'name': 'a', 'running': True},
+                {'running': True}
+                ])
+
+    def testSingleDocumentNamedByFile(self):
+        specs = QueueGenerator.specs_from_documents('file', [
+            {'running': True, 'queues': {'sub': {'running': False}}}
+            ])
+        self.assertEqual(['file', 'file.sub'],
+                         [s[QueueGenerator.LONG_NAME_KEY] for s in specs])
+
+    def testSiblingOrderKept(self):
+        gen = QueueGenerator([self.spec('b'), self.spec('a', 3)])
+        root = gen.generate()
+        self.assertEqual(['b', 'a'], [q.name for q in root.subqueues])
+        self.assertEqual(75.0, root.subqueue('a').cap_min)
+
+
+class QueueGeneratorParallelTest(QueueGeneratorTest):
+
+    def setUp(self):
+        self.root = QueueGenerator.load_dir('data/queues',
+                                            processes=2).generate()
+        self.prod = self.root.subqueue('prod')
+        self.dev = self.root.subqueue('dev')
+        self.dev1 = self.dev.subqueue('product1')
+        self.dev2 = self.dev.subqueue('product2')
+
+
+class ManifestTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.queues = os.path.join(self.tmpdir, 'queues')
+        shutil.copytree('data/queues', self.queues)
+        self.path = os.path.join(self.tmpdir, 'manifest.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def load(self):
+        return QueueGenerator.load_dir(self.queues,
+                                       manifest=Manifest(self.path))
+
+    def testFirstRunParsesAll(self):
+        self.assertEqual(4, self.load().parsed)
+
+    def testUnchangedNotParsed(self):
+        self.load()
+        self.assertEqual(0, self.load().parsed)
+
+    def testChangedParsed(self):
+        self.load()
+
+        fname = os.path.join(self.queues, 'prod.yml')
+        with open(fname) as f:
+            raw = f.read()
+
+        with open(fname, 'w') as f:
+            f.write(raw.replace('weight: 9', 'weight: 3'))
+
+        gen = self.load()
+        self.assertEqual(1, gen.parsed)
+        self.assertEqual(75.0, gen.generate().subqueue('prod').cap_min)
+
+    def testCachedResultSame(self):
+        self.load()
+        root = self.load().generate()
+        self.assertEqual(90.0, root.subqueue('prod').cap_min)
+        self.assertEqual(['alec'], root.subqueue('dev').subqueue(
+            'product1').users)
+
+    def testRemovedFileForgotten(self):
+        self.load()
+        os.remove(os.path.join(self.queues, 'dev.product2.yml'))
+        self.load()
+        self.assertNotIn('dev.product2.yml', Manifest(self.path).files)
+
+    def testUnwritable(self):
+        err = StringIO()
+        with redirect_stderr(err):
+            gen = QueueGenerator.load_dir(
+                    self.queues, manifest=Manifest('/proc/nope/manifest.json'))
+
+        self.assertEqual(4, gen.parsed)
+        self.assertIn('could not save', err.getvalue())
@@ -0,0 +1,99 @@
+"""
+Queue diffs
+-----------
+
+Compare two queue trees, such as two
+:py:class:`hadmin.yarn.CapacityScheduler` configurations, and report the
+queues that were added or removed and the attributes that changed.
+
+Subtrees whose :py:attr:`hadmin.yarn.Queue.content_hash` is the same in both
+trees are skipped without being compared queue by queue.
+"""
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+
+class Change:
+    """
+    One difference between two queue trees
+
+    kind is one of ADDED, REMOVED or CHANGED. For CHANGED, attr names the
+    attribute and old and new hold its values.
+    """
+
+    def __init__(self, kind, queue, attr=None, old=None, new=None):
+        self.kind = kind
+        self.queue = queue
+        self.attr = attr
+        self.old = old
+        self.new = new
+
+    def __str__(self):
+        if self.kind == ADDED:
+            return '+ ' + self.queue
+
+        if self.kind == REMOVED:
+            return '- ' + self.queue
+
+        if isinstance(self.old, frozenset):
+            delta = ['+' + n for n in sorted(self.new - self.old)]
+            delta += ['-' + n for n in sorted(self.old - self.new)]
+            return '~ ' + self.queue + ' ' + self.attr + ': ' + ' '.join(delta)
+
+        return ('~ ' + self.queue + ' ' + self.attr + ': ' + str(self.old) +
+                ' -> ' + str(self.new))
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return '<Change ' + str(self) + '>'
+
+
+def diff(old, new):
+    """
+    Compare the queue trees rooted at old and new. Returns a list of
+    :py:class:`Change`, ordered by queue name.
+    """
+
+    changes = []
+
+    def added(q, fqn):
+        changes.append(Change(ADDED, fqn))
+        for sub in q.subqueues:
+            added(sub, fqn + '.' + sub.name)
+
+    def removed(q, fqn):
+        changes.append(Change(REMOVED, fqn))
+        for sub in q.subqueues:
+            removed(sub, fqn + '.' + sub.name)
+
+    def compare(a, b, fqn):
+        if a.content_hash == b.content_hash:
+            return
+
+        for (attr, va), (_, vb) in zip(a.attributes(), b.attributes()):
+            if va != vb:
+                changes.append(Change(CHANGED, fqn, attr, va, vb))
+
+        a_subs = dict((q.name, q) for q in a.subqueues)
+        b_subs = dict((q.name, q) for q in b.subqueues)
+
+        for name in sorted(set(a_subs) | set(b_subs)):
+            sub_fqn = fqn + '.' + name
+
+            if name not in b_subs:
+                removed(a_subs[name], sub_fqn)
+            elif name not in a_subs:
+                added(b_subs[name], sub_fqn)
+            else:
+                compare(a_subs[name], b_subs[name], sub_fqn)
+
+    compare(old, new, new.name)
+
+    return sorted(changes, key=lambda c: c.queue)
@@ -0,0 +1,47 @@
+from unittest2 import TestCase
+from hadmin.diff import diff
+from hadmin.yarn import CapacityScheduler, Queue
+
+
+class DiffTest(TestCase):
+
+    def setUp(self):
+        self.old = CapacityScheduler.from_file('data/capacity-scheduler.xml')
+        self.new = CapacityScheduler.from_file('data/capacity-scheduler.xml')
+
+    def changes(self):
+        return [str(c) for c in diff(self.old.root_queue,
+                                     self.new.root_queue)]
+
+    def testSame(self):
+        self.assertEqual([], self.changes())
+
+    def testCapacity(self):
+        self.new.queue('a').cap_min = 60
+        self.assertEqual(['~ root.a capacity: 50.0 -> 60.0'], self.changes())
+
+    def testUsers(self):
+        self.new.queue('a').users.append('bob')
+        self.new.queue('a').users.remove('root')
+        self.assertEqual(['~ root.a users: +bob -root'], self.changes())
+
+    def testState(self):
+        self.new.queue('b').running = False
+        self.assertEqual(['~ root.b state: RUNNING -> STOPPED'],
+                         self.changes())
+
+    def testAdded(self):
+        q = Queue(name='c')
+        q.subqueues.append(Queue(name='d'))
+        self.new.root_queue.subqueues.append(q)
+        self.assertIn('+ root.c', self.changes())
+        self.assertIn('+ root.c.d', self.changes())
+
+    def testRemoved(self):
+        self.new.root_queue.subqueues.remove(self.new.queue('b'))
+        self.assertEqual(['- root.b'], self.changes())
+
+    def testSubqueueOrderIgnored(self):
+        self.new.root_queue.subqueues = list(
+                reversed(self.new.root_queue.subqueues))
+        self.assertEqual([], self.changes())
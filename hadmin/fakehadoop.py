@@ -0,0 +1,541 @@
+"""
+Fake Hadoop daemons
+-------------------
+
+Local HTTP servers that stand in for Hadoop daemons, to load-test
+``hadmin-stats-influxd`` and the checks without a cluster. Unlike the
+connection mocks in :py:mod:`hadmin.mock`, these listen on real ports, so
+hadmin talks to them exactly as it talks to Hadoop.
+
+A :py:class:`FakeCluster` generates the responses with
+:py:mod:`hadmin.synthetic`, scaled to its numbers of nodes, queues and JMX
+beans. Each :py:class:`FakeDaemon` serves one role's endpoints:
+
+* ``rm``: ``/ws/v1/cluster/metrics``, ``/ws/v1/cluster/scheduler`` and
+  ``/jmx``
+* ``nm``: ``/ws/v1/node``, ``/ws/v1/node/info`` and ``/jmx``
+* ``nn`` and ``dn``: ``/jmx``
+* ``influx``: accepts ``POST /write`` like InfluxDB, and counts the points
+
+Responses carry an ``ETag`` and conditional requests are answered with
+``304 Not Modified``, as :py:class:`hadmin.cache.SnapshotCache` expects.
+:py:class:`Faults` adds latency, errors and slow bodies to the Hadoop
+daemons; the fake InfluxDB always behaves.
+
+A :py:class:`Fleet` runs many daemons at once. From the command line, it
+prints the addresses of its daemons as JSON and serves until it is
+interrupted or terminated, when it prints what each role served::
+
+    python -m hadmin.fakehadoop --nodes 200 --queues 1000 --latency 0.05
+"""
+
+from argparse import ArgumentParser
+from hadmin.jmx import JMX_PATH
+from hadmin.rest import NM_INFO_PATH, RM_METRICS_PATH, RM_SCHEDULER_PATH
+import hadmin.synthetic as synthetic
+import hashlib
+import json
+import random
+import signal
+import sys
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+ROLES = ['dn', 'influx', 'nm', 'nn', 'rm']
+
+NM_PATHS = [NM_INFO_PATH, NM_INFO_PATH + '/info']
+
+PATHS = {
+    'dn': [JMX_PATH],
+    'influx': [],
+    'nm': NM_PATHS + [JMX_PATH],
+    'nn': [JMX_PATH],
+    'rm': [RM_METRICS_PATH, RM_SCHEDULER_PATH, JMX_PATH]
+    }
+
+# The service name in the filler JMX beans of each role
+SERVICES = {
+    'dn': 'DataNode',
+    'nm': 'NodeManager',
+    'nn': 'NameNode',
+    'rm': 'ResourceManager'
+    }
+
+DEFAULT_NODES = 100
+
+DEFAULT_QUEUES = 1000
+
+DEFAULT_BEANS = 50
+
+DEFAULT_SLOW_CHUNKS = 10
+
+DEFAULT_SLOW_DELAY = 0.05
+
+# One node in this many is unhealthy, as in
+# :py:func:`hadmin.synthetic.cluster_metrics_json`
+UNHEALTHY_EVERY = 50
+
+# One DataNode in this many has a failed volume
+FAILED_VOLUME_EVERY = 100
+
+# Connections a daemon lets wait to be accepted, since load tests open many
+# at once
+BACKLOG = 128
+
+INJECTED_ERROR = b'{"error": "injected by hadmin.fakehadoop"}'
+
+
+class FakeCluster:
+    """
+    The responses of a made-up cluster of nodes NodeManagers and DataNodes,
+    with a scheduler of queues queues and beans beans in every ``/jmx``
+    response. Bodies are generated the first time they are asked for and
+    then reused.
+    """
+
+    def __init__(self, nodes=DEFAULT_NODES, queues=DEFAULT_QUEUES,
+                 beans=DEFAULT_BEANS, fanout=synthetic.DEFAULT_FANOUT,
+                 load=0.5):
+        self.nodes = nodes
+        self.queues = queues
+        self.beans = beans
+        self.fanout = fanout
+        self.load = load
+        self._bodies = dict()
+        self._lock = threading.Lock()
+
+    def healthy(self, index):
+        """
+        Whether NodeManager index is healthy
+        """
+
+        return index % UNHEALTHY_EVERY != UNHEALTHY_EVERY - 1
+
+    def failed_volumes(self, index):
+        """
+        The number of failed volumes of DataNode index
+        """
+
+        if index % FAILED_VOLUME_EVERY == FAILED_VOLUME_EVERY - 1:
+            return 1
+
+        return 0
+
+    def variant(self, role, index):
+        """
+        Identify what sets daemon index's responses apart from those of the
+        other daemons of role, so that identical ones are generated once
+        """
+
+        if role == 'nm':
+            return index
+
+        if role == 'dn':
+            return self.failed_volumes(index)
+
+        return 0
+
+    def document(self, role, index, path):
+        """
+        Get the response of daemon index of role at path as a dict, or None
+        if it serves nothing there
+        """
+
+        if path not in PATHS[role]:
+            return None
+
+        if path == JMX_PATH:
+            if role == 'dn':
+                return synthetic.datanode_jmx_json(
+                        self.beans, self.failed_volumes(index))
+
+            if role == 'nn':
+                return synthetic.namenode_jmx_json(self.beans)
+
+            return {'beans': [synthetic.filler_bean(SERVICES[role], i)
+                              for i in range(self.beans)]}
+
+        if path == RM_METRICS_PATH:
+            return synthetic.cluster_metrics_json(self.nodes, self.load)
+
+        if path == RM_SCHEDULER_PATH:
+            return synthetic.scheduler_json(self.queues, self.fanout,
+                                            self.load)
+
+        return synthetic.nodemanager_json(index, self.healthy(index))
+
+    def response(self, role, index, path):
+        """
+        Get the body daemon index of role serves at path, as bytes, and its
+        ETag. Returns (None, None) if it serves nothing there.
+        """
+
+        k = (role, self.variant(role, index), path)
+
+        with self._lock:
+            if k in self._bodies:
+                return self._bodies[k]
+
+        doc = self.document(role, index, path)
+        if doc is None:
+            return None, None
+
+        body = json.dumps(doc).encode('utf-8')
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+
+        with self._lock:
+            self._bodies[k] = (body, etag)
+
+        return body, etag
+
+    def warm(self, role, index):
+        """
+        Generate all of the responses of daemon index of role
+        """
+
+        for path in PATHS[role]:
+            self.response(role, index, path)
+
+
+class Faults:
+    """
+    Misbehaviour to inject into a daemon's responses. Every response waits
+    latency seconds, plus up to jitter more. A share of error_rate of them
+    are answered with a 500, and a share of slow_rate send their body in
+    slow_chunks pieces, slow_delay seconds apart. A seed makes the choices
+    repeatable.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0,
+                 slow_rate=0.0, slow_chunks=DEFAULT_SLOW_CHUNKS,
+                 slow_delay=DEFAULT_SLOW_DELAY, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_chunks = slow_chunks
+        self.slow_delay = slow_delay
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def roll(self, rate):
+        """
+        Returns True with a probability of rate
+        """
+
+        if rate <= 0:
+            return False
+
+        with self._lock:
+            return self._random.random() < rate
+
+    def delay(self):
+        """
+        How long to wait before answering a request, in seconds
+        """
+
+        if self.jitter <= 0:
+            return self.latency
+
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    def error(self):
+        return self.roll(self.error_rate)
+
+    def slow(self):
+        return self.roll(self.slow_rate)
+
+
+class FakeDaemon:
+    """
+    A fake daemon of role, serving cluster's responses for node index on
+    host and port. Port 0 picks a free port; see :py:attr:`address`.
+    """
+
+    def __init__(self, role, cluster=None, index=0, faults=None,
+                 host='127.0.0.1', port=0):
+        if role not in ROLES:
+            raise ValueError('unknown role: ' + role)
+
+        self.role = role
+        self.cluster = cluster or FakeCluster()
+        self.index = index
+        self.faults = faults or Faults()
+        self.host = host
+        self.port = port
+        self.served = {'errors': 0, 'not_modified': 0, 'points': 0,
+                       'requests': 0}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def address(self):
+        """
+        The ``host:port`` the daemon listens on, once started
+        """
+
+        host, port = self._server.server_address[:2]
+        return host + ':' + str(port)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.served[name] += n
+
+    def respond(self, req, status, body=b'', etag=None, slow=False):
+        req.send_response(status)
+        req.send_header('Content-Type', 'application/json')
+        if status != 304:
+            req.send_header('Content-Length', str(len(body)))
+        if etag:
+            req.send_header('ETag', etag)
+        req.end_headers()
+
+        if not slow:
+            req.wfile.write(body)
+            return
+
+        step = max(1, -(-len(body) // self.faults.slow_chunks))
+        for i in range(0, len(body), step):
+            req.wfile.write(body[i:i + step])
+            req.wfile.flush()
+            time.sleep(self.faults.slow_delay)
+
+    def handle_get(self, req):
+        self.count('requests')
+
+        body, etag = None, None
+        if self.role != 'influx':
+            body, etag = self.cluster.response(self.role, self.index,
+                                               req.path.split('?')[0])
+
+        if body is None:
+            self.respond(req, 404, b'{}')
+            return
+
+        time.sleep(self.faults.delay())
+
+        if self.faults.error():
+            self.count('errors')
+            self.respond(req, 500, INJECTED_ERROR)
+            return
+
+        if req.headers.get('If-None-Match') == etag:
+            self.count('not_modified')
+            self.respond(req, 304, etag=etag)
+            return
+
+        self.respond(req, 200, body, etag, self.faults.slow())
+
+    def handle_post(self, req):
+        length = int(req.headers.get('Content-Length') or 0)
+        body = req.rfile.read(length)
+
+        if self.role != 'influx' or req.path.split('?')[0] != '/write':
+            self.respond(req, 404, b'{}')
+            return
+
+        self.count('requests')
+        self.count('points', len([line for line in body.splitlines()
+                                  if line.strip()]))
+        self.respond(req, 204)
+
+    def start(self):
+        """
+        Generate the daemon's responses and start serving them from a
+        background thread. Returns the address the daemon listens on.
+        """
+
+        if self.role != 'influx':
+            self.cluster.warm(self.role, self.index)
+
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections open between requests, like Hadoop's Jetty
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                daemon.handle_get(self)
+
+            def do_POST(self):
+                daemon.handle_post(self)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+            request_queue_size = BACKLOG
+
+            def handle_error(self, request, client_address):
+                # Clients that give up on a slow body are expected
+                if not isinstance(sys.exc_info()[1], (IOError, OSError)):
+                    HTTPServer.handle_error(self, request, client_address)
+
+        self._server = Server((self.host, self.port), Handler)
+
+        t = threading.Thread(target=self._server.serve_forever)
+        t.daemon = True
+        t.start()
+
+        return self.address
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class Fleet:
+    """
+    Fake daemons sharing a cluster. counts maps each role to how many
+    daemons of it to run. faults apply to all but the fake InfluxDB.
+    """
+
+    def __init__(self, cluster, counts, faults=None, host='127.0.0.1'):
+        self.cluster = cluster
+        self.daemons = []
+
+        for role in sorted(counts):
+            for i in range(counts[role]):
+                self.daemons.append(FakeDaemon(
+                        role, cluster, i,
+                        faults if role != 'influx' else None, host))
+
+    def start(self):
+        """
+        Start every daemon. Returns :py:meth:`addresses`.
+        """
+
+        for d in self.daemons:
+            d.start()
+
+        return self.addresses()
+
+    def addresses(self):
+        """
+        Get a dict of each role to the addresses of its daemons
+        """
+
+        ret = dict()
+        for d in self.daemons:
+            ret.setdefault(d.role, []).append(d.address)
+
+        return ret
+
+    def served(self):
+        """
+        Get a dict of each role to what its daemons served, added up
+        """
+
+        ret = dict()
+        for d in self.daemons:
+            totals = ret.setdefault(d.role, dict())
+            for k, v in d.served.items():
+                totals[k] = totals.get(k, 0) + v
+
+        return ret
+
+    def stop(self):
+        # Each daemon takes up to half a second to notice it should stop, so
+        # stop them all at once
+        threads = [threading.Thread(target=d.stop) for d in self.daemons]
+
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+
+def raise_open_files_limit():
+    """
+    Raise the limit on open files as far as allowed, since every daemon and
+    connection takes a file descriptor
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def main(argv):
+    parser = ArgumentParser(prog='python -m hadmin.fakehadoop',
+                            description='Serve fake Hadoop daemons')
+    parser.add_argument('--bind', dest='bind', default='127.0.0.1',
+                        help='Address to listen on')
+    parser.add_argument('--nodes', dest='nodes', type=int,
+                        default=DEFAULT_NODES,
+                        help='Number of NodeManagers and DataNodes')
+    parser.add_argument('--queues', dest='queues', type=int,
+                        default=DEFAULT_QUEUES,
+                        help="Number of queues in the ResourceManager's "
+                        'scheduler')
+    parser.add_argument('--beans', dest='beans', type=int,
+                        default=DEFAULT_BEANS,
+                        help='Number of beans in every /jmx response')
+    parser.add_argument('--latency', dest='latency', type=float, default=0.0,
+                        help='Seconds to wait before every response')
+    parser.add_argument('--jitter', dest='jitter', type=float, default=0.0,
+                        help='Wait up to this many more seconds at random')
+    parser.add_argument('--error-rate', dest='error_rate', type=float,
+                        default=0.0,
+                        help='Share of requests to answer with a 500')
+    parser.add_argument('--slow-rate', dest='slow_rate', type=float,
+                        default=0.0,
+                        help='Share of responses to send slowly')
+    parser.add_argument('--slow-chunks', dest='slow_chunks', type=int,
+                        default=DEFAULT_SLOW_CHUNKS,
+                        help='Pieces to send a slow response in')
+    parser.add_argument('--slow-delay', dest='slow_delay', type=float,
+                        default=DEFAULT_SLOW_DELAY,
+                        help='Seconds between the pieces of a slow response')
+    parser.add_argument('--seed', dest='seed', type=int, default=None,
+                        help='Seed for repeatable faults')
+    args = parser.parse_args(argv)
+
+    raise_open_files_limit()
+
+    cluster = FakeCluster(args.nodes, args.queues, args.beans)
+    faults = Faults(args.latency, args.jitter, args.error_rate,
+                    args.slow_rate, args.slow_chunks, args.slow_delay,
+                    args.seed)
+    fleet = Fleet(cluster, {'dn': args.nodes, 'influx': 1, 'nm': args.nodes,
+                            'nn': 1, 'rm': 1}, faults, args.bind)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    print(json.dumps(fleet.start(), sort_keys=True))
+    sys.stdout.flush()
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fleet.stop()
+        print(json.dumps(fleet.served(), sort_keys=True))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
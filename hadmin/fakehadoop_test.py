@@ -0,0 +1,219 @@
+from hadmin.fakehadoop import FakeCluster, FakeDaemon, Faults, Fleet
+from hadmin.jmx import DataNodeJMX, NameNodeJMX
+from hadmin.rest import NodeManager, ResourceManager
+from unittest2 import TestCase
+import hadmin.cache
+import hadmin.rest
+import json
+import time
+
+try:
+    from http.client import HTTPConnection
+except ImportError:
+    from httplib import HTTPConnection
+
+
+class FakeClusterTest(TestCase):
+
+    def setUp(self):
+        self.cluster = FakeCluster(nodes=100, queues=31, beans=10)
+
+    def testScheduler(self):
+        body, etag = self.cluster.response('rm', 0, '/ws/v1/cluster/scheduler')
+        rm = ResourceManager(json.loads(body.decode('utf-8')))
+
+        self.assertEqual(30, len(rm.queue_metrics()) // 6)
+        self.assertTrue(etag.startswith('"'))
+
+    def testNodesDiffer(self):
+        a, _ = self.cluster.response('nm', 0, '/ws/v1/node')
+        b, _ = self.cluster.response('nm', 1, '/ws/v1/node')
+
+        self.assertNotEqual(a, b)
+        self.assertFalse(self.cluster.healthy(49))
+
+    def testDataNodesShared(self):
+        a, _ = self.cluster.response('dn', 0, '/jmx')
+
+        self.assertIs(a, self.cluster.response('dn', 1, '/jmx')[0])
+        self.assertIsNot(a, self.cluster.response('dn', 99, '/jmx')[0])
+
+    def testNotServed(self):
+        self.assertEqual((None, None),
+                         self.cluster.response('dn', 0, '/ws/v1/node'))
+        self.assertEqual((None, None), self.cluster.response('nn', 0, '/'))
+
+
+class FaultsTest(TestCase):
+
+    def testNone(self):
+        faults = Faults()
+
+        self.assertEqual(0.0, faults.delay())
+        self.assertFalse(faults.error())
+        self.assertFalse(faults.slow())
+
+    def testRates(self):
+        faults = Faults(error_rate=0.25, seed=1)
+        errors = sum(1 for _ in range(1000) if faults.error())
+
+        self.assertGreater(errors, 150)
+        self.assertLess(errors, 350)
+
+    def testJitter(self):
+        faults = Faults(latency=0.1, jitter=0.1, seed=1)
+
+        for _ in range(100):
+            self.assertTrue(0.1 <= faults.delay() <= 0.2)
+
+    def testRepeatable(self):
+        a = Faults(error_rate=0.5, seed=7)
+        b = Faults(error_rate=0.5, seed=7)
+
+        self.assertEqual([a.error() for _ in range(20)],
+                         [b.error() for _ in range(20)])
+
+
+class FakeDaemonTest(TestCase):
+
+    def setUp(self):
+        self.cluster = FakeCluster(nodes=10, queues=11, beans=5)
+        self.faults = Faults()
+        self.daemons = []
+
+    def tearDown(self):
+        for d in self.daemons:
+            d.stop()
+
+    def start(self, role, index=0):
+        d = FakeDaemon(role, self.cluster, index, self.faults)
+        d.start()
+        self.daemons.append(d)
+        return d
+
+    def get(self, daemon, path, headers=dict()):
+        conn = HTTPConnection(daemon.address)
+        try:
+            conn.request('GET', path, headers=headers)
+            res = conn.getresponse()
+            return res.status, res.read(), res.getheader('ETag')
+        finally:
+            conn.close()
+
+    def testDataNode(self):
+        jmx = DataNodeJMX()
+        jmx.load_from_host(self.start('dn', 99).address)
+
+        self.assertEqual(1, jmx.getFailedVolumes())
+
+    def testNameNode(self):
+        nn = NameNodeJMX()
+        nn.load_from_host(self.start('nn').address)
+
+        self.assertEqual(3, nn.getCorruptBlocks())
+
+    def testNodeManager(self):
+        nm = NodeManager.load_from_host(self.start('nm', 49).address,
+                                        path=hadmin.rest.NM_INFO_PATH)
+
+        self.assertFalse(nm.isHealthy())
+
+    def testResourceManager(self):
+        paths = [hadmin.rest.RM_METRICS_PATH, hadmin.rest.RM_SCHEDULER_PATH]
+        rm = ResourceManager.load_from_host(self.start('rm').address,
+                                            paths=paths)
+
+        self.assertEqual(10, rm.nodes_total)
+        self.assertEqual(10, len(rm.queues))
+
+    def testNotFound(self):
+        self.assertEqual(404, self.get(self.start('dn'), '/ws/v1/node')[0])
+
+    def testNotModified(self):
+        d = self.start('nn')
+        status, _, etag = self.get(d, '/jmx')
+
+        self.assertEqual(200, status)
+        self.assertEqual(304, self.get(d, '/jmx', {'If-None-Match': etag})[0])
+        self.assertEqual(1, d.served['not_modified'])
+
+    def testSnapshotCacheRevalidates(self):
+        d = self.start('dn')
+        cache = hadmin.cache.SnapshotCache(ttl=0)
+
+        for _ in range(3):
+            jmx = DataNodeJMX()
+            jmx.load_from_host(d.address, cache=cache)
+            self.assertEqual(0, jmx.getFailedVolumes())
+
+        self.assertEqual(2, d.served['not_modified'])
+
+    def testError(self):
+        self.faults.error_rate = 1.0
+        d = self.start('dn')
+
+        self.assertEqual(500, self.get(d, '/jmx')[0])
+        self.assertEqual(1, d.served['errors'])
+
+    def testLatency(self):
+        self.faults.latency = 0.1
+        d = self.start('dn')
+
+        start = time.time()
+        self.get(d, '/jmx')
+        self.assertGreaterEqual(time.time() - start, 0.1)
+
+    def testSlowBody(self):
+        self.faults.slow_rate = 1.0
+        self.faults.slow_chunks = 4
+        self.faults.slow_delay = 0.05
+        d = self.start('nn')
+
+        start = time.time()
+        status, body, _ = self.get(d, '/jmx')
+
+        # The client has the whole body after the last piece, before the
+        # last delay
+        self.assertGreaterEqual(time.time() - start, 0.15)
+        self.assertEqual(self.cluster.response('nn', 0, '/jmx')[0], body)
+
+    def testInflux(self):
+        d = self.start('influx')
+
+        conn = HTTPConnection(d.address)
+        conn.request('POST', '/write?db=x', body=b'a value=1 1\nb value=2 1')
+        res = conn.getresponse()
+        res.read()
+        conn.close()
+
+        self.assertEqual(204, res.status)
+        self.assertEqual(2, d.served['points'])
+
+    def testUnknownRole(self):
+        with self.assertRaises(ValueError):
+            FakeDaemon('jt')
+
+
+class FleetTest(TestCase):
+
+    def testFleet(self):
+        fleet = Fleet(FakeCluster(nodes=3, queues=5, beans=5),
+                      {'dn': 3, 'influx': 1, 'nn': 1},
+                      Faults(error_rate=1.0))
+        addresses = fleet.start()
+
+        try:
+            self.assertEqual(3, len(addresses['dn']))
+            self.assertEqual(3, len(set(addresses['dn'])))
+            self.assertNotIn('nm', addresses)
+
+            # The fake InfluxDB is spared the faults
+            self.assertEqual(0.0, fleet.daemons[3].faults.error_rate)
+
+            jmx = DataNodeJMX()
+            jmx.load_from_host(addresses['dn'][0])
+        finally:
+            fleet.stop()
+
+        self.assertEqual({'errors': 1, 'not_modified': 0, 'points': 0,
+                          'requests': 1}, fleet.served()['dn'])
@@ -0,0 +1,272 @@
+"""
+Offline fsimage audits
+----------------------
+
+Read directory owners, groups and permissions from an fsimage exported with
+``hdfs oiv``, so that ``hadmin fhs`` can check a cluster without asking the
+NameNode anything.
+
+Both the ``Delimited`` and ``XML`` processors' output is supported::
+
+    hdfs oiv -p Delimited -i fsimage_0000000000000000042 -o fsimage.tsv
+    hdfs oiv -p XML -i fsimage_0000000000000000042 -o fsimage.xml
+
+Images are read as a stream and only the paths being checked are kept, so
+memory use depends on the number of paths asked about rather than on the
+size of the image.
+
+The usage of directories (see :py:mod:`hadmin.usage`) can be computed from
+the Delimited export too.
+"""
+
+import posixpath
+import xml.etree.ElementTree as ET
+from hadmin.hdfs import Directory, perms_pretty_to_octal_str
+from hadmin.usage import Usage
+
+
+DELIMITER = '\t'
+
+
+def perms_to_octal_str(raw):
+    """
+    Turn a permission as oiv prints it (``drwxr-xr-x``, ``rwxrwxrwt`` or
+    ``0755``) into the four digit form :py:class:`hadmin.hdfs.Directory`
+    uses
+    """
+
+    if raw.isdigit():
+        return '%04o' % int(raw, 8)
+
+    if len(raw) == 9:
+        raw = 'd' + raw
+
+    return perms_pretty_to_octal_str(raw)
+
+
+def wanted_names(paths):
+    """
+    Get the set of path components needed to find paths, which includes the
+    names of all of their ancestors
+    """
+
+    names = set([''])
+
+    for path in paths:
+        names.update(p for p in path.split('/') if p)
+
+    return names
+
+
+def index_delimited(stream, paths, delimiter=DELIMITER):
+    """
+    Read the output of ``hdfs oiv -p Delimited`` from stream (an iterable of
+    lines) and get a dict of path to :py:class:`hadmin.hdfs.Directory` for
+    each of paths that is a directory in the image.
+    """
+
+    wanted = set(paths)
+    ret = dict()
+    cols = None
+
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+
+        fields = line.rstrip('\r\n').split(delimiter)
+
+        if cols is None:
+            cols = dict((name, i) for i, name in enumerate(fields))
+            path_col = cols['Path']
+            perm_col = cols['Permission']
+            user_col = cols['UserName']
+            group_col = cols['GroupName']
+            continue
+
+        if len(fields) <= max(perm_col, user_col, group_col):
+            continue
+
+        path = fields[path_col] or '/'
+        if path not in wanted:
+            continue
+
+        perms = fields[perm_col]
+        if not perms.startswith('d') and not perms.isdigit():
+            continue
+
+        ret[path] = Directory(path, fields[user_col], fields[group_col],
+                              perms_to_octal_str(perms))
+
+    return ret
+
+
+def usage_delimited(stream, paths, delimiter=DELIMITER):
+    """
+    Read the output of ``hdfs oiv -p Delimited`` from stream and total the
+    size of the files under each of paths. Returns a dict of path to
+    :py:class:`hadmin.usage.Usage`; paths that are not directories in the
+    image get a Usage whose size is None.
+    """
+
+    wanted = set(paths)
+    totals = dict()
+    cols = None
+
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+
+        fields = line.rstrip('\r\n').split(delimiter)
+
+        if cols is None:
+            cols = dict((name, i) for i, name in enumerate(fields))
+            path_col = cols['Path']
+            perm_col = cols['Permission']
+            size_col = cols['FileSize']
+            repl_col = cols['Replication']
+            continue
+
+        if len(fields) <= max(perm_col, size_col, repl_col):
+            continue
+
+        path = fields[path_col] or '/'
+
+        if fields[perm_col].startswith('d'):
+            if path in wanted:
+                totals.setdefault(path, [0, 0])
+            continue
+
+        size = int(fields[size_col])
+        consumed = size * int(fields[repl_col])
+
+        parent = path
+        while parent != '/':
+            parent = posixpath.dirname(parent)
+
+            if parent in wanted:
+                total = totals.setdefault(parent, [0, 0])
+                total[0] += size
+                total[1] += consumed
+
+    ret = dict()
+    for path in wanted:
+        if path in totals:
+            ret[path] = Usage(path, totals[path][0], totals[path][1])
+        else:
+            ret[path] = Usage(path, None, None)
+
+    return ret
+
+
+def index_xml(stream, paths):
+    """
+    Read the output of ``hdfs oiv -p XML`` from stream (a file object) and
+    get a dict of path to :py:class:`hadmin.hdfs.Directory` for each of
+    paths that is a directory in the image.
+
+    The XML format names each inode only relative to its parent, so only the
+    directories whose names appear somewhere in paths are kept while the
+    inodes stream past. The tree is then rebuilt from the directory section.
+    """
+
+    names = wanted_names(paths)
+    inodes = dict()
+    parents = dict()
+    stack = []
+
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        section = stack[-1].tag if stack else None
+
+        if elem.tag == 'inode' and section == 'INodeSection':
+            name = elem.findtext('name') or ''
+
+            if elem.findtext('type') == 'DIRECTORY' and name in names:
+                owner, group, perms = elem.findtext('permission').split(':')
+                inodes[elem.findtext('id')] = (name, owner, group,
+                                               perms_to_octal_str(perms))
+        elif elem.tag == 'directory' and section == 'INodeDirectorySection':
+            parent = elem.findtext('parent')
+
+            if parent in inodes:
+                for child in elem.findall('child'):
+                    if child.text in inodes:
+                        parents[child.text] = parent
+
+        # Drop everything that has been read, so that memory use does not
+        # grow with the size of the image
+        if len(stack) in (1, 2):
+            stack[-1].clear()
+
+    def path_of(inode):
+        name = inodes[inode][0]
+        parent = parents.get(inode)
+
+        if parent is None:
+            return '/' if name == '' else None
+
+        parent_path = path_of(parent)
+        if parent_path is None:
+            return None
+
+        return posixpath.join(parent_path, name)
+
+    wanted = set(paths)
+    ret = dict()
+
+    for inode, (_, owner, group, perms) in inodes.items():
+        path = path_of(inode)
+        if path in wanted:
+            ret[path] = Directory(path, owner, group, perms)
+
+    return ret
+
+
+def index_file(fname, paths):
+    """
+    Index the fsimage export in fname, picking the format from its first
+    character
+    """
+
+    with open(fname, 'rb') as f:
+        first = f.read(1024).lstrip()[:1]
+        f.seek(0)
+
+        if first == b'<':
+            return index_xml(f, paths)
+
+        return index_delimited(f, paths)
+
+
+class FSImageBackend:
+    """
+    Reads HDFS directories from an fsimage export, with the same interface
+    as :py:class:`hadmin.hdfs.ShellBackend`. An image cannot be written to.
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+
+    def statuses(self, paths):
+        return index_file(self.fname, paths)
+
+    def write(self, dirs):
+        raise IOError('cannot fix up directories in an fsimage')
+
+    def usage(self, paths):
+        """
+        Get the usage of paths from a Delimited export. See
+        :py:func:`usage_delimited`.
+        """
+
+        with open(self.fname, 'rb') as f:
+            if f.read(1024).lstrip()[:1] == b'<':
+                raise ValueError('usage can only be read from a Delimited '
+                                 'fsimage export')
+
+            f.seek(0)
+            return usage_delimited(f, paths)
@@ -0,0 +1,85 @@
+from hadmin.fsimage import FSImageBackend, index_file, perms_to_octal_str
+from hadmin.hdfs import Directory
+from unittest2 import TestCase
+
+
+PATHS = ['/', '/tmp', '/tmp/job.xml', '/user', '/user/bob', '/user/alice',
+         '/user/carol']
+
+
+class PermsToOctalStrTest(TestCase):
+
+    def testDirectory(self):
+        self.assertEqual('0750', perms_to_octal_str('drwxr-x---'))
+
+    def testNoType(self):
+        self.assertEqual('1777', perms_to_octal_str('rwxrwxrwt'))
+
+    def testOctal(self):
+        self.assertEqual('0755', perms_to_octal_str('755'))
+
+
+class IndexDelimitedTest(TestCase):
+
+    fname = 'data/fsimage.tsv'
+
+    def setUp(self):
+        self.index = index_file(self.fname, PATHS)
+
+    def testOnlyWantedDirectories(self):
+        self.assertEqual(['/', '/tmp', '/user', '/user/alice', '/user/bob'],
+                         sorted(self.index))
+
+    def testSticky(self):
+        self.assertEqual(Directory('/tmp', 'yarn', 'hadoop', '1777'),
+                         self.index['/tmp'])
+
+    def testHome(self):
+        self.assertEqual(Directory('/user/bob', 'bob', 'hadoop', '0750'),
+                         self.index['/user/bob'])
+
+    def testSameNameElsewhere(self):
+        index = index_file(self.fname, ['/data/bob'])
+        self.assertEqual('0777', index['/data/bob'].perms)
+
+
+class IndexXMLTest(IndexDelimitedTest):
+
+    fname = 'data/fsimage.xml'
+
+
+class FSImageBackendTest(TestCase):
+
+    def testStatuses(self):
+        backend = FSImageBackend('data/fsimage.xml')
+        self.assertEqual(['/user/alice'],
+                         list(backend.statuses(['/user/alice'])))
+
+    def testWrite(self):
+        backend = FSImageBackend('data/fsimage.xml')
+        with self.assertRaises(IOError):
+            backend.write([Directory('/user/carol', 'carol', 'hadoop',
+                                     '0750')])
+
+
+class UsageDelimitedTest(TestCase):
+
+    def setUp(self):
+        backend = FSImageBackend('data/fsimage.tsv')
+        self.usages = backend.usage(['/', '/tmp', '/user/bob', '/user/carol'])
+
+    def testTotals(self):
+        self.assertEqual((2048, 6144),
+                         (self.usages['/tmp'].size,
+                          self.usages['/tmp'].consumed))
+        self.assertEqual(2048, self.usages['/'].size)
+
+    def testEmpty(self):
+        self.assertEqual(0, self.usages['/user/bob'].size)
+
+    def testMissing(self):
+        self.assertFalse(self.usages['/user/carol'].exists)
+
+    def testXML(self):
+        with self.assertRaises(ValueError):
+            FSImageBackend('data/fsimage.xml').usage(['/'])
@@ -6,7 +6,66 @@ HDFS management. Manage the filesystem, get namenode stats, etc.
 """
 
 
+from hadmin.runner import NOT_FOUND, ThreadRunner
 from hadmin.util import run_or_warn
+import re
+
+
+HDFS_DFS = ['hdfs', 'dfs']
+
+LS_COMMAND = HDFS_DFS + ['-ls', '-d']
+
+# How many paths to hand to a single `hdfs dfs -ls -d`, which keeps the
+# command line well under the kernel's argument length limit
+LS_CHUNK_SIZE = 500
+
+DEFAULT_FIXUP_WORKERS = 4
+
+# Seconds a single fixup command may run before it is killed
+DEFAULT_FIXUP_TIMEOUT = 300
+
+
+# How hdfs dfs -ls, -du and -count report a path that does not exist
+MISSING_RE = re.compile(r"^\w+: `(.*)': No such file or directory$")
+
+
+def missing_paths(errors):
+    """
+    Get the set of paths an ``hdfs dfs`` command's standard error says do
+    not exist. Lines about anything else, such as log4j warnings, are left
+    out.
+    """
+
+    ret = set()
+
+    for line in errors.splitlines():
+        m = MISSING_RE.match(line.strip())
+        if m:
+            ret.add(m.group(1))
+
+    return ret
+
+
+def check_results(command, path_chunks, results, found):
+    """
+    Raise IOError unless each of results, from running command on the
+    matching chunk of path_chunks, succeeded or failed only because the
+    paths of its chunk that are not in found do not exist.
+
+    ``hdfs dfs -ls``, ``-du`` and ``-count`` exit non-zero if any path is
+    missing, but still report the rest.
+    """
+
+    for chunk, r in zip(path_chunks, results):
+        if r.ok:
+            continue
+
+        unreported = set(p for p in chunk if p not in found)
+
+        if r.status == NOT_FOUND or r.timed_out or \
+                not unreported <= missing_paths(r.errors):
+            raise IOError('failed to run ' + ' '.join(command) + ': ' +
+                          r.errors.strip())
 
 
 def perms_pretty_to_octal_str(raw):
@@ -59,6 +118,37 @@ class Directory:
         return Directory(path, owner, group,
                          perms_pretty_to_octal_str(perms_raw))
 
+    @classmethod
+    def index_from_hdfs_ls(cls, output):
+        """
+        Parse the output of ``hdfs dfs -ls`` into a dict of path to
+        Directory. Lines that are not listings, such as ``Found 3 items`` or
+        errors about missing paths, are skipped.
+        """
+
+        ret = dict()
+
+        for line in output.splitlines():
+            d = cls.from_hdfs_ls_line(line)
+            if d is not None:
+                ret[d.path] = d
+
+        return ret
+
+    @classmethod
+    def from_hdfs_ls_line(cls, line):
+        """
+        Parse one line of ``hdfs dfs -ls`` output, or get None if the line
+        is not a listing
+        """
+
+        arr = line.split(None, 7)
+        if len(arr) < 8 or len(arr[0]) < 10 or arr[0][0] not in 'd-':
+            return None
+
+        return Directory(arr[7], arr[2], arr[3],
+                         perms_pretty_to_octal_str(arr[0]))
+
     @classmethod
     def from_hdfs(cls, path):
         listing = run_or_warn('hdfs dfs -ls -d ' + path,
@@ -111,6 +201,139 @@ class Directory:
         return ' '.join([self.perms, self.owner, self.group, self.path])
 
 
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def fixup_commands(dirs, hdfs=HDFS_DFS, chunk_size=LS_CHUNK_SIZE):
+    """
+    Get the commands that create dirs and fix their owners, groups and
+    perms, as two lists of argument lists.
+
+    The first list holds the ``-mkdir -p`` commands, which must finish
+    before anything in the second list runs. The second list holds one
+    ``-chown`` per owner and group and one ``-chmod`` per set of perms, each
+    covering up to chunk_size paths. The commands in each list are
+    independent of each other.
+    """
+
+    paths = sorted(set(d.path for d in dirs))
+    by_owner = dict()
+    by_perms = dict()
+
+    for d in dirs:
+        by_owner.setdefault(d.owner + ':' + d.group, set()).add(d.path)
+        by_perms.setdefault(d.perms, set()).add(d.path)
+
+    mkdirs = [hdfs + ['-mkdir', '-p'] + chunk
+              for chunk in chunks(paths, chunk_size)]
+
+    changes = []
+    for owner in sorted(by_owner):
+        changes += [hdfs + ['-chown', owner] + chunk
+                    for chunk in chunks(sorted(by_owner[owner]), chunk_size)]
+
+    for perms in sorted(by_perms):
+        changes += [hdfs + ['-chmod', perms] + chunk
+                    for chunk in chunks(sorted(by_perms[perms]), chunk_size)]
+
+    return mkdirs, changes
+
+
+class FixupExecutor:
+    """
+    Runs fixup commands, at most workers at a time, killing any that take
+    longer than timeout seconds
+    """
+
+    def __init__(self, workers=DEFAULT_FIXUP_WORKERS,
+                 timeout=DEFAULT_FIXUP_TIMEOUT):
+        self.runner = ThreadRunner(workers, timeout)
+
+    def run_command(self, argv, parser=None):
+        """
+        Run argv and get a :py:class:`hadmin.runner.Result`
+        """
+
+        return self.runner.run(argv, parser)
+
+    def run_all(self, cmds, parsers=None):
+        """
+        Run the independent commands in cmds concurrently. Returns their
+        :py:class:`hadmin.runner.Result` objects in the same order.
+        """
+
+        return self.runner.run_all(cmds, parsers)
+
+    def run(self, stages):
+        """
+        Run each list of commands in stages in turn, warning about the ones
+        that fail. Returns True if they all succeeded.
+        """
+
+        ok = True
+
+        for cmds in stages:
+            for argv, ret in zip(cmds, self.run_all(cmds)):
+                if ret.status != 0:
+                    ok = False
+                    print('failed to run ' + ' '.join(argv) + ': ' +
+                          (ret.errors or ret.output).strip())
+
+        return ok
+
+
+class ShellBackend:
+    """
+    Reads and writes HDFS directories through the ``hdfs`` command line
+    client.
+
+    Every ``hdfs`` invocation starts a JVM, so :py:meth:`statuses` lists as
+    many paths as possible in each invocation, and :py:meth:`write` groups
+    the fixups into a few commands run by a :py:class:`FixupExecutor`.
+    """
+
+    def __init__(self, ls_command=None, chunk_size=LS_CHUNK_SIZE,
+                 hdfs_command=None, executor=None):
+        self.ls_command = ls_command or LS_COMMAND
+        self.chunk_size = chunk_size
+        self.hdfs_command = hdfs_command or HDFS_DFS
+        self.executor = executor or FixupExecutor()
+
+    def statuses(self, paths):
+        """
+        Get a dict of path to :py:class:`Directory` for each of paths that
+        exists. Paths that do not exist are left out. Raises IOError if a
+        listing could not be run or failed for any other reason.
+        """
+
+        paths = sorted(set(paths))
+        ret = dict()
+
+        def parse(line):
+            d = Directory.from_hdfs_ls_line(line)
+            if d is not None:
+                ret[d.path] = d
+
+        path_chunks = list(chunks(paths, self.chunk_size))
+        cmds = [self.ls_command + chunk for chunk in path_chunks]
+        results = self.executor.run_all(cmds, [parse] * len(cmds))
+        check_results(self.ls_command, path_chunks, results, ret)
+
+        return ret
+
+    def write(self, dirs):
+        """
+        Create each of dirs if needed and fix its owner, group and perms.
+        See :py:func:`fixup_commands`. Returns True if every command
+        succeeded.
+        """
+
+        return self.executor.run(fixup_commands(dirs, self.hdfs_command,
+                                                self.chunk_size))
+
+
 class NameNode:
     """
     Deal with the namenode. Manage HDFS. etc.
@@ -1,5 +1,12 @@
-from hadmin.hdfs import Directory
+from hadmin.hdfs import Directory, FixupExecutor, HDFS_DFS, ShellBackend
+from hadmin.hdfs import fixup_commands, missing_paths
+from hadmin.runner import NOT_FOUND
 from unittest2 import TestCase
+import os
+import shutil
+import sys
+import tempfile
+import time
 
 
 class DirectoryTest(TestCase):
@@ -47,3 +54,195 @@ class DirectoryTest(TestCase):
 
     def testFromUsernameHasStar(self):
         self.assertEqual(Directory.from_username('talec*'), None)
+
+
+LS_OUTPUT = '''Found 2 items
+drwxr-xr-x   - hdfs hadoop          0 2016-01-01 00:00 /
+drwxrwxrwt   - yarn hadoop          0 2016-01-01 00:00 /tmp
+ls: `/user/nobody': No such file or directory
+drwxr-x---   - bob hadoop           0 2016-01-01 00:00 /user/bob smith
+'''
+
+FAKE_LS = [sys.executable, '-c', '''import sys
+status = 0
+if any('warn' in p for p in sys.argv[1:]):
+    sys.stderr.write('WARN util.NativeCodeLoader: Unable to load '
+                     'native-hadoop library for your platform\\n')
+for p in sys.argv[1:]:
+    if 'missing' in p:
+        sys.stderr.write('ls: `' + p + "': No such file or directory\\n")
+        status = 1
+    elif 'denied' in p:
+        sys.stderr.write('ls: Permission denied: user=nobody, '
+                         'access=READ_EXECUTE, inode="' + p + '"\\n')
+        status = 1
+    else:
+        print('drwxr-x---   - hdfs hadoop 0 2016-01-01 00:00 ' + p)
+sys.exit(status)
+''']
+
+FAILING_LS = [sys.executable, '-c', '''import sys
+sys.stderr.write('ls: Permission denied: user=nobody\\n')
+sys.exit(1)
+''']
+
+
+class IndexFromHDFSLsTest(TestCase):
+
+    def setUp(self):
+        self.index = Directory.index_from_hdfs_ls(LS_OUTPUT)
+
+    def testPaths(self):
+        self.assertEqual(['/', '/tmp', '/user/bob smith'],
+                         sorted(self.index.keys()))
+
+    def testSticky(self):
+        self.assertEqual(Directory('/tmp', 'yarn', 'hadoop', '1777'),
+                         self.index['/tmp'])
+
+    def testMissingSkipped(self):
+        self.assertNotIn('/user/nobody', self.index)
+
+
+class ShellBackendTest(TestCase):
+
+    def testStatusesChunked(self):
+        paths = ['/user/' + str(i) for i in range(7)]
+        backend = ShellBackend(ls_command=FAKE_LS, chunk_size=3)
+        statuses = backend.statuses(paths)
+
+        self.assertEqual(sorted(paths), sorted(statuses.keys()))
+        self.assertEqual('0750', statuses['/user/3'].perms)
+
+    def testStatusesMissing(self):
+        backend = ShellBackend(ls_command=FAKE_LS)
+        statuses = backend.statuses(['/user/a', '/user/missing'])
+
+        self.assertEqual(['/user/a'], list(statuses.keys()))
+
+    def testStatusesAllMissing(self):
+        backend = ShellBackend(ls_command=FAKE_LS)
+        self.assertEqual(dict(), backend.statuses(['/user/missing']))
+
+    def testStatusesWarning(self):
+        backend = ShellBackend(ls_command=FAKE_LS)
+        statuses = backend.statuses(['/user/warn', '/user/missing'])
+
+        self.assertEqual(['/user/warn'], list(statuses.keys()))
+
+    def testStatusesPartlyDenied(self):
+        backend = ShellBackend(ls_command=FAKE_LS)
+
+        with self.assertRaises(IOError) as cm:
+            backend.statuses(['/user/a', '/user/denied', '/user/missing'])
+
+        self.assertIn('Permission denied', str(cm.exception))
+
+    def testStatusesFailed(self):
+        backend = ShellBackend(ls_command=FAILING_LS)
+
+        with self.assertRaises(IOError) as cm:
+            backend.statuses(['/user/a'])
+
+        self.assertIn('Permission denied', str(cm.exception))
+
+    def testStatusesMissingBinary(self):
+        backend = ShellBackend(ls_command=['/nonexistent/hdfs'])
+
+        with self.assertRaises(IOError):
+            backend.statuses(['/user/a'])
+
+
+class MissingPathsTest(TestCase):
+
+    def testMissingPaths(self):
+        errors = ('WARN util.NativeCodeLoader: Unable to load native-hadoop\n'
+                  "ls: `/user/bob smith': No such file or directory\n"
+                  "du: `/tmp': No such file or directory\n"
+                  'ls: Permission denied: user=nobody\n')
+
+        self.assertEqual(set(['/user/bob smith', '/tmp']),
+                         missing_paths(errors))
+
+
+class FixupCommandsTest(TestCase):
+
+    def setUp(self):
+        self.dirs = [
+            Directory('/user/a', 'a', 'hadoop', '0750'),
+            Directory('/user/b', 'b', 'hadoop', '0750'),
+            Directory('/tmp', 'yarn', 'hadoop', '1777'),
+            ]
+
+    def testMkdirs(self):
+        mkdirs, _ = fixup_commands(self.dirs)
+        self.assertEqual([HDFS_DFS + ['-mkdir', '-p', '/tmp', '/user/a',
+                                      '/user/b']], mkdirs)
+
+    def testGrouped(self):
+        _, changes = fixup_commands(self.dirs)
+        self.assertEqual([
+            HDFS_DFS + ['-chown', 'a:hadoop', '/user/a'],
+            HDFS_DFS + ['-chown', 'b:hadoop', '/user/b'],
+            HDFS_DFS + ['-chown', 'yarn:hadoop', '/tmp'],
+            HDFS_DFS + ['-chmod', '0750', '/user/a', '/user/b'],
+            HDFS_DFS + ['-chmod', '1777', '/tmp'],
+            ], changes)
+
+    def testChunked(self):
+        dirs = [Directory('/user/' + str(i), 'u', 'hadoop', '0750')
+                for i in range(5)]
+        mkdirs, changes = fixup_commands(dirs, chunk_size=2)
+        self.assertEqual(3, len(mkdirs))
+        self.assertEqual(6, len(changes))
+
+
+class FixupExecutorTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.log = os.path.join(self.dir, 'log')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testWrite(self):
+        fake = [sys.executable, '-c', 'import sys\n'
+                'open(sys.argv[1], "a").write(" ".join(sys.argv[2:]) + "\\n")',
+                self.log]
+        backend = ShellBackend(hdfs_command=fake)
+        ok = backend.write([Directory('/user/a', 'a', 'hadoop', '0750'),
+                            Directory('/user/b', 'b', 'hadoop', '0750')])
+
+        self.assertTrue(ok)
+        with open(self.log) as f:
+            lines = f.read().splitlines()
+
+        self.assertEqual('-mkdir -p /user/a /user/b', lines[0])
+        self.assertEqual(sorted(['-chown a:hadoop /user/a',
+                                 '-chown b:hadoop /user/b',
+                                 '-chmod 0750 /user/a /user/b']),
+                         sorted(lines[1:]))
+
+    def testFailure(self):
+        ret = FixupExecutor().run_command([sys.executable, '-c',
+                                           'import sys; sys.exit(3)'])
+        self.assertEqual(3, ret.status)
+
+    def testMissingBinary(self):
+        ret = FixupExecutor().run_command(['hadmin-no-such-binary'])
+        self.assertEqual(NOT_FOUND, ret.status)
+
+    def testTimeout(self):
+        start = time.time()
+        ret = FixupExecutor(timeout=0.2).run_command(
+                [sys.executable, '-c', 'import time; time.sleep(10)'])
+
+        self.assertEqual(-1, ret.status)
+        self.assertLess(time.time() - start, 5)
+
+    def testRunReportsFailure(self):
+        executor = FixupExecutor()
+        ok = executor.run([[[sys.executable, '-c', 'import sys; sys.exit(1)']],
+                           [[sys.executable, '-c', 'pass']]])
+        self.assertFalse(ok)
@@ -6,15 +6,41 @@ Include `hadmin-stats-influxd`.
 """
 
 import argparse
+import hadmin.cache
+import hadmin.prometheus
+import hadmin.series
 import hadmin.system
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import time
 
 
 SEC_TO_NANOSEC = 10**9
 
+DEFAULT_INTERVAL = 10
+
+
+def escape_tag(value):
+    """
+    Escape a tag key or value for the line protocol
+    """
+
+    for c in ['\\', ',', '=', ' ']:
+        value = value.replace(c, '\\' + c)
+
+    return value
+
+
+def join_tags(*tag_strings):
+    """
+    Join tag strings, skipping empty ones. Returns None if all are empty.
+    """
+
+    tmp = [t for t in tag_strings if t]
+    if not tmp:
+        return None
+
+    return ','.join(tmp)
+
 
 class WriteBody:
 
@@ -54,10 +80,50 @@ class WriteBody:
 
         self.body.append(tmp)
 
+    def __len__(self):
+        return len(self.body)
+
     def __str__(self):
         return "\n".join(self.body)
 
 
+class ChangeFilter:
+    """
+    Suppresses points whose value has not changed since it was last sent.
+
+    A point for each series is still let through at least every `keepalive`
+    seconds, so that the series does not go stale in InfluxDB.
+    """
+
+    def __init__(self, keepalive):
+        self.keepalive = keepalive
+        self._last = dict()
+
+    def changed(self, name, value, timestamp, tag_string=None):
+        """
+        Returns True if the point should be sent, and remembers it as sent
+        """
+
+        series = (name, tag_string)
+        last = self._last.get(series)
+
+        if last is not None:
+            last_value, last_timestamp = last
+            if (last_value == value and
+                    timestamp - last_timestamp < self.keepalive):
+                return False
+
+        self._last[series] = (value, timestamp)
+        return True
+
+    def reset(self):
+        """
+        Forget everything that was sent, so the next points all go out
+        """
+
+        self._last = dict()
+
+
 class Relay:
     """
     Sends statistics to InfluxDB.
@@ -66,6 +132,8 @@ class Relay:
     """
 
     COMPONENTS = {
+                  'DataNode': hadmin.system.jmx_dn,
+                  'NameNode': hadmin.system.jmx_nn,
                   'NodeManager': hadmin.system.rest_nm,
                   'ResourceManager': hadmin.system.rest_rm
                  }
@@ -74,8 +142,34 @@ class Relay:
         self._username = None
         self._password = None
         self._tag_string = None
-        self._interval = 10
+        self._interval = None
         self.args = self.parse_args(args)
+        self.cache = None
+        self.filter = None
+        self.queue_depth = None
+        self.queue_limit = None
+        self.history = None
+        self.exporter = None
+
+        if self.args.cache_ttl:
+            self.cache = hadmin.cache.SnapshotCache(
+                    float(self.args.cache_ttl[0]))
+
+        if self.args.keepalive:
+            self.filter = ChangeFilter(float(self.args.keepalive[0]))
+
+        if self.args.history:
+            self.history = hadmin.series.SeriesStore(
+                    int(self.args.history[0]))
+
+        if self.args.listen:
+            self.exporter = hadmin.prometheus.Exporter()
+
+        if self.args.queue_depth:
+            self.queue_depth = int(self.args.queue_depth[0])
+
+        if self.args.queue_limit:
+            self.queue_limit = int(self.args.queue_limit[0])
 
     def run(self):
         print('Sending metrics from ' + self.args.component + ' to ' +
@@ -89,42 +183,106 @@ class Relay:
             print('Adding tag string "' + self.tag_string +
                   '" to requests')
 
+        if self.exporter:
+            self.exporter.serve(self.args.listen[0])
+            print('Serving metrics on http://' + self.args.listen[0] +
+                  hadmin.prometheus.METRICS_PATH)
+
         while True:
             body = self.get_request()
-            auth = self.get_auth()
 
+            if len(body) > 0:
+                self.send(body)
+
+            time.sleep(self.interval)
+
+        return 0
+
+    def send(self, body):
+        """
+        Write body to InfluxDB. Returns the response's status code, or None
+        if InfluxDB could not be reached.
+        """
+
+        import requests
+
+        try:
             resp = requests.post(self.args.influxdb_address + '/write',
-                                 auth=auth,
+                                 auth=self.get_auth(),
                                  params={'db': self.args.database},
                                  data=str(body))
+        except requests.RequestException as e:
+            print('Failed to reach InfluxDB: ' + str(e))
 
-            if resp.status_code != 204:
-                if resp.status_code == 200:
-                    print('InfluxDB could not process the request')
-                elif resp.status_code == 404:
-                    print('Database ' + self.args.database + ' does not exist')
-                else:
-                    print('Failed to write request (' + str(resp.status_code) +
-                          '):')
-                    print(str(body))
+            # Nothing was written, so the next write must send everything
+            if self.filter:
+                self.filter.reset()
 
-            time.sleep(self.interval)
+            return None
 
-        return 0
+        if resp.status_code != 204:
+            if resp.status_code == 200:
+                print('InfluxDB could not process the request')
+            elif resp.status_code == 404:
+                print('Database ' + self.args.database + ' does not exist')
+            else:
+                print('Failed to write request (' + str(resp.status_code) +
+                      '):')
+                print(str(body))
+
+            if self.filter:
+                self.filter.reset()
+
+        return resp.status_code
 
     def get_request(self):
-        thing = Relay.COMPONENTS[self.args.component]()
+        kwargs = {'cache': self.cache}
+        if self.args.host:
+            kwargs['addr'] = self.args.host[0]
+
+        thing = Relay.COMPONENTS[self.args.component](**kwargs)
         req = WriteBody()
         t = time.time()
+        self._points = []
+
+        if hasattr(thing, 'metrics'):
+            d = thing.metrics()
+        else:
+            d = dict(thing)
 
-        d = dict(thing)
         for key in d:
-            req.add_measurement(key, d[key], t, self.tag_string)
+            self.add_point(req, key, d[key], t, self.tag_string)
+
+        if self.args.queues and hasattr(thing, 'queue_metrics'):
+            points = thing.queue_metrics(self.queue_depth, self.queue_limit)
+            for queue_name, key, value in points:
+                tags = join_tags(self.tag_string,
+                                 'queue=' + escape_tag(queue_name))
+                self.add_point(req, key, value, t, tags)
+
+        if self.exporter:
+            self.exporter.update(self._points, self.history)
 
         return req
 
+    def add_point(self, req, name, value, timestamp, tag_string):
+        if self.history is not None:
+            self.history.record(name, value, timestamp, tag_string)
+
+        if self.exporter:
+            labels = hadmin.prometheus.labels_from_tag_string(tag_string)
+            self._points.append((name, labels, value))
+
+        if self.filter and not self.filter.changed(name, value, timestamp,
+                                                   tag_string):
+            return
+
+        req.add_measurement(name, value, timestamp, tag_string)
+
     def get_auth(self):
         if self.using_auth():
+            from requests.auth import HTTPBasicAuth
+
             return HTTPBasicAuth(self.username, self.password)
 
         return None
@@ -144,6 +302,29 @@ class Relay:
         parser.add_argument('--interval', nargs=1)
         parser.add_argument('--username', nargs=1)
         parser.add_argument('--password', nargs=1)
+        parser.add_argument('--cache-ttl', nargs=1, dest='cache_ttl',
+                            help='reuse fetched endpoints for this many '
+                            'seconds and revalidate them afterwards')
+        parser.add_argument('--keepalive', nargs=1,
+                            help='only send values that changed, but resend '
+                            'each value at least this often (seconds)')
+        parser.add_argument('--history', nargs=1,
+                            help='keep this many recent samples of every '
+                            'series in memory')
+        parser.add_argument('--listen', nargs=1, metavar='HOST:PORT',
+                            help='serve the latest metrics for Prometheus '
+                            'on this address')
+        parser.add_argument('--host', nargs=1, metavar='HOST:PORT',
+                            help='read from the daemon on this address '
+                            'instead of the usual local one')
+        parser.add_argument('--queues', action='store_true',
+                            help='also send per-queue metrics, tagged with '
+                            'the queue name')
+        parser.add_argument('--queue-depth', nargs=1, dest='queue_depth',
+                            help='only send queues this many levels below '
+                            'root or fewer')
+        parser.add_argument('--queue-limit', nargs=1, dest='queue_limit',
+                            help='send at most this many queues')
 
         parser.add_argument('influxdb_address')
         parser.add_argument('database')
@@ -178,10 +359,11 @@ class Relay:
         if self._interval:
             return self._interval
 
+        self._interval = DEFAULT_INTERVAL
         if self.args.interval:
             self._interval = int(self.args.interval[0])
 
-        return self._tag_string
+        return self._interval
 
     @property
     def tag_string(self):
@@ -0,0 +1,185 @@
+from contextlib import redirect_stdout
+from unittest2 import TestCase
+from hadmin.fakehadoop import FakeCluster, Fleet
+from hadmin.influx import ChangeFilter, Relay, WriteBody, escape_tag
+from hadmin.rest import ResourceManager
+from io import StringIO
+import json
+
+
+def load_rm(cache=None):
+    jsons = []
+    for fname in ['data/resourcemanager.scheduler.json',
+                  'data/resourcemanager.metrics.json']:
+        with open(fname) as f:
+            jsons.append(f.read())
+
+    return ResourceManager.load_from_jsons(jsons)
+
+
+class WriteBodyTest(TestCase):
+
+    def testSanitizeName(self):
+        self.assertEqual('a_b_c', WriteBody().sanitize_name('a.-b..c'))
+
+    def testAddMeasurement(self):
+        body = WriteBody()
+        body.add_measurement('a.b', 3, 1.5, 'host=x')
+        self.assertEqual('a_b,host=x value=3 1500000000', str(body))
+
+    def testLen(self):
+        body = WriteBody()
+        body.add_measurement('a', 1, 1)
+        body.add_measurement('b', 1, 1)
+        self.assertEqual(2, len(body))
+
+
+class EscapeTagTest(TestCase):
+
+    def testPlain(self):
+        self.assertEqual('root.a', escape_tag('root.a'))
+
+    def testSpecial(self):
+        self.assertEqual('a\\ b\\,c\\=d', escape_tag('a b,c=d'))
+
+
+class ChangeFilterTest(TestCase):
+
+    def setUp(self):
+        self.filter = ChangeFilter(keepalive=60)
+
+    def testFirstPointSent(self):
+        self.assertTrue(self.filter.changed('a', 1, 0))
+
+    def testUnchangedSuppressed(self):
+        self.filter.changed('a', 1, 0)
+        self.assertFalse(self.filter.changed('a', 1, 10))
+
+    def testChangedSent(self):
+        self.filter.changed('a', 1, 0)
+        self.assertTrue(self.filter.changed('a', 2, 10))
+
+    def testKeepalive(self):
+        self.filter.changed('a', 1, 0)
+        self.filter.changed('a', 1, 30)
+        self.assertTrue(self.filter.changed('a', 1, 60))
+
+    def testTagsAreSeparateSeries(self):
+        self.filter.changed('a', 1, 0, 'host=x')
+        self.assertTrue(self.filter.changed('a', 1, 0, 'host=y'))
+
+    def testReset(self):
+        self.filter.changed('a', 1, 0)
+        self.filter.reset()
+        self.assertTrue(self.filter.changed('a', 1, 10))
+
+
+class RelayTest(TestCase):
+
+    def setUp(self):
+        Relay.COMPONENTS['Test'] = load_rm
+
+    def tearDown(self):
+        del Relay.COMPONENTS['Test']
+
+    def testDefaultInterval(self):
+        r = Relay(['http://localhost:8086', 'db', 'Test'])
+        self.assertEqual(10, r.interval)
+
+    def testInterval(self):
+        r = Relay(['--interval', '30', 'http://localhost:8086', 'db', 'Test'])
+        self.assertEqual(30, r.interval)
+
+    def testAllMetricsSent(self):
+        r = Relay(['http://localhost:8086', 'db', 'Test'])
+        self.assertEqual(11, len(r.get_request()))
+        self.assertEqual(11, len(r.get_request()))
+
+    def testUnchangedMetricsSuppressed(self):
+        r = Relay(['--keepalive', '600', 'http://localhost:8086', 'db',
+                   'Test'])
+        self.assertEqual(11, len(r.get_request()))
+        self.assertEqual(0, len(r.get_request()))
+
+    def testQueueMetrics(self):
+        r = Relay(['--queues', 'http://localhost:8086', 'db', 'Test'])
+        self.assertEqual(11 + 4 * 6, len(r.get_request()))
+
+    def testQueueMetricsTagged(self):
+        r = Relay(['--queues', '--tag-string', 'cluster=a',
+                   'http://localhost:8086', 'db', 'Test'])
+        self.assertIn('queue_containers,cluster=a,queue=root.staff.dev '
+                      'value=30', str(r.get_request()))
+
+    def testQueueMetricsLimited(self):
+        r = Relay(['--queues', '--queue-depth', '1', '--queue-limit', '1',
+                   'http://localhost:8086', 'db', 'Test'])
+        self.assertEqual(11 + 6, len(r.get_request()))
+
+    def testHistory(self):
+        r = Relay(['--history', '5', '--keepalive', '600',
+                   'http://localhost:8086', 'db', 'Test'])
+        r.get_request()
+        r.get_request()
+        self.assertEqual(2, len(r.history.get('metrics_vcpus_total')))
+
+    def testHistoryServed(self):
+        r = Relay(['--history', '5', '--listen', '127.0.0.1:0',
+                   'http://localhost:8086', 'db', 'Test'])
+        r.get_request()
+        r.get_request()
+
+        series = json.loads(r.exporter.history_body(
+                'metrics_vcpus_total').decode('utf-8'))
+        self.assertEqual(1, len(series))
+        self.assertEqual(2, len(series[0]['samples']))
+
+    def testExporterUpdated(self):
+        r = Relay(['--listen', '127.0.0.1:0', '--queues',
+                   'http://localhost:8086', 'db', 'Test'])
+        r.get_request()
+        self.assertIn(b'hadmin_queue_containers{queue="root.staff.dev"} 30',
+                      r.exporter.body)
+
+
+class RelayHostTest(TestCase):
+
+    def setUp(self):
+        self.fleet = Fleet(FakeCluster(nodes=4, queues=11, beans=5),
+                           {'influx': 1, 'nn': 1, 'rm': 1})
+        self.addresses = self.fleet.start()
+        self.influx = 'http://' + self.addresses['influx'][0]
+
+    def tearDown(self):
+        self.fleet.stop()
+
+    def testHost(self):
+        r = Relay(['--host', self.addresses['rm'][0], '--queues', self.influx,
+                   'db', 'ResourceManager'])
+        body = r.get_request()
+
+        self.assertIn('metrics_nodes_total value=4 ', str(body))
+        self.assertIn('queue=root.q10 ', str(body))
+
+    def testSend(self):
+        r = Relay(['--host', self.addresses['nn'][0], self.influx, 'db',
+                   'NameNode'])
+        body = r.get_request()
+
+        self.assertEqual(204, r.send(body))
+        self.assertEqual(len(body), self.fleet.served()['influx']['points'])
+
+    def testUnreachable(self):
+        # Nothing listens on port 1
+        r = Relay(['--host', self.addresses['nn'][0], '--keepalive', '600',
+                   'http://127.0.0.1:1', 'db', 'NameNode'])
+        body = r.get_request()
+
+        out = StringIO()
+        with redirect_stdout(out):
+            self.assertIsNone(r.send(body))
+
+        self.assertIn('Failed to reach InfluxDB', out.getvalue())
+
+        # Everything is sent again, since nothing reached InfluxDB
+        self.assertEqual(len(body), len(r.get_request()))
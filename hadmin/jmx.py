@@ -5,6 +5,7 @@ Apache Hadoop-specific JMX parsing
 Parse JMX JSON objects to get some stats
 """
 
+import hadmin.cache
 import json
 import re
 
@@ -14,6 +15,9 @@ except ImportError:
     from httplib import HTTPConnection
 
 
+JMX_PATH = '/jmx'
+
+
 class JMX(dict):
     """
     Base class that does the majority of the JMX/JSON work.
@@ -41,25 +45,26 @@ class JMX(dict):
         except ValueError:
             pass
 
-    def load_from_host(self, addr):
+    def load_from_host(self, addr, cache=None):
         """
-        Load JMX data from a host
+        Load JMX data from a host. If a
+        :py:class:`hadmin.cache.SnapshotCache` is given, it is consulted
+        before the host.
         """
 
         conn = HTTPConnection(addr)
-        return self.load_from_connection(conn)
+        return self.load_from_connection(conn, cache=cache, host=addr)
 
-    def load_from_connection(self, conn):
+    def load_from_connection(self, conn, cache=None, host=None):
         """
         Load JMX data from a connection. Connections must have a
         :py:func:`request` function and a
         :py:func:`getresponse` function.
         """
 
-        conn.request('GET', '/jmx')
-        res = conn.getresponse()
-        if res.status == 200:
-            self.load(res.read())
+        raw = hadmin.cache.fetch(conn, JMX_PATH, cache=cache, host=host)
+        if raw is not None:
+            self.load(raw)
 
     def __getitem__(self, k):
         if k in self.keys():
@@ -80,6 +85,15 @@ class DataNodeJMX(JMX):
     def getFailedVolumes(self):
         return self['.*FSDatasetState-null$']['NumFailedVolumes']
 
+    def metrics(self):
+        """
+        Get the DataNode's metrics as a dict of metric name to value
+        """
+
+        return {
+            'datanode_volumes_failed': self.getFailedVolumes()
+            }
+
 
 class NameNodeJMX(JMX):
     """
@@ -146,3 +160,20 @@ class NameNodeJMX(JMX):
 
         tmp = self['^Hadoop:service=NameNode,name=FSNamesystem$']
         return tmp['PendingReplicationBlocks']
+
+    def metrics(self):
+        """
+        Get the NameNode's metrics as a dict of metric name to value
+        """
+
+        return {
+            'namenode_blocks_corrupt': self.getCorruptBlocks(),
+            'namenode_blocks_pending_replication':
+                self.getBlocksPendingReplication(),
+            'namenode_blocks_under_replicated':
+                self.getUnderReplicatedBlocks(),
+            'namenode_capacity_total_gb': self.getTotalCapacity(),
+            'namenode_capacity_used_gb': self.getUsedCapacity(),
+            'namenode_heap_memory_used': self.getHeapMemoryUsed(),
+            'namenode_threads': self.getNumThreads()
+            }
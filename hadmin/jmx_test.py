@@ -33,6 +33,9 @@ class DataNodeJMXTest(TestCase):
     def testVolumesFailed(self):
         self.assertEqual(self.jmx.getFailedVolumes(), 0)
 
+    def testMetrics(self):
+        self.assertEqual({'datanode_volumes_failed': 0}, self.jmx.metrics())
+
     def setUp(self):
         self.jmx = DataNodeJMX()
 
@@ -71,6 +74,10 @@ class NameNodeJMXTest(TestCase):
     def testCorruptBlocks(self):
         self.assertEqual(3, self.jmx.getCorruptBlocks())
 
+    def testMetrics(self):
+        metrics = self.jmx.metrics()
+        self.assertEqual(2, metrics['namenode_blocks_under_replicated'])
+
     def setUp(self):
         self.jmx = NameNodeJMX()
 
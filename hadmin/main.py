@@ -4,15 +4,122 @@ Entry points for the `hadmin` command.
 
 
 from argparse import ArgumentParser
-from hadmin.conf import QueueGenerator
-from hadmin.hdfs import NameNode, Directory
-from hadmin.jmx import DataNodeJMX
-import hadmin.rest
 import hadmin.system
 import os
 import sys
 
 
+def add_cache_arg(parser):
+    """ Adds the --cache-ttl option shared by the daemon-reading commands """
+
+    parser.add_argument('--cache-ttl', dest='cache_ttl', type=float,
+                        default=None,
+                        help='Reuse responses cached by earlier commands '
+                        'for this many seconds')
+
+
+def add_save_args(parser):
+    """ Adds the options shared by commands that change the queues """
+
+    parser.add_argument('--force', dest='force', action='store_const',
+                        const=True, default=False,
+                        help='Save even if the change fails the sanity check')
+    parser.add_argument('--dry-run', dest='dry_run', action='store_const',
+                        const=True, default=False,
+                        help='Show what would change instead of saving')
+    parser.add_argument('--reload', dest='reload', action='store_const',
+                        const=True, default=False,
+                        help='Have the ResourceManager reload the queues '
+                        'after saving, if they changed since the last reload')
+
+
+def print_problems(problems):
+    """ Prints sanity check failures as returned by problems() """
+
+    for check, queue in sorted(problems):
+        if check == 'capacity':
+            print('ERROR: The capacities of all subqueues of ' + queue +
+                  ' do not sum to 100')
+        else:
+            print('ERROR: The capacity of ' + queue +
+                  ' is greater than its maximum capacity')
+
+
+def save_queues(mgr, args, before=frozenset(), fname=None):
+    """
+    Saves the queues of mgr, to fname or to the system's
+    capacity-scheduler.xml.
+
+    Does nothing if the queues are the same as the ones in the system's file.
+    Refuses to save, unless --force was given, if the changes introduced
+    sanity check failures that are not in before. Returns an exit code.
+    """
+
+    from hadmin.yarn import CapacityScheduler
+    import hadmin.diff
+
+    introduced = mgr.problems() - before
+
+    if args.dry_run:
+        old = None
+        if fname and os.path.exists(fname):
+            old = CapacityScheduler.from_file(fname)
+        else:
+            old = hadmin.system.load_cap()
+
+        for change in hadmin.diff.diff(old.root_queue, mgr.root_queue):
+            print(str(change))
+
+        print_problems(introduced)
+        print('Dry run, not saving')
+        return 0
+
+    to_system = fname is None
+    if fname is not None:
+        cap_path = hadmin.system.cap_path()
+        to_system = hadmin.system.abspath(fname) == cap_path
+
+    if to_system and not mgr.changed:
+        print('Nothing changed, not saving')
+        return reload_queues(mgr, args)
+
+    if to_system and mgr is hadmin.system.held_cap():
+        # Saved later, by whoever holds the scheduler
+        print_problems(introduced)
+        return 0
+
+    if introduced and not args.force:
+        print_problems(introduced)
+        print('Not saving, since the change fails the sanity check. ' +
+              'Use --force to save anyway')
+        return 1
+
+    hxml = mgr.to_hxml()
+    if to_system:
+        hadmin.system.save_cap(hxml, mgr)
+    else:
+        hxml.save(fname)
+
+    mgr.mark_saved()
+
+    if not to_system:
+        if args.reload:
+            print('Ignoring --reload, since ' + fname + " is not the "
+                  "system's capacity-scheduler.xml")
+        return 0
+
+    return reload_queues(mgr, args)
+
+
+def reload_queues(mgr, args):
+    """ Reloads the ResourceManager's queues if --reload was given """
+
+    if not args.reload:
+        return 0
+
+    return hadmin.system.get_rm().reload_queues(mgr.content_hash)
+
+
 def queuestat(args):
     """ Prints a bunch of queue statistics. """
 
@@ -54,17 +161,11 @@ def sc(args):
     ret = 0
 
     try:
-        mgr = hadmin.system.get_cap()
+        problems = hadmin.system.get_cap().problems()
 
-        for queue in mgr.check_capacities():
+        if problems:
             ret = 1
-            print('ERROR: The capacities of all subqueues of ' + queue +
-                  ' do not sum to 100')
-
-        for queue in mgr.check_maximum_capacities():
-            ret = 1
-            print('ERROR: The capacity of ' + queue +
-                  ' is greater than its maximum capacity')
+            print_problems(problems)
     except KeyError:
         print("your CapacityScheduler configuration is malformed")
         ret = 1
@@ -72,50 +173,88 @@ def sc(args):
     return ret
 
 
-def chk_dn(args):
-    """ Checks various datanode-related health things. """
+# How many hosts chk-dn and chk-nm check at the same time
+CHECK_WORKERS = 16
 
-    parser = ArgumentParser(prog='chk-dn',
-                            description='Check datanode stats/health')
-    parser.add_argument('host', nargs='?', default='localhost:50075')
-    args = parser.parse_args(args)
 
-    ret = 0
+def check_hosts(check, hosts, cache=None):
+    """
+    Run check(host, cache), which returns an exit status and a message, for
+    each of hosts and print the messages. With several hosts, they are
+    checked concurrently, each message is prefixed with its host, and a host
+    that cannot be reached is reported with status 2 instead of stopping
+    the others. The cache is flushed once all the hosts are checked. Returns
+    the highest status.
+    """
+
+    try:
+        return _check_hosts(check, hosts, cache)
+    finally:
+        if cache is not None:
+            cache.flush()
+
+
+def _check_hosts(check, hosts, cache):
+    if len(hosts) == 1:
+        ret, msg = check(hosts[0], cache)
+        print(msg)
+        return ret
+
+    from multiprocessing.pool import ThreadPool
+
+    def check_one(host):
+        try:
+            return check(host, cache)
+        except Exception as e:
+            return 2, 'could not check: ' + str(e)
+
+    pool = ThreadPool(min(CHECK_WORKERS, len(hosts)))
+    try:
+        results = pool.map(check_one, hosts)
+    finally:
+        pool.close()
+        pool.join()
+
+    for host, (_, msg) in zip(hosts, results):
+        print(host + ': ' + msg)
+
+    return max(ret for ret, _ in results)
+
+
+def check_dn(host, cache=None):
+    """
+    Check the DataNode on host for failed volumes. Returns an exit status
+    and a message.
+    """
+
+    from hadmin.jmx import DataNodeJMX
 
     jmx = DataNodeJMX()
-    jmx.load_from_host(args.host)
+    jmx.load_from_host(host, cache=cache)
 
-    # Check for number of failed volumes
     nfails = jmx.getFailedVolumes()
     msg = ' volumes have failed'
 
     if nfails == 1:
         msg = ' volume has failed'
 
-    print(str(nfails) + msg)
+    return (1 if nfails > 0 else 0), str(nfails) + msg
 
-    if nfails > 0:
-        ret = 1
 
-    return ret
+def check_nm(host, cache=None):
+    """
+    Check the health of the NodeManager on host. Returns an exit status and
+    a message.
+    """
 
+    import hadmin.rest
 
-def chk_nm(args):
-    """ Checks various nodemanager-related things """
-
-    parser = ArgumentParser(prog='chk-nm',
-                            description='Check nodemanager stats/health')
-    parser.add_argument('host', nargs='?', default='localhost:8042')
-    args = parser.parse_args(args)
+    rest = hadmin.rest.NodeManager.load_from_host(
+            host, path=hadmin.rest.NM_INFO_PATH, cache=cache)
 
     ret = 0
 
-    rest = hadmin.rest.NodeManager()
-    rest.load_from_host(args.host)
-
-    status = rest.isHealthy()
-
-    if status:
+    if rest.isHealthy():
         msg = 'node is healthy'
     else:
         msg = 'node is unhealthy'
@@ -124,9 +263,37 @@ def chk_nm(args):
     if len(rest.getHealthReport()) > 0:
         msg = msg + ': ' + rest.getHealthReport()
 
-    print(msg)
+    return ret, msg
 
-    return ret
+
+def chk_dn(args):
+    """ Checks various datanode-related health things. """
+
+    parser = ArgumentParser(prog='chk-dn',
+                            description='Check datanode stats/health')
+    parser.add_argument('host', nargs='*', default=['localhost:50075'],
+                        help='DataNodes to check. Several are checked at '
+                        'the same time')
+    add_cache_arg(parser)
+    args = parser.parse_args(args)
+
+    return check_hosts(check_dn, args.host,
+                       hadmin.system.get_snapshot_cache(args.cache_ttl))
+
+
+def chk_nm(args):
+    """ Checks various nodemanager-related things """
+
+    parser = ArgumentParser(prog='chk-nm',
+                            description='Check nodemanager stats/health')
+    parser.add_argument('host', nargs='*', default=['localhost:8042'],
+                        help='NodeManagers to check. Several are checked at '
+                        'the same time')
+    add_cache_arg(parser)
+    args = parser.parse_args(args)
+
+    return check_hosts(check_nm, args.host,
+                       hadmin.system.get_snapshot_cache(args.cache_ttl))
 
 
 def stats_nm(args):
@@ -134,12 +301,20 @@ def stats_nm(args):
     Get some stats from a NodeManager
     """
 
+    import hadmin.rest
+
     parser = ArgumentParser(prog='stats-nm', description='Get NM stats')
     parser.add_argument('host', nargs='?', default='localhost:8042')
+    add_cache_arg(parser)
     args = parser.parse_args(args)
 
-    nm = hadmin.rest.NodeManager()
-    nm.load_from_host(args.host, path=hadmin.rest.NM_INFO_PATH)
+    cache = hadmin.system.get_snapshot_cache(args.cache_ttl)
+    try:
+        nm = hadmin.rest.NodeManager.load_from_host(
+                args.host, path=hadmin.rest.NM_INFO_PATH, cache=cache)
+    finally:
+        if cache is not None:
+            cache.flush()
 
     print('Total Cores: ' + str(nm.allocated_cores))
     print('Total Memory: ' + str(nm.allocated_memory) + ' MB')
@@ -152,15 +327,24 @@ def stats_rm(args):
     Get some stats from a ResourceManager
     """
 
+    import hadmin.rest
+
     rm = hadmin.system.get_rm()
 
     parser = ArgumentParser(prog='stats-rm', description='Get RM stats')
     parser.add_argument('host', nargs='?', default=rm.address)
+    add_cache_arg(parser)
     args = parser.parse_args(args)
 
     paths = [hadmin.rest.RM_METRICS_PATH, hadmin.rest.RM_SCHEDULER_PATH]
-    rest_rm = hadmin.rest.ResourceManager.load_from_host(args.host,
-                                                         paths=paths)
+    cache = hadmin.system.get_snapshot_cache(args.cache_ttl)
+    try:
+        rest_rm = hadmin.rest.ResourceManager.load_from_host(args.host,
+                                                             paths=paths,
+                                                             cache=cache)
+    finally:
+        if cache is not None:
+            cache.flush()
 
     print('Running Applications: ' + str(rest_rm.apps_running))
 
@@ -180,9 +364,11 @@ def useradd(args):
     parser.add_argument('--admin', dest='is_admin', action='store_const',
                         const=True, default=False,
                         help='Add an administrator')
+    add_save_args(parser)
     args = parser.parse_args(args)
 
     mgr = hadmin.system.get_cap()
+    before = mgr.problems()
     if args.is_admin:
         mgr.queue(args.queue).admins.append(args.user)
         print("Added admin " + args.user + " to queue " + args.queue)
@@ -190,10 +376,7 @@ def useradd(args):
         mgr.queue(args.queue).users.append(args.user)
         print("Added user " + args.user + " to queue " + args.queue)
 
-    hxml = mgr.to_hxml()
-    hadmin.system.save_cap(hxml)
-
-    return 0
+    return save_queues(mgr, args, before)
 
 
 def userdel(args):
@@ -208,9 +391,11 @@ def userdel(args):
     parser.add_argument('--admin', dest='is_admin', action='store_const',
                         const=True, default=False,
                         help='Delete an administrator')
+    add_save_args(parser)
     args = parser.parse_args(args)
 
     mgr = hadmin.system.get_cap()
+    before = mgr.problems()
     if args.is_admin:
         mgr.queue(args.queue).admins.remove(args.user)
         print("Removed admin " + args.user + " from queue " +
@@ -220,10 +405,7 @@ def userdel(args):
         print("Removed user " + args.user + " from queue " +
               args.queue)
 
-    hxml = mgr.to_hxml()
-    hadmin.system.save_cap(hxml)
-
-    return 0
+    return save_queues(mgr, args, before)
 
 
 def queueon(args):
@@ -232,13 +414,16 @@ def queueon(args):
     parser = ArgumentParser(prog='queueon',
                             description='HAdmin queueon utility')
     parser.add_argument('queue')
+    add_save_args(parser)
     args = parser.parse_args(args)
 
     mgr = hadmin.system.get_cap()
+    before = mgr.problems()
     mgr.queue(args.queue).running = True
 
-    hxml = mgr.to_hxml()
-    hadmin.system.save_cap(hxml)
+    ret = save_queues(mgr, args, before)
+    if ret != 0 or args.dry_run:
+        return ret
 
     print('Turned queue ' + args.queue + ' on')
 
@@ -251,13 +436,16 @@ def queueoff(args):
     parser = ArgumentParser(prog='queueoff',
                             description='HAdmin queueoff utility')
     parser.add_argument('queue')
+    add_save_args(parser)
     args = parser.parse_args(args)
 
     mgr = hadmin.system.get_cap()
+    before = mgr.problems()
     mgr.queue(args.queue).running = False
 
-    hxml = mgr.to_hxml()
-    hadmin.system.save_cap(hxml)
+    ret = save_queues(mgr, args, before)
+    if ret != 0 or args.dry_run:
+        return ret
 
     print('Turned queue ' + args.queue + ' off')
 
@@ -274,17 +462,20 @@ def queuecap(args):
     parser.add_argument('--max', dest='maxcap', action='store_const',
                         const=True, default=False,
                         help='Set maximum capacity')
+    add_save_args(parser)
     args = parser.parse_args(args)
 
     mgr = hadmin.system.get_cap()
+    before = mgr.problems()
 
     if args.maxcap:
         mgr.queue(args.queue).cap_max = args.capacity
     else:
         mgr.queue(args.queue).cap_min = args.capacity
 
-    hxml = mgr.to_hxml()
-    hadmin.system.save_cap(hxml)
+    ret = save_queues(mgr, args, before)
+    if ret != 0 or args.dry_run:
+        return ret
 
     out = 'Set '
     if args.maxcap:
@@ -302,14 +493,17 @@ def queueulim(args):
                             description='HAdmin queueulim utility')
     parser.add_argument('queue')
     parser.add_argument('ulim')
+    add_save_args(parser)
     args = parser.parse_args(args)
 
     mgr = hadmin.system.get_cap()
+    before = mgr.problems()
 
     mgr.queue(args.queue).user_limit_factor = args.ulim
 
-    hxml = mgr.to_hxml()
-    hadmin.system.save_cap(hxml)
+    ret = save_queues(mgr, args, before)
+    if ret != 0 or args.dry_run:
+        return ret
 
     print('Set ulim of queue ' + args.queue + ' to ' + args.ulim)
 
@@ -319,20 +513,60 @@ def queueulim(args):
 def genqueues(args):
     """ Generate capacity-scheduler.xml from YAML """
 
+    from hadmin.conf import Manifest, QueueGenerator
+
     parser = ArgumentParser(prog='genqueues',
                             description='HAdmin genqueues utility')
 
-    parser.add_argument('conf_dir', help='Location of HAdmin YAML configs')
+    parser.add_argument('conf_dir', type=hadmin.system.abspath,
+                        help='Location of HAdmin YAML configs: a directory, '
+                        'a single YAML file or a compiled file')
 
     default_output = os.path.join(hadmin.system.find_hxml_dir(),
                                   hadmin.system.CAPACITY_SCHEDULER_FILENAME)
     parser.add_argument('output', nargs='?', default=default_output,
+                        type=hadmin.system.abspath,
                         help='Location of resulting capacity-scheduler.xml')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                        help='Number of processes to parse YAML with')
+    parser.add_argument('--incremental', dest='incremental',
+                        action='store_const', const=True, default=False,
+                        help='Only parse YAML files changed since last run')
+    parser.add_argument('--manifest', dest='manifest',
+                        type=hadmin.system.abspath, default=None,
+                        help='Where to remember YAML files between runs. '
+                        'Implies --incremental')
+    parser.add_argument('--compile', dest='compile', default=None,
+                        type=hadmin.system.abspath, metavar='FILE',
+                        help='Write the queues to FILE in a compiled form '
+                        'that loads without parsing YAML, and exit')
+    add_save_args(parser)
 
     args = parser.parse_args(args)
 
+    if (args.manifest or args.incremental) and \
+            not os.path.isdir(args.conf_dir):
+        parser.error('--incremental and --manifest only work with a '
+                     'directory of YAML files')
+
+    manifest = None
+    if args.manifest:
+        manifest = Manifest(args.manifest)
+    elif args.incremental:
+        manifest = Manifest(Manifest.default_path(args.conf_dir))
+
+    gen = QueueGenerator.load(args.conf_dir, processes=args.jobs,
+                              manifest=manifest)
+
+    if manifest is not None:
+        print("Parsed " + str(gen.parsed) + " changed YAML files")
+
+    if args.compile:
+        gen.compile(args.compile)
+        print("Compiled queues into " + args.compile)
+        return 0
+
     sched = hadmin.system.get_cap()
-    gen = QueueGenerator.load_dir(args.conf_dir)
     new_root_queue = gen.generate()
 
     if new_root_queue is None:
@@ -340,8 +574,9 @@ def genqueues(args):
         return 1
 
     sched.root_queue = new_root_queue
-    hxml = sched.to_hxml()
-    hxml.save(args.output)
+    ret = save_queues(sched, args, fname=args.output)
+    if ret != 0 or args.dry_run:
+        return ret
 
     print("Generated some queues and stuff into " + args.output)
 
@@ -351,53 +586,327 @@ def genqueues(args):
 def fhs(args):
     """ Check and optionally fixup proper HDFS directory permissions """
 
+    from hadmin.hdfs import NameNode, Directory, ShellBackend
+
     parser = ArgumentParser(prog='fhs',
                             description='HAdmin FHS utility')
 
     parser.add_argument('--fixup', dest='fixup', action='store_const',
                         const=True, default=False,
                         help='Fixup permissions that are not correct')
+    parser.add_argument('--webhdfs', dest='webhdfs', metavar='HOST:PORT',
+                        default=None,
+                        help='Talk to the NameNode over WebHDFS instead of '
+                        'running hdfs dfs')
+    parser.add_argument('--user', dest='user',
+                        default=hadmin.system.getenv('HADOOP_USER_NAME'),
+                        help='User to act as over WebHDFS. Defaults to '
+                        '$HADOOP_USER_NAME')
+    parser.add_argument('--fsimage', dest='fsimage', metavar='FILE',
+                        type=hadmin.system.abspath, default=None,
+                        help='Check an fsimage exported with hdfs oiv '
+                        '(Delimited or XML) instead of the NameNode')
 
     args = parser.parse_args(args)
 
-    user_dirs = []
+    if args.fsimage and args.fixup:
+        print('--fixup cannot be used with --fsimage')
+        return 1
 
-    sched = hadmin.system.get_cap()
+    user_dirs = queue_users(hadmin.system.get_cap())
+    user_dirs = list(map(lambda u: Directory.from_username(u), user_dirs))
+    wanted = [d for d in NameNode.FHS_DIRS + user_dirs if d]
+
+    if args.fsimage:
+        from hadmin.fsimage import FSImageBackend
+        backend = FSImageBackend(args.fsimage)
+    elif args.webhdfs:
+        from hadmin.webhdfs import WebHDFS, WebHDFSBackend
+        backend = WebHDFSBackend(WebHDFS(args.webhdfs, user=args.user))
+    else:
+        backend = ShellBackend()
+
+    try:
+        statuses = backend.statuses([d.path for d in wanted])
+    except IOError as e:
+        print(str(e))
+        return 1
+
+    fixes = []
+
+    for d in wanted:
+        current = statuses.get(d.path)
+
+        if current is None:
+            print(d.path + ' does not exist')
+            fixes.append(d)
+        elif d != current:
+            print(current.path + ' has problems:')
+
+            if d.perms != current.perms:
+                print(' * perms are ' + current.perms +
+                      ', but should be ' + d.perms)
+
+            if d.owner != current.owner:
+                print(' * owner is ' + current.owner +
+                      ', but should be ' + d.owner)
+
+            if d.group != current.group:
+                print(' * group is ' + current.group +
+                      ', but should be ' + d.group)
+
+            fixes.append(d)
+
+    if args.fixup and not backend.write(fixes):
+        return 1
+
+
+def queue_users(sched):
+    """ Gets the set of users allowed to submit to any queue """
+
+    users = set()
     for q in sched.queue_list():
-        user_dirs += filter(lambda thing: thing is not None,
-                            sched.queue(q).users)
+        users.update(u for u in sched.queue(q).users if u is not None)
+
+    return users
+
+
+def quota(args):
+    """ Check and optionally set quotas on users' HDFS directories """
 
-    user_dirs = list(map(lambda u: Directory.from_username(u), set(user_dirs)))
+    from hadmin.hdfs import Directory
+    from hadmin.quota import Quota, ShellQuotaBackend, parse_count, parse_size
 
-    for d in NameNode.FHS_DIRS + user_dirs:
-        if not d:
+    parser = ArgumentParser(prog='quota',
+                            description='HAdmin HDFS quota utility')
+
+    parser.add_argument('--apply', dest='apply', action='store_const',
+                        const=True, default=False,
+                        help='Change the quotas that are not correct')
+    parser.add_argument('--files', dest='files', type=parse_count,
+                        default=None,
+                        help='Namespace quota for every queue user, such as '
+                        '10k for 10000 files, or none to clear it')
+    parser.add_argument('--space', dest='space', type=parse_size,
+                        default=None,
+                        help='Space quota for every queue user, such as '
+                        '500g, or none to clear it')
+    parser.add_argument('--queues', dest='queues', metavar='PATH',
+                        type=hadmin.system.abspath, default=None,
+                        help='YAML queue files whose quota settings apply to '
+                        'the users of each queue')
+
+    args = parser.parse_args(args)
+
+    wanted = dict()
+
+    if args.files is not None or args.space is not None:
+        for user in queue_users(hadmin.system.get_cap()):
+            d = Directory.from_username(user)
+            if d is not None:
+                wanted[user] = Quota(d.path, args.files, args.space)
+
+    if args.queues:
+        from hadmin.conf import QueueGenerator
+        for user, q in QueueGenerator.load(args.queues).user_quotas().items():
+            wanted[user] = wanted[user].merge(q) if user in wanted else q
+
+    if not wanted:
+        print('No quotas to check, use --files, --space or --queues')
+        return 1
+
+    backend = ShellQuotaBackend()
+
+    try:
+        current = backend.current([q.path for q in wanted.values()])
+    except IOError as e:
+        print(str(e))
+        return 1
+
+    for user in sorted(wanted):
+        q = wanted[user]
+        cur = current.get(q.path)
+
+        if cur is None:
+            print(q.path + ' does not exist')
             continue
 
-        try:
-            current = Directory.from_hdfs(d.path)
+        problems = q.problems(cur)
+        if problems:
+            print(q.path + ' has problems:')
 
-            if d != current:
-                print(current.path + ' has problems:')
+            for p in problems:
+                print(' * ' + p)
 
-                if d.perms != current.perms:
-                    print(' * perms are ' + current.perms +
-                          ', but should be ' + d.perms)
+    if args.apply and not backend.apply(list(wanted.values()), current):
+        return 1
 
-                if d.owner != current.owner:
-                    print(' * owner is ' + current.owner +
-                          ', but should be ' + d.owner)
+    return 0
 
-                if d.group != current.group:
-                    print(' * group is ' + current.group +
-                          ', but should be ' + d.group)
 
-                if args.fixup:
-                    d.write()
-        except IOError:
-            print(d.path + ' does not exist')
+def du(args):
+    """ Reports the HDFS usage of queue users and queues """
 
-            if args.fixup:
-                d.write()
+    from hadmin.hdfs import Directory
+    import hadmin.usage
+
+    parser = ArgumentParser(prog='du',
+                            description='HAdmin HDFS usage report')
+
+    parser.add_argument('--max-age', dest='max_age', type=float,
+                        default=hadmin.usage.DEFAULT_MAX_AGE,
+                        help='Reuse cached usage younger than this many '
+                        'seconds')
+    parser.add_argument('--refresh', dest='refresh', action='store_const',
+                        const=True, default=False,
+                        help='Ignore the cache and read all usage again')
+    parser.add_argument('--fsimage', dest='fsimage', metavar='FILE',
+                        type=hadmin.system.abspath, default=None,
+                        help='Read usage from an fsimage exported with hdfs '
+                        'oiv -p Delimited instead of the NameNode')
+
+    args = parser.parse_args(args)
+
+    sched = hadmin.system.get_cap()
+    members = dict((q, set(u for u in sched.queue(q).users if u is not None))
+                   for q in sched.queue_list())
+
+    homes = dict()
+    for user in queue_users(sched):
+        d = Directory.from_username(user)
+        if d is not None:
+            homes[user] = d.path
+
+    paths = list(homes.values())
+
+    try:
+        if args.fsimage:
+            from hadmin.fsimage import FSImageBackend
+            usages = FSImageBackend(args.fsimage).usage(paths)
+        else:
+            cache = hadmin.usage.UsageCache(args.max_age,
+                                            hadmin.usage.default_path())
+            usages = hadmin.usage.refresh(cache,
+                                          hadmin.usage.ShellUsageBackend(),
+                                          paths, force=args.refresh)
+    except IOError as e:
+        print(str(e))
+        return 1
+
+    pretty = hadmin.usage.pretty_size
+
+    print('Users:')
+    for user in sorted(homes):
+        u = usages[homes[user]]
+
+        if u.exists:
+            print('  ' + user + ': ' + pretty(u.size) + ' (' +
+                  pretty(u.consumed) + ' raw)')
+        else:
+            print('  ' + user + ': ' + homes[user] + ' does not exist')
+
+    print('Queues:')
+    totals = hadmin.usage.rollup(usages, members, homes)
+    for queue in sorted(totals):
+        size, consumed = totals[queue]
+        print('  ' + queue + ': ' + pretty(size) + ' (' + pretty(consumed) +
+              ' raw)')
+
+    return 0
+
+
+def diff(args):
+    """ Shows the differences between two CapacityScheduler configurations """
+
+    from hadmin.yarn import CapacityScheduler
+    import hadmin.diff
+
+    parser = ArgumentParser(prog='diff',
+                            description='HAdmin queue diff utility')
+    parser.add_argument('old', help='capacity-scheduler.xml to compare '
+                        'against. Defaults to the system configuration',
+                        nargs='?', type=hadmin.system.abspath, default=None)
+    parser.add_argument('new', type=hadmin.system.abspath,
+                        help='capacity-scheduler.xml to compare')
+    args = parser.parse_args(args)
+
+    if args.old:
+        old = CapacityScheduler.from_file(args.old)
+    else:
+        old = hadmin.system.get_cap()
+
+    new = CapacityScheduler.from_file(args.new)
+
+    changes = hadmin.diff.diff(old.root_queue, new.root_queue)
+    for change in changes:
+        print(str(change))
+
+    if changes:
+        return 1
+
+    return 0
+
+
+def serve(args):
+    """
+    Runs the commands other hadmin invocations forward over a Unix domain
+    socket, keeping the configuration loaded in between
+    """
+
+    import hadmin.server
+    import signal
+
+    parser = ArgumentParser(prog='serve', description='HAdmin command server')
+    parser.add_argument('--socket', dest='socket', default=None,
+                        help='Where to listen. Defaults to $HADMIN_SOCKET '
+                        'or ~/.cache/hadmin/server.sock')
+    args = parser.parse_args(args)
+
+    server = hadmin.server.Server(cmds, args.socket, QUEUE_CMDS)
+
+    try:
+        server.listen()
+    except (IOError, OSError) as e:
+        print(str(e))
+        return 1
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    server.warm()
+    print('Listening on ' + server.path)
+    sys.stdout.flush()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+def shell(args):
+    """
+    Runs commands interactively against queues kept in memory, saving them
+    only on commit
+    """
+
+    from hadmin.shell import Shell
+
+    parser = ArgumentParser(prog='shell',
+                            description='HAdmin interactive shell')
+    parser.parse_args(args)
+
+    sh = Shell(cmds)
+    intro = None
+
+    while True:
+        try:
+            sh.cmdloop(intro)
+            return 0
+        except KeyboardInterrupt:
+            # Drop the line being typed, but keep the changes
+            print('^C')
+            intro = ''
 
 
 def stats_nn(args):
@@ -405,12 +914,20 @@ def stats_nn(args):
     Print out some NameNode stats
     """
 
+    import hadmin.jmx
+
     parser = ArgumentParser(prog='stats-nn', description='Get NN stats')
     parser.add_argument('host', nargs='?', default='localhost:50070')
+    add_cache_arg(parser)
     args = parser.parse_args(args)
 
     nn = hadmin.jmx.NameNodeJMX()
-    nn.load_from_host(args.host)
+    cache = hadmin.system.get_snapshot_cache(args.cache_ttl)
+    try:
+        nn.load_from_host(args.host, cache=cache)
+    finally:
+        if cache is not None:
+            cache.flush()
 
     print('Daemon stats:')
     print('  Used Memory: ' + str(nn.getHeapMemoryUsed()))
@@ -430,6 +947,8 @@ help_string = """Usage: hadmin <command> <command options>
 Commands:
     chk-dn      Check datanode health
     chk-nm      Check nodemanager health
+    diff        Compare two CapacityScheduler configurations
+    du          Report HDFS usage of queue users and queues
     fhs         Check and fix problems with standard HDFS directories
     genqueues   Generate CapacityScheduler queues from YAML files
     queuecap    Change queue capacity
@@ -437,7 +956,10 @@ Commands:
     queueon     Turn a queue on
     queuestat   View queue information
     queueulim   Change queue user limit
+    quota       Check and set quotas on user directories in HDFS
     sc          Run a sanity check
+    serve       Keep hadmin loaded and run commands sent by others
+    shell       Change queues interactively, saving them on commit
     stats-nm    Get some statistics about a YARN NodeManager
     stats-nn    Get some statistics about an HDFS NameNode
     stats-rm    Get some statistics about a YARN ResourceManager
@@ -447,6 +969,8 @@ Commands:
 cmds = {
     'chk-dn': chk_dn,
     'chk-nm': chk_nm,
+    'diff': diff,
+    'du': du,
     'fhs': fhs,
     'genqueues': genqueues,
     'queuecap': queuecap,
@@ -454,7 +978,10 @@ cmds = {
     'queueon': queueon,
     'queuestat': queuestat,
     'queueulim': queueulim,
+    'quota': quota,
     'sc': sc,
+    'serve': serve,
+    'shell': shell,
     'stats-nm': stats_nm,
     'stats-nn': stats_nn,
     'stats-rm': stats_rm,
@@ -463,6 +990,33 @@ cmds = {
     }
 
 
+# Commands that are never forwarded to ``hadmin serve``
+LOCAL_CMDS = frozenset(['serve', 'shell'])
+
+# Commands that change the queues, which ``hadmin serve`` runs one at a time
+# and while no other command runs
+QUEUE_CMDS = frozenset(['genqueues', 'queuecap', 'queueoff', 'queueon',
+                        'queueulim', 'useradd', 'userdel'])
+
+# Set to run commands here even if ``hadmin serve`` is running
+NO_SERVER_ENV = 'HADMIN_NO_SERVER'
+
+
+def forward(command, sysargs):
+    """
+    Runs the command on ``hadmin serve``, if it is running. Returns the exit
+    status, or None if there is no server.
+    """
+
+    path = hadmin.system.server_socket()
+    if not os.path.exists(path):
+        return None
+
+    from hadmin import server
+
+    return server.forward([command] + sysargs, path)
+
+
 def run():
     if (len(sys.argv) <= 1 or sys.argv[1] == "-h"):
         print(help_string)
@@ -478,4 +1032,9 @@ def run():
         print(help_string)
         return 1
 
+    if command not in LOCAL_CMDS and not os.environ.get(NO_SERVER_ENV):
+        status = forward(command, sysargs)
+        if status is not None:
+            return status
+
     return cmd_func(sysargs)
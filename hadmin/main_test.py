@@ -0,0 +1,215 @@
+from contextlib import redirect_stderr, redirect_stdout
+from hadmin.fakehadoop import FakeCluster, Fleet
+from hadmin.server import Server
+from io import StringIO
+from unittest2 import TestCase
+import hadmin.main
+import hadmin.system
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that are slow to import and only some commands need
+HEAVY = ['asyncio', 'hadmin.conf', 'hadmin.fsimage', 'hadmin.webhdfs',
+         'multiprocessing', 'requests', 'yaml']
+
+LOADED = '''
+import json, sys
+sys.argv = ['hadmin'] + sys.argv[1:]
+import hadmin.main
+if len(sys.argv) > 1:
+    try:
+        hadmin.main.run()
+    except (SystemExit, Exception):
+        pass
+print(json.dumps(sorted(sys.modules)))
+'''
+
+
+def loaded_modules(*args):
+    """
+    Get the modules a fresh interpreter has loaded after importing
+    hadmin.main and running it with args
+    """
+
+    out = subprocess.check_output([sys.executable, '-c', LOADED] +
+                                  list(args), cwd=ROOT)
+    return json.loads(out.decode('utf-8').splitlines()[-1])
+
+
+class ImportTest(TestCase):
+
+    def assertLight(self, modules, extra=()):
+        for m in HEAVY + list(extra):
+            self.assertNotIn(m, modules)
+
+    def testMain(self):
+        self.assertLight(loaded_modules(),
+                         ['hadmin.jmx', 'hadmin.rest', 'hadmin.yarn'])
+
+    def testChkDn(self):
+        # Nothing listens on port 1, so the check fails after loading what
+        # it needs
+        modules = loaded_modules('chk-dn', '127.0.0.1:1')
+        self.assertLight(modules, ['hadmin.yarn'])
+        self.assertIn('hadmin.jmx', modules)
+
+    def testQueuecap(self):
+        self.assertLight(loaded_modules('queuecap', '-h'),
+                         ['hadmin.jmx', 'hadmin.rest'])
+
+    def testFhs(self):
+        self.assertLight(loaded_modules('fhs', '-h'))
+
+    def testGenqueues(self):
+        self.assertIn('yaml', loaded_modules('genqueues', '-h'))
+
+
+class ForwardTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'server.sock')
+        os.environ[hadmin.system.SERVER_SOCKET_ENV] = self.path
+
+        self.argv = sys.argv
+
+    def tearDown(self):
+        sys.argv = self.argv
+        del os.environ[hadmin.system.SERVER_SOCKET_ENV]
+        os.environ.pop(hadmin.main.NO_SERVER_ENV, None)
+        hadmin.system.disable_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def run_main(self, *args):
+        sys.argv = ['hadmin'] + list(args)
+
+        out = StringIO()
+        with redirect_stdout(out):
+            status = hadmin.main.run()
+
+        return status, out.getvalue()
+
+    def testForwarded(self):
+        server = Server({'sc': lambda args: print('from the server')},
+                        self.path)
+        server.listen()
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        try:
+            self.assertEqual((0, 'from the server\n'), self.run_main('sc'))
+
+            # Runs here, where argparse exits after printing the help
+            os.environ[hadmin.main.NO_SERVER_ENV] = '1'
+            with self.assertRaises(SystemExit):
+                self.run_main('queuestat', '-h')
+        finally:
+            server.shutdown()
+            thread.join()
+
+        self.assertEqual(1, server.served)
+
+    def testNoServer(self):
+        self.assertIsNone(hadmin.main.forward('sc', []))
+
+
+class CheckHostsTest(TestCase):
+
+    def setUp(self):
+        self.fleet = Fleet(FakeCluster(nodes=100, beans=5),
+                           {'dn': 100, 'nm': 2})
+        self.addresses = self.fleet.start()
+
+    def tearDown(self):
+        self.fleet.stop()
+
+    def check(self, cmd, hosts):
+        out = StringIO()
+        with redirect_stdout(out):
+            status = hadmin.main.cmds[cmd](hosts)
+
+        return status, out.getvalue().splitlines()
+
+    def testOneHost(self):
+        self.assertEqual((0, ['0 volumes have failed']),
+                         self.check('chk-dn', self.addresses['dn'][:1]))
+
+    def testManyHosts(self):
+        status, lines = self.check('chk-dn', self.addresses['dn'])
+
+        self.assertEqual(1, status)
+        self.assertEqual(100, len(lines))
+        self.assertEqual(self.addresses['dn'][99] + ': 1 volume has failed',
+                         lines[99])
+
+    def testUnreachable(self):
+        status, lines = self.check('chk-nm', self.addresses['nm'] +
+                                   ['127.0.0.1:1'])
+
+        self.assertEqual(2, status)
+        self.assertEqual(self.addresses['nm'][0] + ': node is healthy',
+                         lines[0])
+        self.assertIn('could not check', lines[2])
+
+
+class GenqueuesTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dirs = hadmin.system.HADOOP_CONF_DIRS
+        hadmin.system.HADOOP_CONF_DIRS = [self.tmpdir]
+
+        open(os.path.join(self.tmpdir, 'core-site.xml'), 'w').close()
+        shutil.copy('data/capacity-scheduler.xml', hadmin.system.cap_path())
+
+    def tearDown(self):
+        hadmin.system.HADOOP_CONF_DIRS = self.dirs
+        shutil.rmtree(self.tmpdir)
+
+    def genqueues(self, *args):
+        out = StringIO()
+        with redirect_stdout(out):
+            status = hadmin.main.genqueues(list(args))
+
+        return status, out.getvalue()
+
+    def testIncrementalNeedsDirectory(self):
+        with redirect_stderr(StringIO()):
+            with self.assertRaises(SystemExit):
+                self.genqueues('--incremental', 'data/queues.tree.yml')
+
+    def testIncremental(self):
+        manifest = os.path.join(self.tmpdir, 'manifest.json')
+        output = os.path.join(self.tmpdir, 'out.xml')
+
+        status, out = self.genqueues('--manifest', manifest, 'data/queues',
+                                     output)
+        self.assertEqual(0, status)
+        self.assertIn('Parsed', out)
+
+    def testReloadOtherFile(self):
+        output = os.path.join(self.tmpdir, 'out.xml')
+        cache_home = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = self.tmpdir
+
+        try:
+            status, out = self.genqueues('--reload', 'data/queues', output)
+        finally:
+            if cache_home is None:
+                del os.environ['XDG_CACHE_HOME']
+            else:
+                os.environ['XDG_CACHE_HOME'] = cache_home
+
+        self.assertEqual(0, status)
+        self.assertIn('Ignoring --reload', out)
+        self.assertTrue(os.path.exists(output))
+        self.assertFalse(os.path.exists(os.path.join(
+                self.tmpdir, 'hadmin', hadmin.system.REFRESHED_HASH_FILENAME)))
@@ -3,17 +3,21 @@
 
 class ResponseMock:
 
-    def __init__(self, content, status):
+    def __init__(self, content, status, headers=dict()):
         self.content = content
         self.status = status
+        self.headers = headers
 
     def read(self):
         return self.content
 
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
 
 class JMXConnectionMock:
 
-    def request(self, req_type, path):
+    def request(self, req_type, path, headers=dict()):
         if req_type == 'GET' and path == '/jmx':
             self.requested = True
 
@@ -27,7 +31,7 @@ class JMXConnectionMock:
 
 class RESTConnectionMock:
 
-    def request(self, req_type, path):
+    def request(self, req_type, path, headers=dict()):
         if req_type == 'GET' and path == '/ws/v1/node':
             self.requested = True
 
@@ -37,3 +41,29 @@ class RESTConnectionMock:
                 return ResponseMock(f.read(), 200)
 
         return ResponseMock('', 404)
+
+
+class ValidatingConnectionMock:
+    """
+    Serves a single file for any path, with an ETag. Answers conditional
+    requests carrying a matching If-None-Match with a 304.
+
+    Counts how many requests have been made.
+    """
+
+    def __init__(self, fname, etag='"1"'):
+        self.fname = fname
+        self.etag = etag
+        self.requests = 0
+        self.not_modified = False
+
+    def request(self, req_type, path, headers=dict()):
+        self.requests += 1
+        self.not_modified = headers.get('If-None-Match') == self.etag
+
+    def getresponse(self):
+        if self.not_modified:
+            return ResponseMock('', 304, {'ETag': self.etag})
+
+        with open(self.fname) as f:
+            return ResponseMock(f.read(), 200, {'ETag': self.etag})
@@ -0,0 +1,213 @@
+"""
+Prometheus exporter
+-------------------
+
+Serve the most recently collected metrics over HTTP in the Prometheus text
+exposition format.
+
+The response body is rendered once per collection cycle by
+:py:meth:`Exporter.update`. Requests are answered from that rendered body,
+so scrapes never cause requests to the Hadoop daemons.
+
+When the relay keeps history (see :py:mod:`hadmin.series`), the recent
+samples and statistics of every series are also served as JSON at
+``/history``. ``/history?name=PREFIX`` only returns the series whose name
+starts with ``PREFIX``.
+"""
+
+import json
+import re
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+METRICS_PATH = '/metrics'
+
+HISTORY_PATH = '/history'
+
+PREFIX = 'hadmin_'
+
+
+def metric_name(name):
+    """
+    Turn a metric name into a valid Prometheus metric name
+    """
+
+    return PREFIX + re.sub('[^a-zA-Z0-9_:]', '_', name)
+
+
+def label_value(value):
+    """
+    Escape a label value
+    """
+
+    return (value.replace('\\', '\\\\')
+                 .replace('"', '\\"')
+                 .replace('\n', '\\n'))
+
+
+def labels_from_tag_string(tag_string):
+    """
+    Turn an InfluxDB tag string (``a=b,c=d``) into a list of (name, value)
+    label pairs
+    """
+
+    if not tag_string:
+        return []
+
+    labels = []
+    for pair in re.split(r'(?<!\\),', tag_string):
+        name, _, value = pair.partition('=')
+        name = re.sub('[^a-zA-Z0-9_]', '_', name)
+        value = re.sub(r'\\(.)', r'\1', value)
+        labels.append((name, value))
+
+    return labels
+
+
+def format_value(value):
+    if value is True:
+        return '1'
+
+    if value is False:
+        return '0'
+
+    return repr(float(value))
+
+
+def render(points):
+    """
+    Render (name, labels, value) points in the text exposition format.
+
+    labels is a list of (name, value) pairs. Points whose value is not a
+    number are skipped.
+    """
+
+    grouped = dict()
+
+    for name, labels, value in points:
+        try:
+            formatted = format_value(value)
+        except (TypeError, ValueError):
+            continue
+
+        grouped.setdefault(metric_name(name), []).append((labels, formatted))
+
+    lines = []
+    for name in sorted(grouped):
+        lines.append('# TYPE ' + name + ' gauge')
+
+        for labels, value in grouped[name]:
+            if labels:
+                name_and_labels = name + '{' + ','.join(
+                        k + '="' + label_value(v) + '"'
+                        for k, v in labels) + '}'
+            else:
+                name_and_labels = name
+
+            lines.append(name_and_labels + ' ' + value)
+
+    return '\n'.join(lines) + '\n'
+
+
+class Exporter:
+    """
+    Holds the rendered metrics and serves them over HTTP
+    """
+
+    def __init__(self):
+        self._body = b''
+        self._history = None
+        self._server = None
+
+    def update(self, points, history=None):
+        """
+        Replace the served metrics with points (see :py:func:`render`), and
+        serve the history of history, a
+        :py:class:`hadmin.series.SeriesStore`, if one is given. The history
+        is only summarized when it is asked for.
+        """
+
+        self._body = render(points).encode('utf-8')
+
+        if history is not None:
+            self._history = history
+
+    @property
+    def body(self):
+        return self._body
+
+    def history_body(self, prefix=''):
+        """
+        Get the served history of the series whose names start with prefix
+        as JSON, or None if there is no history
+        """
+
+        if self._history is None:
+            return None
+
+        return json.dumps(self._history.summaries(prefix)).encode('utf-8')
+
+    def serve(self, addr):
+        """
+        Start serving on addr (``host:port``) from a background thread.
+        Returns the (host, port) actually bound.
+        """
+
+        host, _, port = addr.rpartition(':')
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                path, _, query = self.path.partition('?')
+                content_type = CONTENT_TYPE
+
+                if path in (METRICS_PATH, '/'):
+                    body = exporter.body
+                elif path == HISTORY_PATH:
+                    prefix = parse_qs(query).get('name', [''])[0]
+                    body = exporter.history_body(prefix)
+                    content_type = 'application/json'
+                else:
+                    body = None
+
+                if body is None:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self._server = Server((host, int(port)), Handler)
+
+        t = threading.Thread(target=self._server.serve_forever)
+        t.daemon = True
+        t.start()
+
+        return self._server.server_address
+
+    def shutdown(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,99 @@
+from unittest2 import TestCase
+from hadmin.prometheus import Exporter, labels_from_tag_string, render
+from hadmin.series import SeriesStore
+import json
+
+try:
+    from http.client import HTTPConnection
+except ImportError:
+    from httplib import HTTPConnection
+
+
+class RenderTest(TestCase):
+
+    def testName(self):
+        self.assertEqual('# TYPE hadmin_a_b gauge\nhadmin_a_b 1.0\n',
+                         render([('a.b', [], 1)]))
+
+    def testLabels(self):
+        out = render([('a', [('queue', 'root.x'), ('host', 'h"1')], 2)])
+        self.assertIn('hadmin_a{queue="root.x",host="h\\"1"} 2.0', out)
+
+    def testBoolean(self):
+        self.assertIn('hadmin_healthy 1', render([('healthy', [], True)]))
+
+    def testGrouped(self):
+        out = render([('a', [('q', 'x')], 1), ('b', [], 1),
+                      ('a', [('q', 'y')], 2)])
+        self.assertEqual(1, out.count('# TYPE hadmin_a gauge'))
+
+    def testNonNumericSkipped(self):
+        self.assertNotIn('hadmin_a', render([('a', [], 'text')]))
+
+
+class LabelsFromTagStringTest(TestCase):
+
+    def testNone(self):
+        self.assertEqual([], labels_from_tag_string(None))
+
+    def testPairs(self):
+        self.assertEqual([('cluster', 'a'), ('queue', 'root.b')],
+                         labels_from_tag_string('cluster=a,queue=root.b'))
+
+    def testEscaped(self):
+        self.assertEqual([('queue', 'a,b c')],
+                         labels_from_tag_string('queue=a\\,b\\ c'))
+
+
+class ExporterTest(TestCase):
+
+    def setUp(self):
+        self.exporter = Exporter()
+        self.exporter.update([('a', [], 1)])
+        self.host, self.port = self.exporter.serve('127.0.0.1:0')
+
+    def tearDown(self):
+        self.exporter.shutdown()
+
+    def get(self, path):
+        conn = HTTPConnection(self.host, self.port)
+        conn.request('GET', path)
+        res = conn.getresponse()
+        return res.status, res.read()
+
+    def testServesMetrics(self):
+        status, body = self.get('/metrics')
+        self.assertEqual(200, status)
+        self.assertIn(b'hadmin_a 1.0', body)
+
+    def testServesUpdates(self):
+        self.exporter.update([('b', [], 2)])
+        self.assertIn(b'hadmin_b 2.0', self.get('/metrics')[1])
+
+    def testNotFound(self):
+        self.assertEqual(404, self.get('/other')[0])
+
+    def testNoHistory(self):
+        self.assertEqual(404, self.get('/history')[0])
+
+    def testHistory(self):
+        history = SeriesStore(5)
+        history.record('a', 1, 0.0)
+        history.record('a', 2, 10.0)
+        history.record('b', 7, 10.0)
+        self.exporter.update([('a', [], 2)], history)
+
+        status, body = self.get('/history')
+        self.assertEqual(200, status)
+        self.assertEqual(['a', 'b'], [s['name'] for s in json.loads(
+                body.decode('utf-8'))])
+
+        series = json.loads(self.get('/history?name=a')[1].decode('utf-8'))
+        self.assertEqual(1, len(series))
+        self.assertEqual(2.0, series[0]['last'])
+        self.assertEqual(0.1, series[0]['rate'])
+
+        # Summarized when asked for, not when updated
+        history.record('a', 3, 20.0)
+        series = json.loads(self.get('/history?name=a')[1].decode('utf-8'))
+        self.assertEqual(3.0, series[0]['last'])
@@ -0,0 +1,239 @@
+"""
+HDFS quotas
+-----------
+
+Audit and set the namespace (file count) and space quotas of users' home
+directories.
+
+Current quotas are read with as few ``hdfs dfs -count -q`` calls as
+possible, and only the quotas that differ are changed, with one ``hdfs
+dfsadmin`` call per quota value rather than one per directory.
+"""
+
+from hadmin.hdfs import FixupExecutor, HDFS_DFS, LS_CHUNK_SIZE, chunks
+from hadmin.hdfs import check_results
+
+
+DFSADMIN = ['hdfs', 'dfsadmin']
+
+COUNT_COMMAND = HDFS_DFS + ['-count', '-q']
+
+# A quota that is explicitly not set, which -count -q shows as none or inf
+NO_QUOTA = -1
+
+SIZE_SUFFIXES = 'kmgtpe'
+
+
+def parse_size(raw):
+    """
+    Turn a size such as ``500g``, ``10T`` or ``1048576`` into bytes. ``none``
+    gives :py:data:`NO_QUOTA`, and None stays None.
+    """
+
+    return _parse_quota(raw, 1024)
+
+
+def parse_count(raw):
+    """
+    Turn a file count such as ``1000000`` or ``10k`` into a number. The
+    suffixes are decimal, so ``10k`` is 10000 files. ``none`` gives
+    :py:data:`NO_QUOTA`, and None stays None.
+    """
+
+    return _parse_quota(raw, 1000)
+
+
+def _parse_quota(raw, base):
+    if raw is None:
+        return None
+
+    if isinstance(raw, int):
+        return raw
+
+    raw = str(raw).strip().lower()
+
+    if raw in ('none', 'inf'):
+        return NO_QUOTA
+
+    multiplier = 1
+    if raw and raw[-1] in SIZE_SUFFIXES:
+        multiplier = base ** (SIZE_SUFFIXES.index(raw[-1]) + 1)
+        raw = raw[:-1]
+
+    return int(float(raw) * multiplier)
+
+
+def format_size(size):
+    if size is None:
+        return 'unmanaged'
+
+    if size == NO_QUOTA:
+        return 'none'
+
+    return str(size)
+
+
+class Quota:
+    """
+    The quotas of one directory. files is the namespace quota and space the
+    space quota in bytes. Either may be :py:data:`NO_QUOTA`, or None to
+    leave it alone.
+    """
+
+    def __init__(self, path, files=None, space=None):
+        self.path = path
+        self.files = files
+        self.space = space
+
+    @classmethod
+    def from_count_line(cls, line):
+        """
+        Parse one line of ``hdfs dfs -count -q`` output, or get None if the
+        line is not a count
+        """
+
+        arr = line.split(None, 7)
+        if len(arr) < 8:
+            return None
+
+        def value(raw):
+            if raw in ('none', 'inf'):
+                return NO_QUOTA
+            return int(raw)
+
+        try:
+            return Quota(arr[7], files=value(arr[0]), space=value(arr[2]))
+        except ValueError:
+            return None
+
+    def merge(self, other):
+        """
+        Get the more generous of this quota and other, field by field
+        """
+
+        def larger(a, b):
+            if a is None or b is None:
+                return a if b is None else b
+
+            if NO_QUOTA in (a, b):
+                return NO_QUOTA
+
+            return max(a, b)
+
+        return Quota(self.path, larger(self.files, other.files),
+                     larger(self.space, other.space))
+
+    def problems(self, current):
+        """
+        Describe how current differs from this quota, as a list of strings
+        """
+
+        ret = []
+
+        if self.files is not None and self.files != current.files:
+            ret.append('file quota is ' + format_size(current.files) +
+                       ', but should be ' + format_size(self.files))
+
+        if self.space is not None and self.space != current.space:
+            ret.append('space quota is ' + format_size(current.space) +
+                       ', but should be ' + format_size(self.space))
+
+        return ret
+
+    def __eq__(self, other):
+        return (self.path == other.path and self.files == other.files and
+                self.space == other.space)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __str__(self):
+        return ' '.join([format_size(self.files), format_size(self.space),
+                         self.path])
+
+
+def quota_commands(wanted, current, dfsadmin=DFSADMIN,
+                   chunk_size=LS_CHUNK_SIZE):
+    """
+    Get the ``dfsadmin`` commands that change the quotas in current (a dict
+    of path to :py:class:`Quota`) to those in wanted (a list of
+    :py:class:`Quota`). Paths missing from current are skipped.
+
+    The commands are independent of each other.
+    """
+
+    groups = dict()
+
+    def add(op, value, path):
+        groups.setdefault((op, value), []).append(path)
+
+    for q in wanted:
+        cur = current.get(q.path)
+        if cur is None:
+            continue
+
+        if q.files is not None and q.files != cur.files:
+            if q.files == NO_QUOTA:
+                add('-clrQuota', None, q.path)
+            else:
+                add('-setQuota', q.files, q.path)
+
+        if q.space is not None and q.space != cur.space:
+            if q.space == NO_QUOTA:
+                add('-clrSpaceQuota', None, q.path)
+            else:
+                add('-setSpaceQuota', q.space, q.path)
+
+    cmds = []
+    for op, value in sorted(groups, key=lambda k: (k[0], k[1] or 0)):
+        args = [op] if value is None else [op, str(value)]
+
+        for chunk in chunks(sorted(groups[(op, value)]), chunk_size):
+            cmds.append(dfsadmin + args + chunk)
+
+    return cmds
+
+
+class ShellQuotaBackend:
+    """
+    Reads quotas with ``hdfs dfs -count -q`` and sets them with ``hdfs
+    dfsadmin``
+    """
+
+    def __init__(self, count_command=None, dfsadmin=None,
+                 chunk_size=LS_CHUNK_SIZE, executor=None):
+        self.count_command = count_command or COUNT_COMMAND
+        self.dfsadmin = dfsadmin or DFSADMIN
+        self.chunk_size = chunk_size
+        self.executor = executor or FixupExecutor()
+
+    def current(self, paths):
+        """
+        Get a dict of path to :py:class:`Quota` for each of paths that
+        exists. Raises IOError if the quotas could not be read for any
+        other reason than a path not existing.
+        """
+
+        ret = dict()
+
+        def parse(line):
+            q = Quota.from_count_line(line)
+            if q is not None:
+                ret[q.path] = q
+
+        path_chunks = list(chunks(sorted(set(paths)), self.chunk_size))
+        cmds = [self.count_command + chunk for chunk in path_chunks]
+        results = self.executor.run_all(cmds, [parse] * len(cmds))
+        check_results(self.count_command, path_chunks, results, ret)
+
+        return ret
+
+    def apply(self, wanted, current):
+        """
+        Change the quotas in current to those in wanted. Returns True if
+        every command succeeded.
+        """
+
+        return self.executor.run([quota_commands(wanted, current,
+                                                 self.dfsadmin,
+                                                 self.chunk_size)])
@@ -0,0 +1,158 @@
+from hadmin.conf import QueueGenerator
+from hadmin.quota import DFSADMIN, NO_QUOTA, Quota, ShellQuotaBackend
+from hadmin.quota import parse_count, parse_size, quota_commands
+from unittest2 import TestCase
+import sys
+
+
+FAKE_COUNT = [sys.executable, '-c', '''import sys
+status = 0
+for p in sys.argv[1:]:
+    if 'missing' in p:
+        sys.stderr.write('count: `' + p + "': No such file or directory\\n")
+        status = 1
+    else:
+        print('        none             inf    1073741824      1073741824'
+              '            1            0                  0 ' + p)
+sys.exit(status)
+''']
+
+FAILING_COUNT = [sys.executable, '-c', '''import sys
+sys.stderr.write('count: Permission denied: user=nobody\\n')
+sys.exit(1)
+''']
+
+
+class ParseSizeTest(TestCase):
+
+    def testBytes(self):
+        self.assertEqual(1048576, parse_size('1048576'))
+
+    def testInt(self):
+        self.assertEqual(42, parse_size(42))
+
+    def testSuffix(self):
+        self.assertEqual(10 * 1024 ** 4, parse_size('10T'))
+        self.assertEqual(512 * 1024 ** 2, parse_size('0.5g'))
+
+    def testNone(self):
+        self.assertEqual(NO_QUOTA, parse_size('none'))
+        self.assertIsNone(parse_size(None))
+
+    def testInvalid(self):
+        with self.assertRaises(ValueError):
+            parse_size('lots')
+
+
+class ParseCountTest(TestCase):
+
+    def testCount(self):
+        self.assertEqual(1000000, parse_count('1000000'))
+
+    def testDecimalSuffix(self):
+        self.assertEqual(10000, parse_count('10k'))
+        self.assertEqual(2500000, parse_count('2.5M'))
+
+    def testNone(self):
+        self.assertEqual(NO_QUOTA, parse_count('none'))
+        self.assertIsNone(parse_count(None))
+
+
+class QuotaTest(TestCase):
+
+    def testFromCountLine(self):
+        q = Quota.from_count_line(
+            '        1000             998            none             inf'
+            '            1            1                 12 /user/bob')
+        self.assertEqual(Quota('/user/bob', 1000, NO_QUOTA), q)
+
+    def testFromCountLineError(self):
+        self.assertIsNone(Quota.from_count_line(
+            "count: `/user/nobody': No such file or directory"))
+
+    def testMerge(self):
+        a = Quota('/user/a', files=10, space=None)
+        b = Quota('/user/a', files=20, space=5)
+        self.assertEqual(Quota('/user/a', 20, 5), a.merge(b))
+
+    def testMergeNoQuota(self):
+        a = Quota('/user/a', files=NO_QUOTA)
+        b = Quota('/user/a', files=20)
+        self.assertEqual(NO_QUOTA, a.merge(b).files)
+
+    def testProblems(self):
+        wanted = Quota('/user/a', files=None, space=100)
+        self.assertEqual(['space quota is none, but should be 100'],
+                         wanted.problems(Quota('/user/a', 5, NO_QUOTA)))
+
+
+class QuotaCommandsTest(TestCase):
+
+    def testOnlyDifferences(self):
+        current = {
+            '/user/a': Quota('/user/a', NO_QUOTA, 100),
+            '/user/b': Quota('/user/b', 10, NO_QUOTA),
+            '/user/c': Quota('/user/c', 10, 100),
+            }
+        wanted = [
+            Quota('/user/a', 10, 100),
+            Quota('/user/b', 10, 100),
+            Quota('/user/c', NO_QUOTA, None),
+            Quota('/user/missing', 10, 100),
+            ]
+
+        self.assertEqual([
+            DFSADMIN + ['-clrQuota', '/user/c'],
+            DFSADMIN + ['-setQuota', '10', '/user/a'],
+            DFSADMIN + ['-setSpaceQuota', '100', '/user/b'],
+            ], quota_commands(wanted, current))
+
+    def testGrouped(self):
+        paths = ['/user/' + str(i) for i in range(5)]
+        current = dict((p, Quota(p, NO_QUOTA, NO_QUOTA)) for p in paths)
+        wanted = [Quota(p, None, 100) for p in paths]
+
+        cmds = quota_commands(wanted, current, chunk_size=3)
+        self.assertEqual([
+            DFSADMIN + ['-setSpaceQuota', '100'] + paths[:3],
+            DFSADMIN + ['-setSpaceQuota', '100'] + paths[3:],
+            ], cmds)
+
+
+class ShellQuotaBackendTest(TestCase):
+
+    def testCurrent(self):
+        backend = ShellQuotaBackend(count_command=FAKE_COUNT, chunk_size=2)
+        current = backend.current(['/user/a', '/user/b', '/user/c',
+                                   '/user/missing'])
+
+        self.assertEqual(['/user/a', '/user/b', '/user/c'], sorted(current))
+        self.assertEqual(Quota('/user/a', NO_QUOTA, 1073741824),
+                         current['/user/a'])
+
+    def testCurrentFailed(self):
+        backend = ShellQuotaBackend(count_command=FAILING_COUNT)
+
+        with self.assertRaises(IOError):
+            backend.current(['/user/a'])
+
+
+class UserQuotasTest(TestCase):
+
+    def setUp(self):
+        gen = QueueGenerator.load('data/queues.quota.yml')
+        self.quotas = gen.user_quotas()
+
+    def testUsers(self):
+        self.assertEqual(['alec', 'bob', 'carol', 'dave'], sorted(self.quotas))
+
+    def testMostGenerous(self):
+        self.assertEqual(Quota('/user/alec', 1000000, 10 * 1024 ** 4),
+                         self.quotas['alec'])
+
+    def testPartial(self):
+        self.assertEqual(Quota('/user/carol', None, 500 * 1024 ** 3),
+                         self.quotas['carol'])
+
+    def testClear(self):
+        self.assertEqual(NO_QUOTA, self.quotas['dave'].files)
@@ -4,6 +4,7 @@ Hadoop REST API handling
 
 """
 
+import hadmin.cache
 import json
 
 try:
@@ -32,28 +33,27 @@ class Base:
         raise AttributeError("You cannot initialize this class")
 
     @classmethod
-    def load_from_host(cls, addr, path=None, paths=[]):
+    def load_from_host(cls, addr, path=None, paths=[], cache=None):
+        paths = list(paths)
         if path:
             paths.append(path)
 
         conn = HTTPConnection(addr)
-        return cls.load_from_connections(conn, paths)
+        return cls.load_from_connections(conn, paths, cache=cache, host=addr)
 
     @classmethod
-    def load_from_connection(cls, conn, path):
-        conn.request('GET', path)
-        res = conn.getresponse()
-        if res.status == 200:
-            return cls.load_from_json(res.read())
+    def load_from_connection(cls, conn, path, cache=None, host=None):
+        raw = hadmin.cache.fetch(conn, path, cache=cache, host=host)
+        if raw is not None:
+            return cls.load_from_json(raw)
 
     @classmethod
-    def load_from_connections(cls, conn, paths):
+    def load_from_connections(cls, conn, paths, cache=None, host=None):
         jsons = []
         for path in paths:
-            conn.request('GET', path)
-            res = conn.getresponse()
-            if res.status == 200:
-                jsons.append(res.read())
+            raw = hadmin.cache.fetch(conn, path, cache=cache, host=host)
+            if raw is not None:
+                jsons.append(raw)
 
         return cls.load_from_jsons(jsons)
 
@@ -122,6 +122,11 @@ class NodeManager(Base):
     def allocated_cores(self):
         return self.data['totalVCoresAllocatedContainers']
 
+    def __iter__(self):
+        yield 'node_healthy', self.isHealthy()
+        yield 'node_memory_mb_allocated', self.allocated_memory
+        yield 'node_vcpus_allocated', self.allocated_cores
+
 
 class Queue:
     """
@@ -152,6 +157,22 @@ class Queue:
         else:
             self.containers = 0
 
+    @property
+    def depth(self):
+        """
+        How far below root this queue is. Children of root have a depth of 1.
+        """
+
+        return self.name.count('.')
+
+    def __iter__(self):
+        yield 'queue_absolute_capacity_used', self.absolute_capacity_used
+        yield 'queue_applications', self.applications
+        yield 'queue_capacity_used', self.capacity_used
+        yield 'queue_containers', self.containers
+        yield 'queue_memory_mb_used', self.resources_used_memory_mb
+        yield 'queue_vcpus_used', self.resources_used_vcpus
+
 
 class ResourceManager(Base):
     """
@@ -209,6 +230,25 @@ class ResourceManager(Base):
                 self._load_subqueues(q['queues']['queue'],
                                      prefix=tmp.name)
 
+    def queue_metrics(self, max_depth=None, limit=None):
+        """
+        Get per-queue metrics as a list of (queue name, metric name, value)
+
+        Only queues at most max_depth levels below root are included. If
+        limit is given, at most that many queues are included, preferring
+        the ones closest to root.
+        """
+
+        queues = getattr(self, 'queues', [])
+
+        if max_depth is not None:
+            queues = [q for q in queues if q.depth <= max_depth]
+
+        if limit is not None and len(queues) > limit:
+            queues = sorted(queues, key=lambda q: (q.depth, q.name))[:limit]
+
+        return [(q.name, k, v) for q in queues for k, v in q]
+
     def __iter__(self):
         yield 'metrics_apps_running', self.apps_running
         yield 'metrics_memory_mb_allocated', self.memory_mb_allocated
@@ -13,6 +13,12 @@ class NodeManagerTest(TestCase):
         self.assertEqual(self.rest.getHealthReport(),
                          "1/2 local-dirs are bad: /var/hadoop/compute; ")
 
+    def testMetrics(self):
+        self.assertEqual({'node_healthy': True,
+                          'node_memory_mb_allocated': 1024,
+                          'node_vcpus_allocated': 8},
+                         dict(self.rest))
+
     def setUp(self):
         with open('data/nodemanager.rest.json') as f:
             self.rest = NodeManager.load_from_json(f.read())
@@ -149,6 +155,25 @@ class ResourceManagerTest(TestCase):
         self.assertEqual(self.staff_dev.resources_used_memory_mb, 40000)
     # end 'staff.dev' test
 
+    def testStaffDevDepth(self):
+        self.assertEqual(2, self.staff_dev.depth)
+
+    def testQueueMetrics(self):
+        self.assertEqual(4 * 6, len(self.rm.queue_metrics()))
+
+    def testQueueMetricsValue(self):
+        metrics = self.rm.queue_metrics()
+        self.assertIn(('root.staff.dev', 'queue_containers', 30), metrics)
+
+    def testQueueMetricsDepth(self):
+        names = set(m[0] for m in self.rm.queue_metrics(max_depth=1))
+        self.assertEqual(set(['root.default', 'root.staff']), names)
+
+    def testQueueMetricsLimit(self):
+        names = set(m[0] for m in self.rm.queue_metrics(limit=3))
+        self.assertEqual(set(['root.default', 'root.staff', 'root.staff.dev']),
+                         names)
+
     def setUp(self):
         met = ''
         sched = ''
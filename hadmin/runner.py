@@ -0,0 +1,290 @@
+"""
+Running commands
+----------------
+
+Run external commands, such as ``hdfs`` and ``yarn``, without a shell.
+
+Each command's standard output is handed to a parser one line at a time as
+it is produced, instead of being collected first. Commands that take longer
+than their timeout are killed. :py:class:`ThreadRunner` runs many commands
+at once from a thread pool; :py:class:`AsyncRunner` does the same with
+asyncio. Both cap how many commands run at the same time and return a
+:py:class:`Result` for each command.
+
+Commands run in the working directory and environment of the ``hadmin``
+command that runs them, which ``hadmin serve`` sets for each client.
+"""
+
+import subprocess
+import threading
+import time
+
+
+DEFAULT_WORKERS = 4
+
+# Status of a command that could not be started. It is not an exit status,
+# so it cannot be mistaken for a command that ran and exited with 127.
+NOT_FOUND = None
+
+# Status of a command that was killed for running past its timeout
+TIMED_OUT = -1
+
+
+class Result:
+    """
+    The outcome of one command.
+
+    output holds standard output, unless it was handed to a parser, in
+    which case it is empty. errors holds standard error.
+    """
+
+    def __init__(self, argv, status, output='', errors='', elapsed=0.0,
+                 timed_out=False):
+        self.argv = argv
+        self.status = status
+        self.output = output
+        self.errors = errors
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+
+    @property
+    def ok(self):
+        return self.status == 0
+
+    def __repr__(self):
+        return '<Result ' + ' '.join(self.argv) + ': ' + str(self.status) + '>'
+
+
+def decode(raw):
+    return raw.decode('utf-8', 'replace')
+
+
+def not_found(argv, start, e):
+    return Result(argv, NOT_FOUND, errors=str(e), elapsed=time.time() - start)
+
+
+def timed_out(argv, start, timeout):
+    return Result(argv, TIMED_OUT,
+                  errors='timed out after ' + str(timeout) + ' seconds',
+                  elapsed=time.time() - start, timed_out=True)
+
+
+def context(cwd=None, env=None):
+    """
+    Get the working directory and environment to run commands with: cwd and
+    env, or else those of the hadmin command running in this thread (see
+    :py:func:`hadmin.system.in_request`)
+    """
+
+    import hadmin.system
+
+    if cwd is None:
+        cwd = hadmin.system.getcwd()
+
+    if env is None:
+        env = dict(hadmin.system.environ())
+
+    return cwd, env
+
+
+def run(argv, parser=None, timeout=None, cwd=None, env=None):
+    """
+    Run argv and wait for it to finish. Returns a :py:class:`Result`.
+
+    If parser is given, it is called with each line of standard output
+    (without the line ending) as soon as the line is read. The command runs
+    in cwd with env, by default those of :py:func:`context`.
+    """
+
+    start = time.time()
+    cwd, env = context(cwd, env)
+
+    try:
+        proc = subprocess.Popen(argv, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, cwd=cwd, env=env)
+    except OSError as e:
+        return not_found(argv, start, e)
+
+    killed = []
+
+    def kill():
+        killed.append(True)
+        proc.kill()
+
+    timer = None
+    if timeout:
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+
+    errors = []
+    drain = threading.Thread(target=lambda: errors.append(proc.stderr.read()))
+    drain.daemon = True
+    drain.start()
+
+    lines = []
+
+    try:
+        for raw in iter(proc.stdout.readline, b''):
+            line = decode(raw).rstrip('\r\n')
+
+            if parser is None:
+                lines.append(line)
+            else:
+                parser(line)
+
+        proc.wait()
+    except Exception:
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+        drain.join()
+        proc.stdout.close()
+        proc.stderr.close()
+
+    if killed:
+        return timed_out(argv, start, timeout)
+
+    return Result(argv, proc.returncode, '\n'.join(lines), decode(errors[0]),
+                  time.time() - start)
+
+
+async def run_async(argv, parser=None, timeout=None, cwd=None, env=None):
+    """
+    Coroutine version of :py:func:`run`
+    """
+
+    import asyncio
+
+    start = time.time()
+    cwd, env = context(cwd, env)
+
+    try:
+        proc = await asyncio.create_subprocess_exec(
+                *argv, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE, cwd=cwd, env=env)
+    except OSError as e:
+        return not_found(argv, start, e)
+
+    lines = []
+
+    async def read_stdout():
+        while True:
+            raw = await proc.stdout.readline()
+            if not raw:
+                break
+
+            line = decode(raw).rstrip('\r\n')
+
+            if parser is None:
+                lines.append(line)
+            else:
+                parser(line)
+
+    async def communicate():
+        errors, _ = await asyncio.gather(proc.stderr.read(), read_stdout())
+        await proc.wait()
+        return errors
+
+    try:
+        errors = await asyncio.wait_for(communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return timed_out(argv, start, timeout)
+    except Exception:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+
+    return Result(argv, proc.returncode, '\n'.join(lines), decode(errors),
+                  time.time() - start)
+
+
+class ThreadRunner:
+    """
+    Runs commands from a pool of worker threads, killing any that take
+    longer than timeout seconds
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, timeout=None):
+        self.workers = workers
+        self.timeout = timeout
+
+    def run(self, argv, parser=None):
+        return run(argv, parser, self.timeout)
+
+    def run_all(self, cmds, parsers=None):
+        """
+        Run the argument lists in cmds, at most workers at a time. parsers,
+        if given, holds a parser (or None) for each command. Returns a
+        :py:class:`Result` for each command, in the same order.
+        """
+
+        from multiprocessing.pool import ThreadPool
+
+        if not cmds:
+            return []
+
+        parsers = parsers or [None] * len(cmds)
+
+        # The workers do not share this thread's context, so it is handed
+        # to them
+        cwd, env = context()
+
+        def run_one(item):
+            return run(item[0], item[1], self.timeout, cwd, env)
+
+        pool = ThreadPool(min(self.workers, len(cmds)))
+
+        try:
+            return pool.map(run_one, zip(cmds, parsers))
+        finally:
+            pool.close()
+            pool.join()
+
+
+class AsyncRunner:
+    """
+    Runs commands with asyncio, at most workers at a time, killing any that
+    take longer than timeout seconds
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, timeout=None):
+        self.workers = workers
+        self.timeout = timeout
+
+    async def run_all(self, cmds, parsers=None):
+        """
+        Coroutine version of :py:meth:`ThreadRunner.run_all`
+        """
+
+        import asyncio
+
+        parsers = parsers or [None] * len(cmds)
+        limit = asyncio.Semaphore(self.workers)
+        cwd, env = context()
+
+        async def run_one(argv, parser):
+            async with limit:
+                return await run_async(argv, parser, self.timeout, cwd, env)
+
+        return list(await asyncio.gather(
+            *[run_one(c, p) for c, p in zip(cmds, parsers)]))
+
+    def run_all_sync(self, cmds, parsers=None):
+        """
+        Run :py:meth:`run_all` on a new event loop and wait for it
+        """
+
+        import asyncio
+
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.run_all(cmds, parsers))
+        finally:
+            loop.close()
@@ -0,0 +1,146 @@
+from hadmin.runner import AsyncRunner, NOT_FOUND, ThreadRunner, TIMED_OUT
+from hadmin.runner import run
+from unittest2 import TestCase
+import hadmin.system
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+
+def python(code):
+    return [sys.executable, '-c', code]
+
+
+LINES = python('for i in range(3): print("line %d" % i)')
+FAIL = python('import sys; sys.stderr.write("bad\\n"); sys.exit(2)')
+SLEEP = python('import time; time.sleep(10)')
+WHERE = python('import os; print(os.getcwd()); '
+               'print(os.environ.get("HADMIN_TEST_VALUE"))')
+
+
+def where_in_request(runner_run_all):
+    """
+    Run WHERE with runner_run_all as if serving a request from a temporary
+    directory. Returns the directory and the outputs.
+    """
+
+    tmpdir = os.path.realpath(tempfile.mkdtemp())
+
+    try:
+        with hadmin.system.in_request(tmpdir, {'HADMIN_TEST_VALUE': 'hi'}):
+            rets = runner_run_all([WHERE, WHERE])
+    finally:
+        shutil.rmtree(tmpdir)
+
+    return tmpdir, [r.output for r in rets]
+
+
+class RunTest(TestCase):
+
+    def testOutput(self):
+        ret = run(LINES)
+        self.assertTrue(ret.ok)
+        self.assertEqual('line 0\nline 1\nline 2', ret.output)
+
+    def testParser(self):
+        lines = []
+        ret = run(LINES, parser=lines.append)
+        self.assertEqual(['line 0', 'line 1', 'line 2'], lines)
+        self.assertEqual('', ret.output)
+
+    def testParserStreams(self):
+        seen = []
+        cmd = python('import sys, time\n'
+                     'print("first"); sys.stdout.flush(); time.sleep(0.5)\n'
+                     'print("second")')
+        start = time.time()
+        run(cmd, parser=lambda line: seen.append(time.time() - start))
+        self.assertLess(seen[0], seen[1] - 0.3)
+
+    def testFailure(self):
+        ret = run(FAIL)
+        self.assertEqual(2, ret.status)
+        self.assertEqual('bad\n', ret.errors)
+        self.assertFalse(ret.ok)
+
+    def testNoShell(self):
+        ret = run(['echo', '$HOME', '*'])
+        self.assertEqual('$HOME *', ret.output)
+
+    def testNotFound(self):
+        ret = run(['hadmin-no-such-binary'])
+        self.assertEqual(NOT_FOUND, ret.status)
+        self.assertFalse(ret.ok)
+
+    def testExit127(self):
+        ret = run(python('import sys; sys.exit(127)'))
+        self.assertEqual(127, ret.status)
+        self.assertNotEqual(NOT_FOUND, ret.status)
+
+    def testTimeout(self):
+        ret = run(SLEEP, timeout=0.2)
+        self.assertEqual(TIMED_OUT, ret.status)
+        self.assertTrue(ret.timed_out)
+        self.assertLess(ret.elapsed, 5)
+
+    def testParserError(self):
+        def parser(line):
+            raise ValueError(line)
+
+        with self.assertRaises(ValueError):
+            run(LINES, parser=parser)
+
+
+class ThreadRunnerTest(TestCase):
+
+    def testOrder(self):
+        cmds = [python('print(%d)' % i) for i in range(6)]
+        rets = ThreadRunner(workers=3).run_all(cmds)
+        self.assertEqual([str(i) for i in range(6)], [r.output for r in rets])
+
+    def testConcurrent(self):
+        cmds = [python('import time; time.sleep(0.3)')] * 4
+        start = time.time()
+        ThreadRunner(workers=4).run_all(cmds)
+        self.assertLess(time.time() - start, 1.1)
+
+    def testParsers(self):
+        lines = []
+        ThreadRunner().run_all([LINES, LINES], [lines.append, None])
+        self.assertEqual(3, len(lines))
+
+    def testEmpty(self):
+        self.assertEqual([], ThreadRunner().run_all([]))
+
+    def testRequestContext(self):
+        tmpdir, outputs = where_in_request(ThreadRunner().run_all)
+        self.assertEqual([tmpdir + '\nhi'] * 2, outputs)
+
+
+class AsyncRunnerTest(TestCase):
+
+    def testRunAll(self):
+        lines = []
+        rets = AsyncRunner(workers=2).run_all_sync(
+                [LINES, FAIL, ['hadmin-no-such-binary']],
+                [lines.append, None, None])
+
+        self.assertEqual(['line 0', 'line 1', 'line 2'], lines)
+        self.assertEqual([0, 2, NOT_FOUND], [r.status for r in rets])
+        self.assertEqual('bad\n', rets[1].errors)
+
+    def testTimeout(self):
+        rets = AsyncRunner(timeout=0.2).run_all_sync([SLEEP])
+        self.assertTrue(rets[0].timed_out)
+
+    def testConcurrencyCapped(self):
+        cmds = [python('import time; time.sleep(0.3)')] * 4
+        start = time.time()
+        AsyncRunner(workers=2).run_all_sync(cmds)
+        self.assertGreater(time.time() - start, 0.55)
+
+    def testRequestContext(self):
+        tmpdir, outputs = where_in_request(AsyncRunner().run_all_sync)
+        self.assertEqual([tmpdir + '\nhi'] * 2, outputs)
@@ -0,0 +1,218 @@
+"""
+Recent metric history
+---------------------
+
+Keep the last few samples of every metric series in memory, so that recent
+history can be inspected without asking InfluxDB.
+
+Samples are stored in fixed-size ``array`` buffers of doubles, and the
+statistics are computed over those buffers with the builtin functions.
+
+``hadmin-stats-influxd --history N --listen HOST:PORT`` serves the history
+as JSON at ``/history`` (see :py:mod:`hadmin.prometheus`), for status pages
+and alerting.
+"""
+
+from array import array
+
+
+class RingBuffer:
+    """
+    Holds the last `size` (timestamp, value) samples of one series
+    """
+
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+
+        self.size = size
+        self._times = array('d', [0.0]) * size
+        self._values = array('d', [0.0]) * size
+        self._next = 0
+        self._count = 0
+
+        # Samples appended so far, which tells whether the dict to_dict()
+        # built last time is still current
+        self._version = 0
+        self._summary = None
+
+    def append(self, timestamp, value):
+        """
+        Add a sample, overwriting the oldest one if the buffer is full
+        """
+
+        self._times[self._next] = timestamp
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.size
+
+        if self._count < self.size:
+            self._count += 1
+
+        self._version += 1
+
+    def __len__(self):
+        return self._count
+
+    def _ordered(self, buf):
+        if self._count < self.size:
+            return buf[:self._count]
+
+        return buf[self._next:] + buf[:self._next]
+
+    def times(self):
+        """
+        Timestamps of the samples, oldest first
+        """
+
+        return self._ordered(self._times)
+
+    def values(self):
+        """
+        Values of the samples, oldest first
+        """
+
+        return self._ordered(self._values)
+
+    def last(self):
+        """
+        The most recent value, or None if there are no samples
+        """
+
+        if self._count == 0:
+            return None
+
+        return self._values[self._next - 1]
+
+    def min(self):
+        return min(self.values()) if self._count else None
+
+    def max(self):
+        return max(self.values()) if self._count else None
+
+    def mean(self):
+        if self._count == 0:
+            return None
+
+        return sum(self.values()) / self._count
+
+    def percentile(self, p):
+        """
+        Get the p-th percentile (0 to 100) of the values, interpolating
+        linearly between samples
+        """
+
+        if self._count == 0:
+            return None
+
+        if not 0.0 <= p <= 100.0:
+            raise ValueError("p must be between 0 and 100")
+
+        ordered = sorted(self.values())
+        rank = (len(ordered) - 1) * p / 100.0
+        lower = int(rank)
+        upper = min(lower + 1, len(ordered) - 1)
+        frac = rank - lower
+
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * frac
+
+    def rate(self):
+        """
+        Average change in value per second across the buffered samples, or
+        None if there are fewer than two samples
+        """
+
+        if self._count < 2:
+            return None
+
+        times = self.times()
+        values = self.values()
+        elapsed = times[-1] - times[0]
+
+        if elapsed <= 0:
+            return None
+
+        return (values[-1] - values[0]) / elapsed
+
+    def to_dict(self):
+        """
+        Get the samples, oldest first, and their statistics as a dict. The
+        dict is built again only once samples were appended.
+        """
+
+        summary = self._summary
+        if summary is not None and summary[0] == self._version:
+            return dict(summary[1])
+
+        version = self._version
+        d = {
+            'samples': [[t, v] for t, v in zip(self.times(), self.values())],
+            'last': self.last(),
+            'min': self.min(),
+            'max': self.max(),
+            'mean': self.mean(),
+            'p95': self.percentile(95),
+            'rate': self.rate()
+            }
+        self._summary = (version, d)
+
+        return dict(d)
+
+
+class SeriesStore:
+    """
+    A :py:class:`RingBuffer` for every series, keyed by metric name and tag
+    string
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._series = dict()
+
+    def record(self, name, value, timestamp, tag_string=None):
+        """
+        Record a sample. Values that are not numbers are ignored.
+        """
+
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+
+        key = (name, tag_string)
+        buf = self._series.get(key)
+
+        if buf is None:
+            buf = RingBuffer(self.size)
+            self._series[key] = buf
+
+        buf.append(timestamp, value)
+
+    def get(self, name, tag_string=None):
+        """
+        Get the :py:class:`RingBuffer` of a series, or None
+        """
+
+        return self._series.get((name, tag_string))
+
+    def keys(self):
+        return sorted(list(self._series), key=lambda k: (k[0], k[1] or ''))
+
+    def summaries(self, prefix=''):
+        """
+        Get the samples and statistics of every series whose name starts
+        with prefix, as a list of dicts (see :py:meth:`RingBuffer.to_dict`)
+        that also hold the name and tag string
+        """
+
+        ret = []
+        for name, tag_string in self.keys():
+            if name.startswith(prefix):
+                d = self._series[(name, tag_string)].to_dict()
+                d['name'] = name
+                d['tags'] = tag_string
+                ret.append(d)
+
+        return ret
+
+    def __len__(self):
+        return len(self._series)
@@ -0,0 +1,105 @@
+from unittest2 import TestCase
+from hadmin.series import RingBuffer, SeriesStore
+
+
+class RingBufferTest(TestCase):
+
+    def setUp(self):
+        self.buf = RingBuffer(4)
+
+        for i in range(6):
+            self.buf.append(float(i), float(i * 10))
+
+    def testLen(self):
+        self.assertEqual(4, len(self.buf))
+
+    def testOldestDropped(self):
+        self.assertEqual([20.0, 30.0, 40.0, 50.0], list(self.buf.values()))
+
+    def testTimesOrdered(self):
+        self.assertEqual([2.0, 3.0, 4.0, 5.0], list(self.buf.times()))
+
+    def testLast(self):
+        self.assertEqual(50.0, self.buf.last())
+
+    def testMin(self):
+        self.assertEqual(20.0, self.buf.min())
+
+    def testMax(self):
+        self.assertEqual(50.0, self.buf.max())
+
+    def testMean(self):
+        self.assertEqual(35.0, self.buf.mean())
+
+    def testMedian(self):
+        self.assertEqual(35.0, self.buf.percentile(50))
+
+    def testPercentileBounds(self):
+        self.assertEqual(20.0, self.buf.percentile(0))
+        self.assertEqual(50.0, self.buf.percentile(100))
+
+    def testRate(self):
+        self.assertEqual(10.0, self.buf.rate())
+
+    def testPartial(self):
+        buf = RingBuffer(4)
+        buf.append(0.0, 1.0)
+        self.assertEqual([1.0], list(buf.values()))
+        self.assertEqual(1.0, buf.last())
+        self.assertEqual(None, buf.rate())
+
+    def testEmpty(self):
+        buf = RingBuffer(4)
+        self.assertEqual(None, buf.last())
+        self.assertEqual(None, buf.mean())
+        self.assertEqual(None, buf.percentile(50))
+
+    def testToDictCached(self):
+        calls = []
+        percentile = self.buf.percentile
+        self.buf.percentile = lambda p: calls.append(p) or percentile(p)
+
+        self.buf.to_dict()['last'] = None
+        self.assertEqual(50.0, self.buf.to_dict()['last'])
+        self.assertEqual(1, len(calls))
+
+        self.buf.append(6.0, 60.0)
+        self.assertEqual(60.0, self.buf.to_dict()['last'])
+        self.assertEqual(2, len(calls))
+
+
+class SeriesStoreTest(TestCase):
+
+    def setUp(self):
+        self.store = SeriesStore(10)
+
+    def testRecord(self):
+        self.store.record('a', 1, 0.0)
+        self.store.record('a', 2, 1.0)
+        self.assertEqual(2, len(self.store.get('a')))
+
+    def testTagsAreSeparate(self):
+        self.store.record('a', 1, 0.0, 'queue=x')
+        self.store.record('a', 1, 0.0, 'queue=y')
+        self.assertEqual(2, len(self.store))
+
+    def testNonNumericIgnored(self):
+        self.store.record('a', 'abc', 0.0)
+        self.assertEqual(None, self.store.get('a'))
+
+    def testBoolean(self):
+        self.store.record('healthy', True, 0.0)
+        self.assertEqual(1.0, self.store.get('healthy').last())
+
+    def testSummaries(self):
+        self.store.record('a', 1, 0.0, 'queue=x')
+        self.store.record('a', 3, 2.0, 'queue=x')
+        self.store.record('b', 1, 0.0)
+
+        summaries = self.store.summaries('a')
+
+        self.assertEqual(1, len(summaries))
+        self.assertEqual('queue=x', summaries[0]['tags'])
+        self.assertEqual([[0.0, 1.0], [2.0, 3.0]], summaries[0]['samples'])
+        self.assertEqual(1.0, summaries[0]['rate'])
+        self.assertEqual(2, len(self.store.summaries()))
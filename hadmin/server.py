@@ -0,0 +1,412 @@
+"""
+Command server
+--------------
+
+Run ``hadmin`` commands in one long-lived process, ``hadmin serve``, so that
+a command does not pay for starting Python, importing modules and parsing
+the Hadoop configuration every time it runs.
+
+The server listens on a Unix domain socket (see
+:py:func:`hadmin.system.server_socket`) that only its owner can connect to.
+A client sends a JSON object holding the command line, its working directory
+and its environment on one line, and gets back a JSON object holding the
+exit status and everything the command printed.
+
+Each connection is served by a thread of its own, so a slow command or a
+client that never sends its request does not hold up the others. Commands
+that change the queues run one at a time and while nothing else runs, so
+their changes never interleave and no other command sees the shared
+CapacityScheduler half changed. A command sees its client's working
+directory and environment through :py:func:`hadmin.system.in_request`, and
+what it prints is captured per thread, so the process's own are never
+changed. The parsed configuration and the CapacityScheduler are kept
+between commands (see :py:func:`hadmin.system.enable_cache`), and are parsed
+again when the files change on disk.
+"""
+
+import hadmin.system
+import importlib
+import json
+import os
+import socket
+import sys
+import threading
+import traceback
+from contextlib import contextmanager
+from io import StringIO
+
+
+# Most connections that may wait to be served
+BACKLOG = 64
+
+# Seconds a client may take to connect before the command runs locally
+CONNECT_TIMEOUT = 5
+
+# Seconds a client may take to send its request or read the response
+REQUEST_TIMEOUT = 30
+
+# Modules commands need, imported when the server starts
+WARM_MODULES = ['hadmin.conf', 'hadmin.diff', 'hadmin.hdfs', 'hadmin.jmx',
+                'hadmin.rest', 'hadmin.yarn']
+
+
+def encode(message):
+    return (json.dumps(message) + '\n').encode('utf-8')
+
+
+def read_message(f):
+    """
+    Read one message from the file object f, or get None if the other end
+    closed the connection first
+    """
+
+    line = f.readline()
+    if not line:
+        return None
+
+    return json.loads(line.decode('utf-8'))
+
+
+def connect(path, timeout=CONNECT_TIMEOUT):
+    """
+    Connect to the server listening at path. Returns the socket, or None if
+    nothing is listening there or it did not accept within timeout seconds.
+    """
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+
+    try:
+        sock.connect(path)
+    except (IOError, OSError):
+        sock.close()
+        return None
+
+    return sock
+
+
+def forward(argv, path=None):
+    """
+    Run argv (a command and its arguments) on the server listening at path,
+    printing its output. Returns the command's exit status, or None if no
+    server is listening or it is too busy to accept the connection.
+    """
+
+    sock = connect(path or hadmin.system.server_socket())
+    if sock is None:
+        return None
+
+    # The command may take as long as it needs
+    sock.settimeout(None)
+
+    try:
+        sock.sendall(encode({
+            'argv': list(argv),
+            'cwd': os.getcwd(),
+            'env': dict(os.environ)
+            }))
+
+        res = read_message(sock.makefile('rb'))
+    finally:
+        sock.close()
+
+    if res is None:
+        sys.stderr.write('The hadmin server went away while running ' +
+                         argv[0] + '\n')
+        return 1
+
+    sys.stdout.write(res['output'])
+    sys.stderr.write(res['errors'])
+    sys.stdout.flush()
+
+    return res['status']
+
+
+class ThreadOutput:
+    """
+    Stands in for sys.stdout or sys.stderr, writing to the stream the
+    current thread is capturing to, if any, or else to stream
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    @property
+    def target(self):
+        return getattr(self.local, 'stream', None) or self.stream
+
+    def write(self, s):
+        return self.target.write(s)
+
+    def flush(self):
+        self.target.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+
+_capture_lock = threading.Lock()
+_capturing = 0
+
+
+@contextmanager
+def capture(output, errors):
+    """
+    Send what this thread prints to output and errors, file objects, while
+    other threads keep printing wherever they did
+    """
+
+    global _capturing
+
+    with _capture_lock:
+        if _capturing == 0 or not isinstance(sys.stdout, ThreadOutput):
+            sys.stdout = ThreadOutput(sys.stdout)
+            sys.stderr = ThreadOutput(sys.stderr)
+        _capturing += 1
+
+        stdout, stderr = sys.stdout, sys.stderr
+
+    stdout.local.stream = output
+    stderr.local.stream = errors
+
+    try:
+        yield
+    finally:
+        stdout.local.stream = None
+        stderr.local.stream = None
+
+        with _capture_lock:
+            _capturing -= 1
+            if _capturing == 0 and sys.stdout is stdout:
+                sys.stdout = stdout.stream
+                sys.stderr = stderr.stream
+
+
+class ReadWriteLock:
+    """
+    A lock that any number of readers, or else one writer, may hold. A
+    waiting writer goes before readers that come after it.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting = 0
+
+    @contextmanager
+    def reading(self):
+        with self._cond:
+            while self._writing or self._waiting:
+                self._cond.wait()
+            self._readers += 1
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self._cond:
+            self._waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._waiting -= 1
+            self._writing = True
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+class Server:
+    """
+    Runs the commands in commands, a dict of name to function like
+    :py:data:`hadmin.main.cmds`, for clients connecting to the Unix domain
+    socket at path. The commands named in exclusive, those that change the
+    queues, never run at the same time as any other command.
+    """
+
+    def __init__(self, commands, path=None, exclusive=frozenset()):
+        self.commands = commands
+        self.path = path or hadmin.system.server_socket()
+        self.exclusive = exclusive
+        self.served = 0
+        self._lock = ReadWriteLock()
+        self._served_lock = threading.Lock()
+        self._threads = []
+        self._sock = None
+        self._stopping = False
+
+    def call(self, argv):
+        """
+        Run argv in this process and get its exit status
+        """
+
+        if not argv or argv[0] not in self.commands:
+            print('Unknown command ' + ' '.join(argv[:1]))
+            return 1
+
+        try:
+            status = self.commands[argv[0]](argv[1:])
+        except SystemExit as e:
+            status = e.code
+        except Exception:
+            traceback.print_exc()
+            status = 1
+
+        if status is None:
+            return 0
+
+        if not isinstance(status, int):
+            print(status, file=sys.stderr)
+            return 1
+
+        return status
+
+    def handle(self, request):
+        """
+        Run the command in request from the client's working directory and
+        with its environment. Returns the response to send back.
+        """
+
+        argv = request.get('argv') or []
+        cwd = request.get('cwd') or os.getcwd()
+        output = StringIO()
+        errors = StringIO()
+
+        if not os.path.isdir(cwd):
+            errors.write('No such directory: ' + cwd + '\n')
+            status = 1
+        else:
+            with capture(output, errors), \
+                    hadmin.system.in_request(cwd, request.get('env')):
+                if argv[:1] and argv[0] in self.exclusive:
+                    lock = self._lock.writing()
+                else:
+                    lock = self._lock.reading()
+
+                with lock:
+                    status = self.call(argv)
+
+        with self._served_lock:
+            self.served += 1
+
+        return {
+            'status': status,
+            'output': output.getvalue(),
+            'errors': errors.getvalue()
+            }
+
+    def warm(self):
+        """
+        Load what commands need ahead of the first one
+        """
+
+        for name in WARM_MODULES:
+            importlib.import_module(name)
+
+        try:
+            hadmin.system.get_cap()
+            hadmin.system.get_rm()
+        except Exception:
+            # No Hadoop configuration here; commands will say so themselves
+            pass
+
+    def listen(self):
+        """
+        Create the socket. A socket left behind by a server that is gone is
+        replaced; raises IOError if another server is listening.
+        """
+
+        if os.path.exists(self.path):
+            sock = connect(self.path)
+            if sock is not None:
+                sock.close()
+                raise IOError('An hadmin server is already listening on ' +
+                              self.path)
+
+            os.unlink(self.path)
+
+        d = os.path.dirname(self.path)
+        if d and not os.path.isdir(d):
+            os.makedirs(d)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        # Only the owner may connect, since commands run as the server's user
+        umask = os.umask(0o177)
+        try:
+            sock.bind(self.path)
+        finally:
+            os.umask(umask)
+
+        sock.listen(BACKLOG)
+        self._sock = sock
+
+        hadmin.system.enable_cache()
+
+    def serve_connection(self, conn):
+        conn.settimeout(REQUEST_TIMEOUT)
+
+        try:
+            request = read_message(conn.makefile('rb'))
+            if request is not None:
+                conn.sendall(encode(self.handle(request)))
+        except (IOError, OSError, ValueError):
+            # The client went away or sent garbage
+            pass
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        """
+        Serve each client from a thread of its own until :py:meth:`shutdown`
+        is called, then wait for the commands still running
+        """
+
+        try:
+            while not self._stopping:
+                conn, _ = self._sock.accept()
+
+                t = threading.Thread(target=self.serve_connection,
+                                     args=(conn,))
+                t.start()
+
+                self._threads = [u for u in self._threads if u.is_alive()]
+                self._threads.append(t)
+        finally:
+            self.close()
+
+            for t in self._threads:
+                t.join()
+
+    def shutdown(self):
+        """
+        Stop :py:meth:`serve_forever` from accepting clients
+        """
+
+        self._stopping = True
+
+        # Wake up accept()
+        sock = connect(self.path)
+        if sock is not None:
+            sock.close()
+
+    def close(self):
+        if self._sock is None:
+            return
+
+        self._sock.close()
+        self._sock = None
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
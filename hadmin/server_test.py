@@ -0,0 +1,267 @@
+from contextlib import redirect_stdout
+from hadmin.server import Server, forward
+from io import StringIO
+from unittest2 import TestCase
+import hadmin.server
+import hadmin.system
+import os
+import shutil
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import time
+
+
+def echo(args):
+    print(' '.join(args))
+    return 0
+
+
+def fail(args):
+    sys.exit(3)
+
+
+def crash(args):
+    raise ValueError('boom')
+
+
+def where(args):
+    print(hadmin.system.abspath(args[0]))
+    print(hadmin.system.getenv('HADMIN_TEST_VALUE'))
+
+
+class ServerTest(TestCase):
+
+    def setUp(self):
+        self.active = 0
+        self.most_active = 0
+        self.barrier = threading.Barrier(2, timeout=5)
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        self.server = Server({
+            'crash': crash,
+            'echo': echo,
+            'fail': fail,
+            'meet': self.meet,
+            'slow': self.slow,
+            'where': where,
+            'write': self.write
+            }, 'unused', frozenset(['slow', 'write']))
+
+    def tearDown(self):
+        hadmin.system.disable_cache()
+
+    def slow(self, args):
+        self.active += 1
+        self.most_active = max(self.active, self.most_active)
+        time.sleep(0.05)
+        self.active -= 1
+        return 0
+
+    def write(self, args):
+        self.writing.set()
+        self.release.wait(5)
+        return 0
+
+    def meet(self, args):
+        # Only returns if another command runs at the same time
+        print(args[0])
+        self.barrier.wait()
+        print(args[0])
+        return 0
+
+    def handle_all(self, requests):
+        responses = [None] * len(requests)
+
+        def handle(i):
+            responses[i] = self.server.handle(requests[i])
+
+        threads = [threading.Thread(target=handle, args=(i,))
+                   for i in range(len(requests))]
+
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        return responses
+
+    def testOutput(self):
+        res = self.server.handle({'argv': ['echo', 'a', 'b']})
+
+        self.assertEqual(0, res['status'])
+        self.assertEqual('a b\n', res['output'])
+        self.assertEqual(1, self.server.served)
+
+    def testExit(self):
+        self.assertEqual(3, self.server.handle({'argv': ['fail']})['status'])
+
+    def testException(self):
+        res = self.server.handle({'argv': ['crash']})
+
+        self.assertEqual(1, res['status'])
+        self.assertIn('ValueError: boom', res['errors'])
+
+    def testUnknown(self):
+        self.assertEqual(1, self.server.handle({'argv': ['nope']})['status'])
+        self.assertEqual(1, self.server.handle({'argv': []})['status'])
+
+    def testCwdAndEnv(self):
+        tmpdir = os.path.realpath(tempfile.mkdtemp())
+        cwd = os.getcwd()
+
+        try:
+            res = self.server.handle({
+                'argv': ['where', 'conf'],
+                'cwd': tmpdir,
+                'env': {'HADMIN_TEST_VALUE': 'hello'}
+                })
+        finally:
+            shutil.rmtree(tmpdir)
+
+        self.assertEqual(os.path.join(tmpdir, 'conf') + '\nhello\n',
+                         res['output'])
+        self.assertEqual(cwd, os.getcwd())
+        self.assertNotIn('HADMIN_TEST_VALUE', os.environ)
+
+    def testMissingCwd(self):
+        res = self.server.handle({'argv': ['echo'], 'cwd': '/nonexistent'})
+        self.assertEqual(1, res['status'])
+
+    def testSerialized(self):
+        self.handle_all([{'argv': ['slow']}] * 4)
+
+        self.assertEqual(1, self.most_active)
+        self.assertEqual(4, self.server.served)
+
+    def testConcurrent(self):
+        a, b = self.handle_all([{'argv': ['meet', 'a']},
+                                {'argv': ['meet', 'b']}])
+
+        self.assertEqual((0, 'a\na\n'), (a['status'], a['output']))
+        self.assertEqual((0, 'b\nb\n'), (b['status'], b['output']))
+        self.assertEqual(2, self.server.served)
+
+    def testReadersWaitForWriters(self):
+        writer = threading.Thread(
+                target=lambda: self.server.handle({'argv': ['write']}))
+        writer.start()
+        self.assertTrue(self.writing.wait(5))
+
+        read = threading.Event()
+        reader = threading.Thread(target=lambda: self.server.handle(
+                {'argv': ['echo']}) and read.set())
+        reader.start()
+
+        self.assertFalse(read.wait(0.1))
+
+        self.release.set()
+        writer.join()
+        reader.join()
+        self.assertTrue(read.is_set())
+
+    def testOutputRestored(self):
+        stdout = sys.stdout
+        self.server.handle({'argv': ['echo', 'a']})
+        self.assertIs(stdout, sys.stdout)
+
+
+class SocketTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'server.sock')
+        self.server = Server({'echo': echo, 'fail': fail}, self.path)
+        self.server.listen()
+
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        hadmin.system.disable_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def forward(self, argv):
+        out = StringIO()
+        with redirect_stdout(out):
+            status = forward(argv, self.path)
+
+        return status, out.getvalue()
+
+    def testForward(self):
+        self.assertEqual((0, 'hi there\n'), self.forward(['echo', 'hi',
+                                                          'there']))
+        self.assertEqual((3, ''), self.forward(['fail']))
+
+    def testSilentClient(self):
+        hadmin.server.REQUEST_TIMEOUT = 0.1
+        self.addCleanup(setattr, hadmin.server, 'REQUEST_TIMEOUT', 30)
+
+        silent = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        silent.connect(self.path)
+        self.addCleanup(silent.close)
+
+        self.assertEqual((0, 'hi\n'), self.forward(['echo', 'hi']))
+
+        # The server gives up on the client that never sent a request
+        silent.settimeout(5)
+        self.assertEqual(b'', silent.recv(1))
+
+    def testOwnerOnly(self):
+        mode = stat.S_IMODE(os.stat(self.path).st_mode)
+        self.assertEqual(0o600, mode)
+
+    def testAlreadyListening(self):
+        with self.assertRaises(IOError):
+            Server({}, self.path).listen()
+
+    def testShutdownRemovesSocket(self):
+        self.server.shutdown()
+        self.thread.join()
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(forward(['echo'], self.path))
+
+    def testStaleSocket(self):
+        self.server.shutdown()
+        self.thread.join()
+
+        # A socket file nobody listens on, as left by a killed server
+        stale = Server({'echo': echo}, self.path)
+        stale.listen()
+        stale._sock.close()
+
+        self.assertIsNone(forward(['echo'], self.path))
+
+        self.server = Server({'echo': echo}, self.path)
+        self.server.listen()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+        self.assertEqual((0, 'back\n'), self.forward(['echo', 'back']))
+
+    def testBusy(self):
+        self.server.shutdown()
+        self.thread.join()
+
+        # A server that never accepts, with its backlog full
+        busy = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        busy.bind(self.path)
+        busy.listen(0)
+        waiting = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        waiting.connect(self.path)
+
+        try:
+            self.assertIsNone(forward(['echo'], self.path))
+        finally:
+            waiting.close()
+            busy.close()
+
+        self.server = Server({'echo': echo}, self.path)
+        self.server.listen()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
@@ -0,0 +1,248 @@
+"""
+Interactive shell
+-----------------
+
+``hadmin shell`` loads the system's CapacityScheduler once and runs any
+number of ``hadmin`` commands against it, such as ``useradd``, ``queuecap``
+and ``sc``. Changes are kept in memory until ``commit`` saves them, after
+showing the differences from the configuration on disk; ``reset`` throws
+them away.
+
+Queue names are tab-completed from a sorted index of the scheduler's queues.
+"""
+
+import bisect
+import cmd
+import hadmin.system
+import shlex
+import traceback
+from argparse import ArgumentParser
+
+
+# Commands that make no sense inside the shell. genqueues builds a new
+# scheduler from YAML and saves it at once, so it cannot be staged.
+EXCLUDED_CMDS = frozenset(['genqueues', 'serve', 'shell'])
+
+
+class QueueIndex:
+    """
+    The fully qualified names of a scheduler's queues, sorted so that the
+    names starting with a prefix can be found with a binary search. The
+    index is rebuilt when the scheduler's queues change.
+    """
+
+    def __init__(self, sched):
+        self.sched = sched
+        self._hash = None
+        self._names = []
+
+    def names(self):
+        h = self.sched.content_hash
+        if h != self._hash:
+            self._names = self.sched.queue_list('root')
+            self._hash = h
+
+        return self._names
+
+    def complete(self, prefix):
+        """
+        Get the queue names that start with prefix
+        """
+
+        names = self.names()
+        start = bisect.bisect_left(names, prefix)
+        end = start
+
+        while end < len(names) and names[end].startswith(prefix):
+            end += 1
+
+        return names[start:end]
+
+
+class Shell(cmd.Cmd):
+    """
+    Runs the commands in commands, a dict of name to function like
+    :py:data:`hadmin.main.cmds`, against a CapacityScheduler held in memory
+    (see :py:func:`hadmin.system.hold_cap`)
+    """
+
+    intro = ('HAdmin shell. Changes are saved by commit, and thrown away by '
+             'reset.\nType help for a list of commands.')
+
+    def __init__(self, commands, stdin=None):
+        cmd.Cmd.__init__(self, stdin=stdin)
+        self.commands = dict((k, v) for k, v in commands.items()
+                             if k not in EXCLUDED_CMDS)
+        self.sched = None
+        self.index = None
+        self.loaded_key = None
+
+    @property
+    def prompt(self):
+        if self.sched is not None and self.sched.changed:
+            return 'hadmin*> '
+
+        return 'hadmin> '
+
+    def load(self):
+        """
+        Load the system's CapacityScheduler and hold it
+        """
+
+        self.loaded_key = hadmin.system.file_key(hadmin.system.cap_path())
+        self.sched = hadmin.system.load_cap()
+        self.index = QueueIndex(self.sched)
+        hadmin.system.hold_cap(self.sched)
+
+    def preloop(self):
+        if self.sched is None:
+            self.load()
+        else:
+            hadmin.system.hold_cap(self.sched)
+
+    def postloop(self):
+        hadmin.system.hold_cap(None)
+
+    def emptyline(self):
+        pass
+
+    def run(self, name, argv):
+        """
+        Run one of commands. A dry run works on a copy of the scheduler, so
+        that it shows what committing would change without changing
+        anything itself.
+        """
+
+        from hadmin.yarn import CapacityScheduler
+
+        if '--dry-run' in argv:
+            copy = CapacityScheduler(self.sched.to_hxml())
+            copy.saved_hash = self.sched.saved_hash
+            hadmin.system.hold_cap(copy)
+
+        try:
+            return self.commands[name](argv)
+        except SystemExit as e:
+            # argparse printed help or an error
+            return e.code
+        except Exception:
+            traceback.print_exc()
+            return 1
+        finally:
+            hadmin.system.hold_cap(self.sched)
+
+    def default(self, line):
+        try:
+            argv = shlex.split(line)
+        except ValueError as e:
+            print('*** ' + str(e))
+            return False
+
+        if argv[0] not in self.commands:
+            print('*** Unknown command: ' + argv[0])
+            return False
+
+        self.run(argv[0], argv[1:])
+        return False
+
+    def completenames(self, text, *ignored):
+        names = set(cmd.Cmd.completenames(self, text, *ignored))
+        names.update(k for k in self.commands if k.startswith(text))
+
+        return sorted(names)
+
+    def completedefault(self, text, line, begidx, endidx):
+        # readline splits words on characters such as '-', so complete the
+        # whole word and hand back only the part after text
+        word = line[:endidx].split(' ')[-1]
+        skip = len(word) - len(text)
+
+        return [name[skip:] for name in self.index.complete(word)]
+
+    def pending(self):
+        import hadmin.diff
+
+        return hadmin.diff.diff(hadmin.system.load_cap().root_queue,
+                                self.sched.root_queue)
+
+    def do_pending(self, line):
+        """Show the changes that commit would save"""
+
+        changes = self.pending()
+
+        for change in changes:
+            print(str(change))
+
+        if not changes:
+            print('Nothing to commit')
+
+    def do_commit(self, line):
+        """Save the changes, after showing them. Usage: commit [--force]
+        [--reload]"""
+
+        import hadmin.main
+
+        parser = ArgumentParser(prog='commit', description='Save the queues')
+        hadmin.main.add_save_args(parser)
+
+        try:
+            args = parser.parse_args(shlex.split(line))
+        except SystemExit:
+            return False
+
+        key = hadmin.system.file_key(hadmin.system.cap_path())
+        if key != self.loaded_key and not args.force:
+            print('capacity-scheduler.xml changed on disk since it was '
+                  'loaded. Use reset to load it again, or commit --force '
+                  'to overwrite it')
+            return False
+
+        if self.sched.changed and not args.dry_run:
+            for change in self.pending():
+                print(str(change))
+
+        before = hadmin.system.load_cap().problems()
+
+        hadmin.system.hold_cap(None)
+        try:
+            ret = hadmin.main.save_queues(self.sched, args, before)
+        finally:
+            hadmin.system.hold_cap(self.sched)
+
+        if ret == 0 and not args.dry_run:
+            self.loaded_key = hadmin.system.file_key(
+                    hadmin.system.cap_path())
+
+        return False
+
+    def do_reset(self, line):
+        """Throw away the changes and load the queues from disk again"""
+
+        self.load()
+
+    def do_exit(self, line):
+        """Leave the shell. Changes that were not committed are lost"""
+
+        if self.sched.changed:
+            print('Leaving without saving the changes')
+
+        return True
+
+    do_quit = do_exit
+
+    def do_EOF(self, line):
+        print('')
+        return self.do_exit(line)
+
+    def do_help(self, line):
+        if line in self.commands:
+            self.run(line, ['-h'])
+            return
+
+        cmd.Cmd.do_help(self, line)
+
+        if not line:
+            print('hadmin commands')
+            print('===============')
+            self.columnize(sorted(self.commands), 80)
+            print('')
@@ -0,0 +1,139 @@
+from contextlib import redirect_stderr, redirect_stdout
+from hadmin.main import cmds
+from hadmin.shell import QueueIndex, Shell
+from hadmin.yarn import CapacityScheduler
+from io import StringIO
+from unittest2 import TestCase
+import hadmin.system
+import os
+import shutil
+import tempfile
+
+
+class QueueIndexTest(TestCase):
+
+    def setUp(self):
+        self.sched = CapacityScheduler.from_file('data/capacity-scheduler.xml')
+        self.index = QueueIndex(self.sched)
+
+    def testComplete(self):
+        self.assertEqual(['root', 'root.a', 'root.b'],
+                         self.index.complete('ro'))
+        self.assertEqual(['root.b'], self.index.complete('root.b'))
+        self.assertEqual([], self.index.complete('x'))
+
+    def testRebuilt(self):
+        self.index.complete('root')
+        root = self.sched.queue('root')
+        root.subqueues = [root.subqueue('a')]
+
+        self.assertEqual(['root', 'root.a'], self.index.complete('root'))
+
+
+class ShellTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dirs = hadmin.system.HADOOP_CONF_DIRS
+        hadmin.system.HADOOP_CONF_DIRS = [self.tmpdir]
+
+        open(os.path.join(self.tmpdir, 'core-site.xml'), 'w').close()
+        shutil.copy('data/capacity-scheduler.xml',
+                    hadmin.system.cap_path())
+
+        self.shell = Shell(cmds)
+        self.shell.preloop()
+
+    def tearDown(self):
+        self.shell.postloop()
+        hadmin.system.HADOOP_CONF_DIRS = self.dirs
+        shutil.rmtree(self.tmpdir)
+
+    def run_line(self, line):
+        out = StringIO()
+        with redirect_stdout(out):
+            self.shell.onecmd(line)
+
+        return out.getvalue()
+
+    def on_disk(self):
+        return CapacityScheduler.from_file(hadmin.system.cap_path())
+
+    def testStaged(self):
+        self.run_line('useradd bob root.a')
+
+        self.assertIn('bob', self.shell.sched.queue('root.a').users)
+        self.assertNotIn('bob', self.on_disk().queue('root.a').users)
+        self.assertEqual('hadmin*> ', self.shell.prompt)
+
+        self.assertIn('root.a', self.run_line('queuestat root.a'))
+        self.assertIn('bob', self.run_line('pending'))
+
+    def testCommit(self):
+        self.run_line('useradd bob root.a')
+        out = self.run_line('commit')
+
+        self.assertIn('bob', out)
+        self.assertIn('bob', self.on_disk().queue('root.a').users)
+        self.assertEqual('hadmin> ', self.shell.prompt)
+        self.assertIn('Nothing to commit', self.run_line('pending'))
+
+    def testReset(self):
+        self.run_line('queueoff root.b')
+        self.run_line('reset')
+
+        self.assertTrue(self.shell.sched.queue('root.b').running)
+        self.assertIs(self.shell.sched, hadmin.system.get_cap())
+
+    def testDryRun(self):
+        out = self.run_line('queueulim root.a 3 --dry-run')
+
+        self.assertIn('Dry run', out)
+        self.assertIn('root.a user-limit-factor', out)
+        self.assertNotIn('+ ', out)
+        self.assertFalse(self.shell.sched.changed)
+        self.assertIs(self.shell.sched, hadmin.system.get_cap())
+
+    def testSanityCheck(self):
+        self.run_line('queuecap root.a 60')
+
+        self.assertIn('ERROR', self.run_line('sc'))
+        self.assertIn('Not saving', self.run_line('commit'))
+        self.assertEqual(50.0, self.on_disk().queue('root.a').cap_min)
+
+        self.run_line('commit --force')
+        self.assertEqual(60.0, self.on_disk().queue('root.a').cap_min)
+
+    def testChangedOnDisk(self):
+        self.run_line('useradd bob root.a')
+
+        with open(hadmin.system.cap_path(), 'a') as f:
+            f.write('\n')
+
+        self.assertIn('changed on disk', self.run_line('commit'))
+        self.assertNotIn('bob', self.on_disk().queue('root.a').users)
+
+    def testErrors(self):
+        self.assertIn('Unknown command', self.run_line('nope'))
+        self.assertIn('Unknown command', self.run_line('serve'))
+
+        before = os.stat(hadmin.system.cap_path())
+        self.assertIn('Unknown command',
+                      self.run_line('genqueues data/queues'))
+        self.assertEqual(before, os.stat(hadmin.system.cap_path()))
+
+        err = StringIO()
+        with redirect_stderr(err):
+            self.run_line('queueon root.nope')
+
+        self.assertIn('Traceback', err.getvalue())
+        self.assertFalse(self.shell.sched.changed)
+
+    def testCompletion(self):
+        self.assertEqual(['root', 'root.a', 'root.b'],
+                         self.shell.completedefault('root', 'queueon root', 8,
+                                                    12))
+        self.assertEqual(['a'],
+                         self.shell.completedefault('a', 'sc root.a', 8, 9))
+        self.assertIn('queuecap', self.shell.completenames('queue'))
+        self.assertIn('commit', self.shell.completenames('co'))
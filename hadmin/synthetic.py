@@ -0,0 +1,325 @@
+"""
+Synthetic clusters
+------------------
+
+Generate configuration and daemon responses for made-up clusters of any size,
+for benchmarks and load tests. Everything generated is deterministic, so
+results taken at different commits are comparable.
+
+Queues form a tree in which every queue has up to ``fanout`` subqueues,
+filled breadth first. Queue ``i`` is named ``q<i>``, so ``root.q1.q11`` is
+the first subqueue of ``root.q1`` with the default fanout of 10. The count of
+queues includes root.
+"""
+
+from hadmin.yarn import Queue
+import os
+
+
+DEFAULT_FANOUT = 10
+
+# Properties every filler JMX bean gets, to make beans about as big as real
+# ones
+FILLER_METRICS = ['NumOps', 'AvgTime', 'MinTime', 'MaxTime', 'StdevTime']
+
+
+def queue_names(count, fanout=DEFAULT_FANOUT):
+    """
+    Get the fully qualified names of count queues, breadth first
+    """
+
+    names = ['root']
+
+    for i in range(1, count):
+        names.append(names[(i - 1) // fanout] + '.q' + str(i))
+
+    return names
+
+
+def queue_children(count, fanout=DEFAULT_FANOUT):
+    """
+    Get a list holding, for each queue, the indexes of its subqueues
+    """
+
+    children = [[] for _ in range(count)]
+
+    for i in range(1, count):
+        children[(i - 1) // fanout].append(i)
+
+    return children
+
+
+def capacities(n):
+    """
+    Get n capacities that add up to exactly 100
+    """
+
+    if n == 0:
+        return []
+
+    each = round(100.0 / n, 2)
+    return [each] * (n - 1) + [round(100.0 - each * (n - 1), 2)]
+
+
+def queue_users(i):
+    return ['user' + str(i), 'user' + str(i + 1)]
+
+
+def queue_admins(i):
+    return ['admin' + str(i % 7)]
+
+
+def capacity_scheduler_xml(count, fanout=DEFAULT_FANOUT):
+    """
+    Get a capacity-scheduler.xml holding count queues, as a string
+    """
+
+    names = queue_names(count, fanout)
+    children = queue_children(count, fanout)
+    caps = [100.0] * count
+
+    for subs in children:
+        for i, cap in zip(subs, capacities(len(subs))):
+            caps[i] = cap
+
+    out = ['<?xml version="1.0"?>\n<configuration>\n']
+
+    def prop(name, value):
+        out.append('  <property>\n    <name>' + name + '</name>\n'
+                   '    <value>' + value + '</value>\n  </property>\n')
+
+    for i, fqn in enumerate(names):
+        prop(Queue.fqn_admins(fqn), ','.join(queue_admins(i)))
+        prop(Queue.fqn_users(fqn), ','.join(queue_users(i)))
+        prop(Queue.fqn_cap(fqn), str(caps[i]))
+        prop(Queue.fqn_maxcap(fqn), '100.0')
+        prop(Queue.fqn_state(fqn), 'STOPPED' if i % 13 == 12 else 'RUNNING')
+        prop(Queue.fqn_ulim(fqn), '2.0')
+
+        if children[i]:
+            prop(Queue.fqn_subs(fqn),
+                 ','.join('q' + str(c) for c in children[i]))
+
+    out.append('</configuration>\n')
+
+    return ''.join(out)
+
+
+def queue_doc(i):
+    """
+    Get the HAdmin YAML document for queue i, as the dict it parses into
+    """
+
+    return {
+        'admins': queue_admins(i),
+        'users': queue_users(i),
+        'running': i % 13 != 12,
+        'capacity': {
+            'max': 100.0,
+            'weight': 1 + i % 3
+            },
+        'user_limit': 50
+        }
+
+
+def yaml_doc(doc):
+    """
+    Write one of the documents made by :py:func:`queue_doc` as YAML
+    """
+
+    return ''.join([
+        '---\n',
+        'admins:\n',
+        ''.join('  - ' + a + '\n' for a in doc['admins']),
+        'users:\n',
+        ''.join('  - ' + u + '\n' for u in doc['users']),
+        'running: ' + str(doc['running']).lower() + '\n',
+        'capacity:\n',
+        '  max: ' + str(doc['capacity']['max']) + '\n',
+        '  weight: ' + str(doc['capacity']['weight']) + '\n',
+        'user_limit: ' + str(doc['user_limit']) + '\n'
+        ])
+
+
+def queue_specs(count, fanout=DEFAULT_FANOUT):
+    """
+    Get the inputs :py:class:`hadmin.conf.QueueGenerator` takes for count
+    queues, as if they had been read from :py:func:`write_yaml_dir`'s files
+    """
+
+    from hadmin.conf import QueueGenerator
+
+    specs = []
+    for i, fqn in enumerate(queue_names(count, fanout)):
+        if i:
+            specs += QueueGenerator.specs_from_documents(fqn[len('root.'):],
+                                                         [queue_doc(i)])
+
+    return specs
+
+
+def write_yaml_dir(directory, count, fanout=DEFAULT_FANOUT):
+    """
+    Write an HAdmin YAML file for each of count queues (other than root) to
+    directory, which must exist
+    """
+
+    for i, fqn in enumerate(queue_names(count, fanout)):
+        if i:
+            fname = os.path.join(directory, fqn[len('root.'):] + '.yml')
+            with open(fname, 'w') as f:
+                f.write(yaml_doc(queue_doc(i)))
+
+
+def scheduler_json(count, fanout=DEFAULT_FANOUT, load=0.5):
+    """
+    Get the ResourceManager's ``/ws/v1/cluster/scheduler`` response for
+    count queues as a dict. load is the share of the cluster in use.
+    """
+
+    children = queue_children(count, fanout)
+
+    def queue(i, cap, abs_cap):
+        used = round(load * 100.0 * (1 + i % 5) / 3, 2)
+        q = {
+            'absoluteCapacity': abs_cap,
+            'absoluteMaxCapacity': 100.0,
+            'absoluteUsedCapacity': round(abs_cap * used / 100.0, 4),
+            'capacity': cap,
+            'maxCapacity': 100.0,
+            'numApplications': i % 11,
+            'queueName': 'q' + str(i),
+            'resourcesUsed': {'memory': 1024 * (i % 64), 'vCores': i % 64},
+            'state': 'RUNNING',
+            'usedCapacity': used
+            }
+
+        if children[i]:
+            q['queues'] = {'queue': [
+                queue(c, sub_cap, round(abs_cap * sub_cap / 100.0, 4))
+                for c, sub_cap in zip(children[i],
+                                      capacities(len(children[i])))]}
+        else:
+            q['type'] = 'capacitySchedulerLeafQueueInfo'
+            q['numContainers'] = i % 64
+            q['userLimitFactor'] = 2.0
+
+        return q
+
+    root = queue(0, 100.0, 100.0)
+
+    return {'scheduler': {'schedulerInfo': {
+        'type': 'capacityScheduler',
+        'capacity': 100.0,
+        'maxCapacity': 100.0,
+        'queueName': 'root',
+        'usedCapacity': round(load * 100.0, 2),
+        'queues': root.get('queues', {'queue': []})
+        }}}
+
+
+def cluster_metrics_json(nodes, load=0.5):
+    """
+    Get the ResourceManager's ``/ws/v1/cluster/metrics`` response for a
+    cluster of nodes NodeManagers as a dict
+    """
+
+    total_mb = nodes * 65536
+    total_vcores = nodes * 32
+    unhealthy = nodes // 50
+
+    return {'clusterMetrics': {
+        'activeNodes': nodes - unhealthy,
+        'allocatedMB': int(total_mb * load),
+        'allocatedVirtualCores': int(total_vcores * load),
+        'appsCompleted': nodes * 40,
+        'appsFailed': nodes // 10,
+        'appsKilled': nodes // 20,
+        'appsPending': nodes // 4,
+        'appsRunning': nodes // 2,
+        'appsSubmitted': nodes * 41,
+        'availableMB': total_mb - int(total_mb * load),
+        'availableVirtualCores': total_vcores - int(total_vcores * load),
+        'containersAllocated': nodes * 8,
+        'containersPending': nodes,
+        'containersReserved': 0,
+        'decommissionedNodes': 0,
+        'lostNodes': 0,
+        'rebootedNodes': 0,
+        'reservedMB': 0,
+        'reservedVirtualCores': 0,
+        'totalMB': total_mb,
+        'totalNodes': nodes,
+        'totalVirtualCores': total_vcores,
+        'unhealthyNodes': unhealthy
+        }}
+
+
+def nodemanager_json(i, healthy=True):
+    """
+    Get NodeManager i's ``/ws/v1/node`` response as a dict
+    """
+
+    host = 'nm' + str(i) + '.example.com'
+
+    return {'nodeInfo': {
+        'hadoopVersion': '2.7.3',
+        'healthReport': '' if healthy else '1/1 local-dirs are bad',
+        'id': host + ':8041',
+        'lastNodeUpdateTime': 1500000000000 + i,
+        'nodeHealthy': healthy,
+        'nodeHostName': host,
+        'nodeManagerVersion': '2.7.3',
+        'pmemCheckEnabled': True,
+        'totalPmemAllocatedContainersMB': 1024 * (i % 64),
+        'totalVCoresAllocatedContainers': i % 32,
+        'totalVmemAllocatedContainersMB': 2150 * (i % 64),
+        'vmemCheckEnabled': False
+        }}
+
+
+def filler_bean(service, i):
+    name = 'Hadoop:service=' + service + ',name=RpcDetailedActivityForPort' + \
+        str(10000 + i)
+    bean = {'name': name, 'modelerType': 'RpcDetailedActivity',
+            'tag.Context': 'rpcdetailed', 'tag.Hostname': 'localhost'}
+
+    for op in ('GetFileInfo', 'GetListing', 'Create', 'Complete'):
+        for metric in FILLER_METRICS:
+            bean[op + metric] = i
+
+    return bean
+
+
+def namenode_jmx_json(beans):
+    """
+    Get a NameNode's ``/jmx`` response with beans beans as a dict. The beans
+    :py:class:`hadmin.jmx.NameNodeJMX` reads come last, so that looking them
+    up by pattern has to go past all the others.
+    """
+
+    ret = [filler_bean('NameNode', i) for i in range(max(beans - 3, 0))]
+
+    ret.append({'name': 'java.lang:type=Memory',
+                'HeapMemoryUsage': {'committed': 122159104,
+                                    'init': 62914560, 'max': 932184064,
+                                    'used': 73726608}})
+    ret.append({'name': 'java.lang:type=Threading', 'ThreadCount': 34})
+    ret.append({'name': 'Hadoop:service=NameNode,name=FSNamesystem',
+                'CapacityTotalGB': 2048.0, 'CapacityUsedGB': 1024.0,
+                'CorruptBlocks': 3, 'PendingReplicationBlocks': 1,
+                'UnderReplicatedBlocks': 2})
+
+    return {'beans': ret}
+
+
+def datanode_jmx_json(beans, failed_volumes=0):
+    """
+    Get a DataNode's ``/jmx`` response with beans beans as a dict
+    """
+
+    ret = [filler_bean('DataNode', i) for i in range(max(beans - 1, 0))]
+    ret.append({'name': 'Hadoop:service=DataNode,name=FSDatasetState-null',
+                'NumFailedVolumes': failed_volumes})
+
+    return {'beans': ret}
@@ -0,0 +1,83 @@
+from hadmin.conf import QueueGenerator
+from hadmin.jmx import DataNodeJMX, NameNodeJMX
+from hadmin.rest import NodeManager, ResourceManager
+from hadmin.util import HXML
+from hadmin.yarn import CapacityScheduler
+from unittest2 import TestCase
+import hadmin.synthetic as synthetic
+import json
+import shutil
+import tempfile
+
+
+class QueuesTest(TestCase):
+
+    def testNames(self):
+        names = synthetic.queue_names(13, fanout=3)
+
+        self.assertEqual('root', names[0])
+        self.assertEqual('root.q1', names[1])
+        self.assertEqual('root.q1.q4', names[4])
+        self.assertEqual('root.q3.q12', names[12])
+
+    def testCapacities(self):
+        self.assertAlmostEqual(100.0, sum(synthetic.capacities(7)))
+        self.assertEqual([], synthetic.capacities(0))
+
+    def testCapacityScheduler(self):
+        sched = CapacityScheduler(HXML.from_str(
+                synthetic.capacity_scheduler_xml(123)))
+
+        self.assertEqual(123, len(sched.queue_list()))
+        self.assertEqual(set(), sched.problems())
+        self.assertFalse(sched.queue('root.q1.q12').running)
+
+    def testSpecs(self):
+        root = QueueGenerator(synthetic.queue_specs(123)).generate()
+        sched = CapacityScheduler(root.to_hxml())
+
+        self.assertEqual(123, len(sched.queue_list()))
+
+    def testYamlDir(self):
+        tmpdir = tempfile.mkdtemp()
+
+        try:
+            synthetic.write_yaml_dir(tmpdir, 42)
+            from_yaml = QueueGenerator.load_dir(tmpdir).generate()
+        finally:
+            shutil.rmtree(tmpdir)
+
+        from_specs = QueueGenerator(synthetic.queue_specs(42)).generate()
+        self.assertEqual(from_specs.content_hash, from_yaml.content_hash)
+
+
+class ResponsesTest(TestCase):
+
+    def testScheduler(self):
+        rm = ResourceManager.load_from_json(
+                json.dumps(synthetic.scheduler_json(123)))
+
+        self.assertEqual(122, len(rm.queues))
+        self.assertEqual('root.q1.q11', rm.queues[1].name)
+
+    def testMetrics(self):
+        rm = ResourceManager(synthetic.cluster_metrics_json(100))
+
+        self.assertEqual(100, rm.nodes_total)
+        self.assertEqual(2, rm.nodes_unhealthy)
+
+    def testNodeManager(self):
+        self.assertTrue(NodeManager(synthetic.nodemanager_json(3)).isHealthy())
+        self.assertFalse(NodeManager(
+                synthetic.nodemanager_json(3, healthy=False)).isHealthy())
+
+    def testNameNode(self):
+        jmx = NameNodeJMX(json.dumps(synthetic.namenode_jmx_json(500)))
+
+        self.assertEqual(500, len(jmx))
+        self.assertEqual(3, jmx.getCorruptBlocks())
+
+    def testDataNode(self):
+        jmx = DataNodeJMX(json.dumps(synthetic.datanode_jmx_json(50, 2)))
+
+        self.assertEqual(2, jmx.getFailedVolumes())
@@ -7,10 +7,10 @@ load configurations from ``/etc/hadoop/conf``.
 """
 
 
-import hadmin.rest
-from hadmin.util import HXML
-from hadmin.yarn import CapacityScheduler, ResourceManager
+import hadmin.cache
 import os
+import threading
+from contextlib import contextmanager
 
 
 HADOOP_CONF_DIRS = [
@@ -19,11 +19,123 @@ HADOOP_CONF_DIRS = [
         ]
 
 CAPACITY_SCHEDULER_FILENAME = 'capacity-scheduler.xml'
+REFRESHED_HASH_FILENAME = 'refreshed-queues'
 YARN_FILENAME = 'yarn-site.xml'
 
+SERVER_SOCKET_ENV = 'HADMIN_SOCKET'
+SERVER_SOCKET_FILENAME = 'server.sock'
+
+# Parsed configuration kept between commands by long-running processes. None
+# unless enable_cache() was called.
+_cache = None
+
+# The CapacityScheduler an interactive session is editing, if any. See
+# hold_cap().
+_held_cap = None
+
+# The working directory and environment of the request each thread of a
+# long-running process is serving. See in_request().
+_request = threading.local()
+
+
+@contextmanager
+def in_request(cwd=None, env=None):
+    """
+    Have :py:func:`getcwd`, :py:func:`environ` and everything built on them
+    use cwd and env, a client's working directory and environment, in this
+    thread instead of the process's own. Used by ``hadmin serve``, which
+    runs many clients' commands at once.
+    """
+
+    old = (getattr(_request, 'cwd', None), getattr(_request, 'env', None))
+    _request.cwd, _request.env = cwd, env
+
+    try:
+        yield
+    finally:
+        _request.cwd, _request.env = old
+
+
+def getcwd():
+    """
+    Returns the working directory of the command running in this thread
+    """
+
+    return getattr(_request, 'cwd', None) or os.getcwd()
+
+
+def environ():
+    """
+    Returns the environment of the command running in this thread
+    """
+
+    env = getattr(_request, 'env', None)
+    return os.environ if env is None else env
+
+
+def getenv(name, default=None):
+    return environ().get(name, default)
+
+
+def abspath(path):
+    """
+    Returns path made absolute against :py:func:`getcwd`
+    """
+
+    return os.path.normpath(os.path.join(getcwd(), path))
+
+
+def enable_cache():
+    """
+    Keep parsed configuration files, the CapacityScheduler and snapshot
+    caches in memory between calls, for long-running processes such as
+    ``hadmin serve``. A file is parsed again once its modification time or
+    size changes.
+    """
+
+    global _cache
+
+    if _cache is None:
+        _cache = dict()
+
+
+def disable_cache():
+    global _cache
+
+    _cache = None
+
+
+def file_key(path):
+    """
+    Get what identifies the current contents of path: its modification time
+    and size, or None if it does not exist
+    """
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    return (st.st_mtime_ns, st.st_size)
+
+
+def server_socket():
+    """
+    Returns the path of the ``hadmin serve`` socket: ``$HADMIN_SOCKET``, or
+    ``server.sock`` in the cache directory
+    """
+
+    path = getenv(SERVER_SOCKET_ENV)
+    if path:
+        return path
+
+    return os.path.join(hadmin.cache.cache_dir(), SERVER_SOCKET_FILENAME)
+
 
 def find_hxml_dir():
     for d in HADOOP_CONF_DIRS:
+        d = abspath(d)
+
         try:
             if 'core-site.xml' in os.listdir(d):
                 return d
@@ -40,28 +152,112 @@ def find_hxml(filename):
     directory
     """
 
-    d = find_hxml_dir()
+    from hadmin.util import HXML
+
+    path = abspath(os.path.join(find_hxml_dir(), filename))
+
+    if _cache is not None:
+        key = file_key(path)
+        entry = _cache.get(('hxml', path))
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+    hxml = None
     try:
-        with open(os.path.join(d, filename), 'r') as f:
-            return HXML.from_str(f.read())
+        with open(path, 'r') as f:
+            hxml = HXML.from_str(f.read())
     except IOError:
         pass
 
-    return None
+    if _cache is not None:
+        _cache[('hxml', path)] = (key, hxml)
+
+    return hxml
+
+
+def hold_cap(sched):
+    """
+    Have :py:func:`get_cap` return sched instead of loading the system's
+    configuration, and have commands leave saving it to the caller. Used by
+    ``hadmin shell``, which saves only when asked to. None stops holding.
+    """
+
+    global _held_cap
+
+    _held_cap = sched
+
+
+def held_cap():
+    """
+    Returns the CapacityScheduler given to :py:func:`hold_cap`, or None
+    """
+
+    return _held_cap
 
 
 def get_cap():
     """
-    Returns the system's :py:class:`hadmin.yarn.CapacityScheduler`
+    Returns the system's :py:class:`hadmin.yarn.CapacityScheduler`: the one
+    being held (see :py:func:`hold_cap`), or else the one on disk
+    """
+
+    if _held_cap is not None:
+        return _held_cap
+
+    return load_cap()
+
+
+def load_cap():
+    """
+    Returns the system's :py:class:`hadmin.yarn.CapacityScheduler` as saved
+    on disk
+    """
+
+    from hadmin.yarn import CapacityScheduler
+
+    if _cache is not None:
+        path = abspath(cap_path())
+        entry = _cache.get(('cap', path))
+
+        # A scheduler that was changed but not saved is thrown away
+        if (entry is not None and entry[0] == file_key(path) and
+                not entry[1].changed):
+            return entry[1]
+
+    sched = CapacityScheduler(find_hxml(CAPACITY_SCHEDULER_FILENAME))
+
+    if _cache is not None:
+        _cache[('cap', path)] = (file_key(path), sched)
+
+    return sched
+
+
+def cap_path():
+    """
+    Returns the path of the system's capacity-scheduler.xml
     """
 
-    hxml = find_hxml(CAPACITY_SCHEDULER_FILENAME)
-    return CapacityScheduler(hxml)
+    return os.path.join(find_hxml_dir(), CAPACITY_SCHEDULER_FILENAME)
 
 
-def save_cap(hxml):
-    d = find_hxml_dir()
-    hxml.save(os.path.join(d, CAPACITY_SCHEDULER_FILENAME))
+def save_cap(hxml, sched=None):
+    """
+    Save hxml as the system's capacity-scheduler.xml. If sched, the
+    :py:class:`hadmin.yarn.CapacityScheduler` hxml was generated from, is
+    given, it is kept as the system's scheduler by long-running processes.
+    """
+
+    path = cap_path()
+    hxml.save(path)
+
+    if _cache is not None:
+        path = abspath(path)
+        _cache.pop(('hxml', path), None)
+
+        if sched is None:
+            _cache.pop(('cap', path), None)
+        else:
+            _cache[('cap', path)] = (file_key(path), sched)
 
 
 def get_rm():
@@ -69,27 +265,84 @@ def get_rm():
     Returns the system's :py:class:`hadmin.yarn.ResourceManager`
     """
 
+    from hadmin.yarn import QueueReloader, ResourceManager
+
     hxml = find_hxml(YARN_FILENAME)
-    return ResourceManager(hxml)
+    state_file = os.path.join(hadmin.cache.cache_dir(),
+                              REFRESHED_HASH_FILENAME)
+    return ResourceManager(hxml, QueueReloader(state_file=state_file))
+
+
+def get_snapshot_cache(ttl=None):
+    """
+    Returns the system's on-disk :py:class:`hadmin.cache.SnapshotCache` with
+    the given TTL, or None if no TTL is given
+    """
+
+    if ttl is None:
+        return None
+
+    path = hadmin.cache.default_path()
+
+    if _cache is not None and ('snapshots', ttl, path) in _cache:
+        return _cache[('snapshots', ttl, path)]
+
+    cache = hadmin.cache.SnapshotCache(ttl, path)
+
+    if _cache is not None:
+        _cache[('snapshots', ttl, path)] = cache
+
+    return cache
 
 
-def rest_nm():
+def jmx_dn(cache=None, addr='localhost:50075'):
+    """
+    Returns a default :py:class:`hadmin.jmx.DataNodeJMX`
+    """
+
+    import hadmin.jmx
+
+    jmx = hadmin.jmx.DataNodeJMX()
+    jmx.load_from_host(addr, cache=cache)
+    return jmx
+
+
+def jmx_nn(cache=None, addr='localhost:50070'):
+    """
+    Returns a default :py:class:`hadmin.jmx.NameNodeJMX`
+    """
+
+    import hadmin.jmx
+
+    jmx = hadmin.jmx.NameNodeJMX()
+    jmx.load_from_host(addr, cache=cache)
+    return jmx
+
+
+def rest_nm(cache=None, addr='localhost:8042'):
     """
     Returns a default :py:class:`hadmin.rest.NodeManager`
     """
 
+    import hadmin.rest
     from hadmin.rest import NodeManager
 
-    return NodeManager.load_from_host('localhost:8042',
-                                      path=hadmin.rest.NM_INFO_PATH)
+    return NodeManager.load_from_host(addr,
+                                      path=hadmin.rest.NM_INFO_PATH,
+                                      cache=cache)
 
 
-def rest_rm():
+def rest_rm(cache=None, addr=None):
     """
-    Returns a default :py:class:`hadmin.rest.ResourceManager`
+    Returns a default :py:class:`hadmin.rest.ResourceManager`. addr defaults
+    to the ResourceManager's address in ``yarn-site.xml``.
     """
 
-    rm = get_rm()
+    import hadmin.rest
+
+    if addr is None:
+        addr = get_rm().address
 
     paths = [hadmin.rest.RM_METRICS_PATH, hadmin.rest.RM_SCHEDULER_PATH]
-    return hadmin.rest.ResourceManager.load_from_host(rm.address, paths=paths)
+    return hadmin.rest.ResourceManager.load_from_host(addr, paths=paths,
+                                                      cache=cache)
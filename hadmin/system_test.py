@@ -0,0 +1,115 @@
+from unittest2 import TestCase
+import hadmin.system
+import os
+import shutil
+import tempfile
+import threading
+
+
+class CacheTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dirs = hadmin.system.HADOOP_CONF_DIRS
+        hadmin.system.HADOOP_CONF_DIRS = [self.tmpdir]
+
+        open(os.path.join(self.tmpdir, 'core-site.xml'), 'w').close()
+        shutil.copy('data/capacity-scheduler.xml',
+                    hadmin.system.cap_path())
+
+        hadmin.system.enable_cache()
+
+    def tearDown(self):
+        hadmin.system.disable_cache()
+        hadmin.system.HADOOP_CONF_DIRS = self.dirs
+        shutil.rmtree(self.tmpdir)
+
+    def testReused(self):
+        self.assertIs(hadmin.system.get_cap(), hadmin.system.get_cap())
+
+    def testNotCachedWhenDisabled(self):
+        hadmin.system.disable_cache()
+        self.assertIsNot(hadmin.system.get_cap(), hadmin.system.get_cap())
+
+    def testChangedDropped(self):
+        sched = hadmin.system.get_cap()
+        sched.queue('root.a').cap_max = 42
+
+        fresh = hadmin.system.get_cap()
+        self.assertIsNot(sched, fresh)
+        self.assertNotEqual(42, fresh.queue('root.a').cap_max)
+
+    def testFileChanged(self):
+        sched = hadmin.system.get_cap()
+
+        with open(hadmin.system.cap_path(), 'a') as f:
+            f.write('\n')
+
+        self.assertIsNot(sched, hadmin.system.get_cap())
+
+    def testSaveKeepsScheduler(self):
+        sched = hadmin.system.get_cap()
+        sched.queue('root.a').cap_max = 42
+
+        hadmin.system.save_cap(sched.to_hxml(), sched)
+        sched.mark_saved()
+
+        self.assertIs(sched, hadmin.system.get_cap())
+
+        hadmin.system.disable_cache()
+        self.assertEqual(42, hadmin.system.get_cap().queue('root.a').cap_max)
+
+    def testSaveWithoutScheduler(self):
+        sched = hadmin.system.get_cap()
+        hadmin.system.save_cap(sched.to_hxml())
+
+        self.assertIsNot(sched, hadmin.system.get_cap())
+
+    def testSnapshotCache(self):
+        self.assertIs(hadmin.system.get_snapshot_cache(10),
+                      hadmin.system.get_snapshot_cache(10))
+        self.assertIsNot(hadmin.system.get_snapshot_cache(10),
+                         hadmin.system.get_snapshot_cache(20))
+
+
+class InRequestTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dirs = hadmin.system.HADOOP_CONF_DIRS
+        hadmin.system.HADOOP_CONF_DIRS = ['.']
+
+        open(os.path.join(self.tmpdir, 'core-site.xml'), 'w').close()
+
+    def tearDown(self):
+        hadmin.system.HADOOP_CONF_DIRS = self.dirs
+        shutil.rmtree(self.tmpdir)
+
+    def testCwd(self):
+        with hadmin.system.in_request(self.tmpdir):
+            self.assertEqual(os.path.join(self.tmpdir, 'a'),
+                             hadmin.system.abspath('a'))
+            self.assertEqual(self.tmpdir, hadmin.system.find_hxml_dir())
+
+        self.assertEqual(os.path.abspath('a'), hadmin.system.abspath('a'))
+
+    def testEnv(self):
+        env = {'XDG_CACHE_HOME': self.tmpdir}
+
+        with hadmin.system.in_request(self.tmpdir, env):
+            self.assertEqual(os.path.join(self.tmpdir, 'hadmin'),
+                             hadmin.cache.cache_dir())
+            self.assertIsNone(hadmin.system.getenv('PATH'))
+
+        self.assertEqual(os.environ.get('PATH'), hadmin.system.getenv('PATH'))
+
+    def testOtherThreads(self):
+        seen = []
+
+        with hadmin.system.in_request(self.tmpdir, dict()):
+            t = threading.Thread(
+                    target=lambda: seen.append(hadmin.system.getcwd()))
+            t.start()
+            t.join()
+
+        self.assertEqual([os.getcwd()], seen)
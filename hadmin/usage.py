@@ -0,0 +1,245 @@
+"""
+HDFS usage
+----------
+
+Report how much HDFS space users' home directories take up, per user and
+per queue.
+
+Usage is read with as few ``hdfs dfs -du -s`` calls as possible, or from an
+fsimage export (see :py:mod:`hadmin.fsimage`). Results are kept in a
+:py:class:`UsageCache` with the time they were read, so a report run again
+shortly after only asks HDFS about the entries that have gone stale.
+"""
+
+import hadmin.cache
+import json
+import os
+import time
+from hadmin.hdfs import FixupExecutor, HDFS_DFS, LS_CHUNK_SIZE, chunks
+from hadmin.hdfs import check_results
+
+
+DU_COMMAND = HDFS_DFS + ['-du', '-s']
+
+USAGE_FILENAME = 'usage.json'
+
+# Seconds a cached usage stays fresh
+DEFAULT_MAX_AGE = 3600
+
+SIZE_UNITS = ['B', 'K', 'M', 'G', 'T', 'P', 'E']
+
+
+def pretty_size(size):
+    """
+    Format a number of bytes, such as ``1.5G``
+    """
+
+    size = float(size)
+
+    for unit in SIZE_UNITS:
+        if abs(size) < 1024 or unit == SIZE_UNITS[-1]:
+            break
+        size /= 1024
+
+    if unit == 'B':
+        return '%d%s' % (size, unit)
+
+    return '%.1f%s' % (size, unit)
+
+
+class Usage:
+    """
+    The usage of one directory when it was read. size is the logical size
+    in bytes and consumed the raw space including replicas. Both are None if
+    the directory did not exist.
+    """
+
+    def __init__(self, path, size, consumed, fetched=None):
+        self.path = path
+        self.size = size
+        self.consumed = consumed
+        self.fetched = time.time() if fetched is None else fetched
+
+    @property
+    def exists(self):
+        return self.size is not None
+
+    @classmethod
+    def from_du_line(cls, line):
+        """
+        Parse one line of ``hdfs dfs -du -s`` output, which has the size,
+        the space consumed (since Hadoop 2.7) and the path. Get None if the
+        line is not a usage.
+        """
+
+        arr = line.split(None, 2)
+        if len(arr) < 2 or not arr[0].isdigit():
+            return None
+
+        if len(arr) == 3 and arr[1].isdigit():
+            return Usage(arr[2], int(arr[0]), int(arr[1]))
+
+        return Usage(line.split(None, 1)[1], int(arr[0]), int(arr[0]))
+
+    def to_dict(self):
+        return {
+            'size': self.size,
+            'consumed': self.consumed,
+            'fetched': self.fetched
+            }
+
+    @classmethod
+    def from_dict(cls, path, d):
+        return cls(path, d['size'], d['consumed'], d['fetched'])
+
+
+def default_path():
+    """
+    Get the default location of the usage cache
+    """
+
+    return os.path.join(hadmin.cache.cache_dir(), USAGE_FILENAME)
+
+
+class UsageCache:
+    """
+    Usages keyed by path, optionally persisted to a file. Entries older than
+    max_age seconds are stale.
+    """
+
+    def __init__(self, max_age=DEFAULT_MAX_AGE, path=None):
+        self.max_age = max_age
+        self.path = path
+        self._entries = dict()
+
+        if self.path:
+            self.load()
+
+    def get(self, path):
+        """
+        Get the usage of path, whether or not it is stale, or None
+        """
+
+        return self._entries.get(path)
+
+    def store(self, usage):
+        self._entries[usage.path] = usage
+
+    def stale(self, paths, now=None):
+        """
+        Get the paths out of paths that are missing or stale
+        """
+
+        now = time.time() if now is None else now
+
+        return [p for p in paths if p not in self._entries or
+                now - self._entries[p].fetched > self.max_age]
+
+    def load(self):
+        """
+        Load entries from the backing file. A missing or unreadable file
+        results in an empty cache.
+        """
+
+        try:
+            with open(self.path, 'r') as f:
+                raw = json.load(f)
+
+            for k in raw:
+                self._entries[k] = Usage.from_dict(k, raw[k])
+        except (IOError, OSError, ValueError, KeyError):
+            self._entries = dict()
+
+    def save(self):
+        """
+        Write entries to the backing file, if there is one
+        """
+
+        if not self.path:
+            return
+
+        hadmin.cache.write_json(self.path, dict(
+                (k, u.to_dict()) for k, u in self._entries.items()))
+
+
+class ShellUsageBackend:
+    """
+    Reads usage with ``hdfs dfs -du -s``, many paths per call
+    """
+
+    def __init__(self, du_command=None, chunk_size=LS_CHUNK_SIZE,
+                 executor=None):
+        self.du_command = du_command or DU_COMMAND
+        self.chunk_size = chunk_size
+        self.executor = executor or FixupExecutor()
+
+    def usage(self, paths):
+        """
+        Get a dict of path to :py:class:`Usage` for each of paths. Paths
+        that do not exist get a Usage whose size is None. Raises IOError if
+        the usage could not be read for any other reason.
+        """
+
+        paths = sorted(set(paths))
+        ret = dict()
+
+        def parse(line):
+            u = Usage.from_du_line(line)
+            if u is not None:
+                ret[u.path] = u
+
+        path_chunks = list(chunks(paths, self.chunk_size))
+        cmds = [self.du_command + chunk for chunk in path_chunks]
+        results = self.executor.run_all(cmds, [parse] * len(cmds))
+        check_results(self.du_command, path_chunks, results, ret)
+
+        for p in paths:
+            if p not in ret:
+                ret[p] = Usage(p, None, None)
+
+        return ret
+
+
+def refresh(cache, backend, paths, force=False):
+    """
+    Bring the usage of paths in cache up to date, asking backend only about
+    the stale paths (or all of them if force is set). Returns a dict of path
+    to :py:class:`Usage`. If backend raises, nothing is stored or saved.
+    """
+
+    stale = list(paths) if force else cache.stale(paths)
+
+    if stale:
+        for u in backend.usage(stale).values():
+            cache.store(u)
+
+        cache.save()
+
+    return dict((p, cache.get(p)) for p in paths)
+
+
+def rollup(usages, queue_users, homes):
+    """
+    Total the usage of each queue's users.
+
+    usages is a dict of path to :py:class:`Usage`, queue_users a dict of
+    queue name to its users, and homes a dict of user to home directory.
+    Returns a dict of queue name to (size, consumed). A user of several
+    queues counts towards each of them.
+    """
+
+    ret = dict()
+
+    for queue, users in queue_users.items():
+        size = 0
+        consumed = 0
+
+        for user in users:
+            u = usages.get(homes.get(user))
+            if u is not None and u.exists:
+                size += u.size
+                consumed += u.consumed
+
+        ret[queue] = (size, consumed)
+
+    return ret
@@ -0,0 +1,151 @@
+from hadmin.usage import ShellUsageBackend, Usage, UsageCache
+from hadmin.usage import pretty_size, refresh, rollup
+from contextlib import redirect_stderr
+from io import StringIO
+from unittest2 import TestCase
+import os
+import shutil
+import sys
+import tempfile
+
+
+FAKE_DU = [sys.executable, '-c', '''import sys
+status = 0
+for p in sys.argv[1:]:
+    if 'missing' in p:
+        sys.stderr.write('du: `' + p + "': No such file or directory\\n")
+        status = 1
+    else:
+        print('%d  %d  %s' % (len(p), 3 * len(p), p))
+sys.exit(status)
+''']
+
+FAILING_DU = [sys.executable, '-c', '''import sys
+sys.stderr.write('du: Permission denied: user=nobody\\n')
+sys.exit(1)
+''']
+
+
+class CountingBackend:
+
+    def __init__(self):
+        self.asked = []
+
+    def usage(self, paths):
+        self.asked += paths
+        return dict((p, Usage(p, 10, 30)) for p in paths)
+
+
+class UsageTest(TestCase):
+
+    def testPrettySize(self):
+        self.assertEqual('512B', pretty_size(512))
+        self.assertEqual('1.5K', pretty_size(1536))
+        self.assertEqual('2.0T', pretty_size(2 * 1024 ** 4))
+
+    def testFromDuLine(self):
+        u = Usage.from_du_line('1024  3072  /user/bob')
+        self.assertEqual(('/user/bob', 1024, 3072),
+                         (u.path, u.size, u.consumed))
+
+    def testFromDuLineOld(self):
+        u = Usage.from_du_line('1024  /user/bob smith')
+        self.assertEqual(('/user/bob smith', 1024, 1024),
+                         (u.path, u.size, u.consumed))
+
+    def testFromDuLineError(self):
+        self.assertIsNone(Usage.from_du_line(
+            "du: `/user/nobody': No such file or directory"))
+
+    def testRollup(self):
+        usages = {
+            '/user/a': Usage('/user/a', 1, 3),
+            '/user/b': Usage('/user/b', 2, 6),
+            '/user/c': Usage('/user/c', None, None),
+            }
+        homes = {'a': '/user/a', 'b': '/user/b', 'c': '/user/c'}
+        totals = rollup(usages, {'root.x': ['a', 'b'], 'root.y': ['b', 'c']},
+                        homes)
+
+        self.assertEqual({'root.x': (3, 9), 'root.y': (2, 6)}, totals)
+
+
+class ShellUsageBackendTest(TestCase):
+
+    def testUsage(self):
+        backend = ShellUsageBackend(du_command=FAKE_DU, chunk_size=2)
+        usages = backend.usage(['/user/a', '/user/bb', '/user/missing'])
+
+        self.assertEqual(24, usages['/user/bb'].consumed)
+        self.assertFalse(usages['/user/missing'].exists)
+        self.assertEqual(3, len(usages))
+
+    def testFailed(self):
+        with self.assertRaises(IOError):
+            ShellUsageBackend(du_command=FAILING_DU).usage(['/user/a'])
+
+
+class UsageCacheTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'usage.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testStale(self):
+        cache = UsageCache(max_age=60)
+        cache.store(Usage('/user/a', 1, 3, fetched=1000))
+        cache.store(Usage('/user/b', 1, 3, fetched=1100))
+
+        self.assertEqual(['/user/a', '/user/c'],
+                         cache.stale(['/user/a', '/user/b', '/user/c'],
+                                     now=1130))
+
+    def testRefreshOnlyStale(self):
+        cache = UsageCache(max_age=60, path=self.path)
+        backend = CountingBackend()
+
+        refresh(cache, backend, ['/user/a', '/user/b'])
+        usages = refresh(UsageCache(max_age=60, path=self.path), backend,
+                         ['/user/a', '/user/b', '/user/c'])
+
+        self.assertEqual(['/user/a', '/user/b', '/user/c'], backend.asked)
+        self.assertEqual(10, usages['/user/c'].size)
+
+    def testRefreshForce(self):
+        cache = UsageCache(max_age=60)
+        backend = CountingBackend()
+
+        refresh(cache, backend, ['/user/a'])
+        refresh(cache, backend, ['/user/a'], force=True)
+
+        self.assertEqual(['/user/a', '/user/a'], backend.asked)
+
+    def testRefreshFailed(self):
+        cache = UsageCache(max_age=60, path=self.path)
+
+        with self.assertRaises(IOError):
+            refresh(cache, ShellUsageBackend(du_command=FAILING_DU),
+                    ['/user/a'])
+
+        self.assertIsNone(cache.get('/user/a'))
+        self.assertFalse(os.path.exists(self.path))
+
+    def testMissingPersisted(self):
+        cache = UsageCache(path=self.path)
+        cache.store(Usage('/user/a', None, None))
+        cache.save()
+
+        self.assertFalse(UsageCache(path=self.path).get('/user/a').exists)
+
+    def testUnwritable(self):
+        cache = UsageCache(path='/proc/nope/usage.json')
+        cache.store(Usage('/user/a', 1, 3))
+
+        err = StringIO()
+        with redirect_stderr(err):
+            cache.save()
+
+        self.assertIn('could not save', err.getvalue())
@@ -4,7 +4,7 @@ CapacityScheduler.
 """
 
 
-import subprocess
+import shlex
 import xml.etree.ElementTree as ET
 
 
@@ -18,10 +18,14 @@ class HXML:
     use a class such as CapacityScheduler to fulfill your needs.
     """
 
-    DEFAULT_EMPTY_TREE = ET.fromstring('<configuration></configuration>')
+    DEFAULT_EMPTY_TREE = '<configuration></configuration>'
+
+    def __init__(self, etree=None):
+        if etree is None:
+            etree = ET.fromstring(HXML.DEFAULT_EMPTY_TREE)
 
-    def __init__(self, etree=DEFAULT_EMPTY_TREE):
         self.tree = etree
+        self._index = None
 
     @classmethod
     def from_str(cls, string):
@@ -35,11 +39,25 @@ class HXML:
         ret = cls(ET.parse(fname).getroot())
         return ret
 
+    def _nodes(self, prop):
+        """
+        Returns the property nodes named prop. The nodes are indexed by name
+        the first time this is called, so that looking up a property does
+        not scan the whole tree.
+        """
+
+        if self._index is None:
+            self._index = dict()
+            for node in self.tree.findall('property'):
+                self._index.setdefault(node.find('name').text,
+                                       []).append(node)
+
+        return self._index.get(prop, [])
+
     def __getitem__(self, prop):
         """ Retrieves a config value. """
-        for node in self.tree.findall('property'):
-            if node.find('name').text == prop:
-                return node.find('value').text
+        for node in self._nodes(prop):
+            return node.find('value').text
 
         raise KeyError('Key ' + prop + ' not found')
 
@@ -68,10 +86,9 @@ class HXML:
         elif type(val) is bool:
             val = str(val).lower()
 
-        for node in self.tree.findall('property'):
-            if node.find('name').text == prop:
-                node.find('value').text = val
-                success = True
+        for node in self._nodes(prop):
+            node.find('value').text = val
+            success = True
 
         if success is not True:
             el = ET.Element('property')
@@ -86,12 +103,14 @@ class HXML:
             val_el.text = val
             el.append(val_el)
             self.tree.append(el)
+            self._index.setdefault(prop, []).append(el)
 
     def remove(self, prop):
         """ Deletes a property from the etree. """
-        for node in self.tree.findall('property'):
-            if node.find('name').text == prop:
-                self.tree.remove(node)
+        for node in self._nodes(prop):
+            self.tree.remove(node)
+
+        self._index.pop(prop, None)
 
     def keys(self):
         """ Returns a list of keys. """
@@ -120,28 +139,20 @@ def users_from_passwd(raw):
     return sorted(users)
 
 
-class CommandReturn:
-
-    def __init__(self, status, output):
-        self.status = status
-        self.output = output
+def run_or_warn(cmd, warning=''):
+    """
+    Run cmd, a command line, and print warning if it fails. Returns a
+    :py:class:`hadmin.runner.Result`.
 
+    The command line is split like a shell would, but no shell runs it.
+    New code should use :py:mod:`hadmin.runner` directly.
+    """
 
-def run_or_warn(cmd, warning=''):
-    try:
-        tmp = subprocess.getstatusoutput(cmd, shell=True)
-        retval = CommandReturn(status=tmp[0], output=tmp[1])
+    import hadmin.runner
 
-        if retval.status != 0:
-            print(warning)
+    ret = hadmin.runner.run(shlex.split(cmd))
 
-        return retval
-    except AttributeError:
-        status = 0
-        out = ''
-        try:
-            out = subprocess.check_output(cmd, shell=True)
-        except subprocess.CalledProcessError:
-            status = 1
+    if ret.status != 0:
+        print(warning)
 
-        return CommandReturn(status=status, output=out)
+    return ret
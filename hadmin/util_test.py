@@ -1,4 +1,4 @@
-from hadmin.util import HXML
+from hadmin.util import HXML, run_or_warn
 from hadmin.yarn import Queue
 from unittest2 import TestCase
 
@@ -24,3 +24,32 @@ class HXMLTest(TestCase):
     def testHXMLSetterNonExistent(self):
         self.hxml['hehe'] = 'hey'
         self.assertEqual(self.hxml['hehe'], 'hey')
+
+    def testHXMLRemove(self):
+        self.hxml.remove(Queue.fqn_users('root.a'))
+
+        with self.assertRaises(KeyError):
+            self.hxml[Queue.fqn_users('root.a')]
+
+        self.assertNotIn(Queue.fqn_users('root.a'), self.hxml.keys())
+
+        self.hxml[Queue.fqn_users('root.a')] = 'back'
+        self.assertEqual('back', self.hxml[Queue.fqn_users('root.a')])
+
+    def testHXMLEmptyNotShared(self):
+        a = HXML()
+        b = HXML()
+        a['hehe'] = 'hey'
+
+        self.assertEqual([], b.keys())
+
+
+class RunOrWarnTest(TestCase):
+
+    def testOutput(self):
+        ret = run_or_warn('echo hello world')
+        self.assertEqual(0, ret.status)
+        self.assertEqual('hello world', ret.output)
+
+    def testQuoting(self):
+        self.assertEqual('a b', run_or_warn("echo 'a b'").output)
@@ -0,0 +1,279 @@
+"""
+WebHDFS
+-------
+
+Read and fix up HDFS directories through the NameNode's WebHDFS REST API
+instead of the ``hdfs`` command line client, which starts a JVM for every
+call.
+
+Requests go over a small pool of keep-alive connections and are issued from
+a thread pool, so checking or fixing thousands of directories takes a few
+round trips' worth of time rather than a few JVMs' worth per directory.
+"""
+
+import json
+import posixpath
+import socket
+from hadmin.hdfs import Directory
+from multiprocessing.pool import ThreadPool
+
+try:
+    from http.client import HTTPConnection, HTTPException
+    from queue import Queue
+    from urllib.parse import quote, urlencode
+except ImportError:
+    from httplib import HTTPConnection, HTTPException
+    from Queue import Queue
+    from urllib import quote, urlencode
+
+
+PREFIX = '/webhdfs/v1'
+
+DEFAULT_POOL_SIZE = 8
+
+DEFAULT_TIMEOUT = 30
+
+# When at least this many of the paths asked about share a parent, the
+# parent is listed with LISTSTATUS instead of asking about each path
+LIST_THRESHOLD = 16
+
+
+def perms_from_status(status):
+    """
+    Turn the permission of a FileStatus (``755``, ``1777``) into the four
+    digit form :py:class:`hadmin.hdfs.Directory` uses
+    """
+
+    return '%04o' % int(status['permission'], 8)
+
+
+def directory_from_status(path, status):
+    return Directory(path, status['owner'], status['group'],
+                     perms_from_status(status))
+
+
+class ConnectionPool:
+    """
+    A fixed number of keep-alive HTTP connections to one host, shared
+    between threads
+    """
+
+    def __init__(self, host, port, size=DEFAULT_POOL_SIZE,
+                 timeout=DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._idle = Queue()
+
+        for _ in range(size):
+            self._idle.put(None)
+
+    def _connect(self):
+        return HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, url):
+        """
+        Send a request and read the whole response. Returns (status, body).
+
+        A connection the server has since closed is replaced and the request
+        is sent once more.
+        """
+
+        conn = self._idle.get()
+
+        try:
+            for attempt in range(2):
+                if conn is None:
+                    conn = self._connect()
+
+                try:
+                    conn.request(method, url)
+                    res = conn.getresponse()
+                    return res.status, res.read()
+                except (HTTPException, socket.error):
+                    conn.close()
+                    conn = None
+
+                    if attempt:
+                        raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        for _ in range(self._idle.qsize()):
+            conn = self._idle.get()
+            if conn is not None:
+                conn.close()
+            self._idle.put(None)
+
+
+class WebHDFS:
+    """
+    A WebHDFS client for the NameNode at addr (``host:port``).
+
+    user is sent as ``user.name``, for clusters using simple authentication.
+    """
+
+    def __init__(self, addr, user=None, pool_size=DEFAULT_POOL_SIZE,
+                 timeout=DEFAULT_TIMEOUT):
+        host, _, port = addr.rpartition(':')
+        self.user = user
+        self.pool = ConnectionPool(host, int(port), pool_size, timeout)
+
+    def url(self, path, op, **params):
+        params['op'] = op
+        if self.user:
+            params['user.name'] = self.user
+
+        return (PREFIX + quote(path) + '?' +
+                urlencode(sorted(params.items())))
+
+    def call(self, method, path, op, **params):
+        """
+        Run op on path. Returns the decoded JSON response. If path does not
+        exist, GETs return None; any other failure raises IOError.
+        """
+
+        status, body = self.pool.request(method, self.url(path, op, **params))
+
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+
+        if status == 404 and method == 'GET':
+            return None
+
+        if status != 200:
+            message = body
+            try:
+                message = json.loads(body)['RemoteException']['message']
+            except (ValueError, KeyError, TypeError):
+                pass
+
+            raise IOError(op + ' ' + path + ' failed: ' + message)
+
+        return json.loads(body) if body else dict()
+
+    def get_file_status(self, path):
+        """
+        Get the FileStatus of path as a dict, or None if it does not exist
+        """
+
+        res = self.call('GET', path, 'GETFILESTATUS')
+        return res['FileStatus'] if res else None
+
+    def list_status(self, path):
+        """
+        Get the FileStatuses of the children of path, or None if it does not
+        exist
+        """
+
+        res = self.call('GET', path, 'LISTSTATUS')
+        return res['FileStatuses']['FileStatus'] if res else None
+
+    def mkdirs(self, path, perms=None):
+        params = dict()
+        if perms:
+            params['permission'] = perms.lstrip('0') or '0'
+
+        return self.call('PUT', path, 'MKDIRS', **params)['boolean']
+
+    def set_owner(self, path, owner, group):
+        self.call('PUT', path, 'SETOWNER', owner=owner, group=group)
+
+    def set_permission(self, path, perms):
+        self.call('PUT', path, 'SETPERMISSION',
+                  permission=perms.lstrip('0') or '0')
+
+    def close(self):
+        self.pool.close()
+
+
+class WebHDFSBackend:
+    """
+    Reads and writes HDFS directories through :py:class:`WebHDFS`, with the
+    same interface as :py:class:`hadmin.hdfs.ShellBackend`
+    """
+
+    def __init__(self, client, workers=DEFAULT_POOL_SIZE):
+        self.client = client
+        self.workers = workers
+
+    def _map(self, func, items):
+        pool = ThreadPool(self.workers)
+        try:
+            return pool.map(func, items)
+        finally:
+            pool.close()
+            pool.join()
+
+    def statuses(self, paths):
+        """
+        Get a dict of path to :py:class:`hadmin.hdfs.Directory` for each of
+        paths that exists
+        """
+
+        by_parent = dict()
+        for path in set(paths):
+            by_parent.setdefault(posixpath.dirname(path), []).append(path)
+
+        listed = []
+        single = []
+        for parent, children in by_parent.items():
+            if len(children) >= LIST_THRESHOLD:
+                listed.append((parent, set(children)))
+            else:
+                single += children
+
+        def list_parent(item):
+            parent, wanted = item
+            found = []
+
+            for status in self.client.list_status(parent) or []:
+                path = posixpath.join(parent, status['pathSuffix'])
+                if path in wanted and status['type'] == 'DIRECTORY':
+                    found.append(directory_from_status(path, status))
+
+            return found
+
+        def stat(path):
+            status = self.client.get_file_status(path)
+            if status is None:
+                return []
+
+            return [directory_from_status(path, status)]
+
+        ret = dict()
+        for found in self._map(list_parent, listed) + self._map(stat, single):
+            for d in found:
+                ret[d.path] = d
+
+        return ret
+
+    def write(self, dirs):
+        """
+        Create each of dirs if needed and fix its owner, group and perms,
+        warning about the ones that fail. Returns True if they all
+        succeeded.
+        """
+
+        def write_one(d):
+            try:
+                self.client.mkdirs(d.path, d.perms)
+                self.client.set_owner(d.path, d.owner, d.group)
+                self.client.set_permission(d.path, d.perms)
+            except (IOError, HTTPException) as e:
+                return e
+
+            return None
+
+        dirs = list(dirs)
+        ok = True
+
+        # Warned about here rather than in the workers, so that the output
+        # goes wherever this thread's does
+        for d, e in zip(dirs, self._map(write_one, dirs)):
+            if e is not None:
+                ok = False
+                print('failed to fix up ' + d.path + ': ' + str(e))
+
+        return ok
@@ -0,0 +1,214 @@
+from hadmin.hdfs import Directory
+from hadmin.webhdfs import WebHDFS, WebHDFSBackend, perms_from_status
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest2 import TestCase
+import json
+import posixpath
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, unquote, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote
+    from urlparse import parse_qs, urlparse
+
+
+class StubNameNode(ThreadingMixIn, HTTPServer):
+    """
+    Just enough of WebHDFS, over an in-memory dict of path to status
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.connections = 0
+        self.denied = set()
+        self.files = {
+            '/': self.status('hdfs', 'hadoop', '755'),
+            '/user': self.status('hdfs', 'hadoop', '755'),
+            }
+
+    @staticmethod
+    def status(owner, group, perms):
+        return {'owner': owner, 'group': group, 'permission': perms,
+                'type': 'DIRECTORY'}
+
+    @property
+    def addr(self):
+        return '%s:%d' % self.server_address
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def reply(self, status, obj=None):
+        body = json.dumps(obj).encode('utf-8') if obj is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_op(self):
+        url = urlparse(self.path)
+        path = unquote(url.path[len('/webhdfs/v1'):]) or '/'
+        params = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        op = params['op']
+        files = self.server.files
+
+        with self.server.lock:
+            self.server.requests.append((op, path, params))
+
+            if op == 'GETFILESTATUS':
+                if path not in files:
+                    return self.reply(404, {'RemoteException': {
+                        'message': 'File does not exist: ' + path}})
+                return self.reply(200, {'FileStatus': files[path]})
+
+            if op == 'LISTSTATUS':
+                children = []
+                for p in sorted(files):
+                    if p != '/' and posixpath.dirname(p) == path:
+                        st = dict(files[p])
+                        st['pathSuffix'] = posixpath.basename(p)
+                        children.append(st)
+                return self.reply(200, {'FileStatuses': {
+                    'FileStatus': children}})
+
+            if path in self.server.denied:
+                return self.reply(403, {'RemoteException': {
+                    'message': 'Permission denied: ' + path}})
+
+            if op == 'MKDIRS':
+                if path not in files:
+                    files[path] = StubNameNode.status(
+                            params.get('user.name', 'nobody'), 'supergroup',
+                            params.get('permission', '755'))
+                return self.reply(200, {'boolean': True})
+
+            if path not in files:
+                return self.reply(404, {'RemoteException': {
+                    'message': 'File does not exist: ' + path}})
+
+            if op == 'SETOWNER':
+                files[path]['owner'] = params['owner']
+                files[path]['group'] = params['group']
+                return self.reply(200)
+
+            if op == 'SETPERMISSION':
+                files[path]['permission'] = params['permission']
+                return self.reply(200)
+
+        return self.reply(400, {'RemoteException': {'message': 'bad op'}})
+
+    do_GET = handle_op
+    do_PUT = handle_op
+
+    def log_message(self, *args):
+        pass
+
+
+class WebHDFSTest(TestCase):
+
+    def setUp(self):
+        self.server = StubNameNode()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.client = WebHDFS(self.server.addr, user='hdfs', pool_size=4)
+        self.backend = WebHDFSBackend(self.client, workers=4)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_users(self, n):
+        for i in range(n):
+            self.server.files['/user/u%d' % i] = StubNameNode.status(
+                    'u%d' % i, 'hadoop', '750')
+
+    def testPermsFromStatus(self):
+        self.assertEqual('1777', perms_from_status({'permission': '1777'}))
+        self.assertEqual('0750', perms_from_status({'permission': '750'}))
+
+    def testGetFileStatus(self):
+        self.assertEqual('hdfs', self.client.get_file_status('/')['owner'])
+
+    def testGetFileStatusMissing(self):
+        self.assertIsNone(self.client.get_file_status('/nope'))
+
+    def testUserName(self):
+        self.client.get_file_status('/')
+        self.assertEqual('hdfs', self.server.requests[0][2]['user.name'])
+
+    def testSetPermissionMissing(self):
+        with self.assertRaises(IOError):
+            self.client.set_permission('/nope', '0755')
+
+    def testStatuses(self):
+        self.add_users(2)
+        statuses = self.backend.statuses(['/', '/user/u1', '/user/nope'])
+
+        self.assertEqual(['/', '/user/u1'], sorted(statuses))
+        self.assertEqual(Directory('/user/u1', 'u1', 'hadoop', '0750'),
+                         statuses['/user/u1'])
+
+    def testStatusesListsParent(self):
+        self.add_users(40)
+        paths = ['/user/u%d' % i for i in range(50)]
+        statuses = self.backend.statuses(paths)
+
+        self.assertEqual(40, len(statuses))
+        self.assertEqual([('LISTSTATUS', '/user')],
+                         [r[:2] for r in self.server.requests])
+
+    def testConnectionsReused(self):
+        self.add_users(10)
+        self.backend.statuses(['/user/u%d' % i for i in range(10)])
+
+        self.assertEqual(10, len(self.server.requests))
+        self.assertLessEqual(self.server.connections, 4)
+
+    def testWrite(self):
+        self.add_users(1)
+        wanted = [
+            Directory('/user/u0', 'u0', 'hadoop', '0700'),
+            Directory('/user/new', 'new', 'hadoop', '0750'),
+            Directory('/tmp', 'yarn', 'hadoop', '1777'),
+            ]
+        self.assertTrue(self.backend.write(wanted))
+
+        statuses = self.backend.statuses([d.path for d in wanted])
+        for d in wanted:
+            self.assertEqual(d, statuses[d.path])
+
+    def testWriteFailed(self):
+        self.server.denied.add('/user/bad')
+        wanted = [
+            Directory('/user/bad', 'bad', 'hadoop', '0750'),
+            Directory('/user/good', 'good', 'hadoop', '0750'),
+            ]
+
+        out = StringIO()
+        with redirect_stdout(out):
+            self.assertFalse(self.backend.write(wanted))
+
+        self.assertIn('/user/bad', out.getvalue())
+        self.assertNotIn('/user/good', out.getvalue())
+        self.assertEqual(wanted[1],
+                         self.backend.statuses(['/user/good'])['/user/good'])
@@ -12,10 +12,128 @@ Files handled:
 """
 
 
-import subprocess
+import hashlib
+import threading
 from hadmin.util import HXML
 
 
+REFRESH_QUEUES_COMMAND = ['yarn', 'rmadmin', '-refreshQueues']
+
+# Hadoop allows the capacities of sibling queues, as fractions of 1, to add
+# up to this far from 1. Capacities here are percentages, so the sum may be
+# 0.05 away from 100.
+CAPACITY_PRECISION = 0.0005
+
+
+def capacity_sum_ok(total):
+    """
+    Whether the capacities of a set of sibling queues sum to 100
+    """
+
+    return abs(total / 100.0 - 1.0) <= CAPACITY_PRECISION
+
+
+class AclList(list):
+    """
+    A list of users or admins that tells its queue when it is modified
+    """
+
+    def __init__(self, owner, names=()):
+        list.__init__(self, names)
+        self._owner = owner
+
+    def _changed(self):
+        self._owner._invalidate()
+
+    def append(self, name):
+        list.append(self, name)
+        self._changed()
+
+    def extend(self, names):
+        list.extend(self, names)
+        self._changed()
+
+    def __iadd__(self, names):
+        self.extend(names)
+        return self
+
+    def insert(self, i, name):
+        list.insert(self, i, name)
+        self._changed()
+
+    def remove(self, name):
+        list.remove(self, name)
+        self._changed()
+
+    def pop(self, i=-1):
+        name = list.pop(self, i)
+        self._changed()
+        return name
+
+    def __setitem__(self, i, val):
+        list.__setitem__(self, i, val)
+        self._changed()
+
+    def __delitem__(self, i):
+        list.__delitem__(self, i)
+        self._changed()
+
+    def clear(self):
+        del self[:]
+
+
+class QueueList(list):
+    """
+    The list of a queue's subqueues
+
+    Keeps each subqueue's parent pointer and the owning queue's capacity sum
+    up to date as the list is modified.
+    """
+
+    def __init__(self, owner, queues=()):
+        list.__init__(self)
+        self._owner = owner
+        self.extend(queues)
+
+    def append(self, q):
+        list.append(self, q)
+        self._owner._attach(q)
+
+    def extend(self, queues):
+        for q in queues:
+            self.append(q)
+
+    def __iadd__(self, queues):
+        self.extend(queues)
+        return self
+
+    def insert(self, i, q):
+        list.insert(self, i, q)
+        self._owner._attach(q)
+
+    def remove(self, q):
+        list.remove(self, q)
+        self._owner._detach(q)
+
+    def pop(self, i=-1):
+        q = list.pop(self, i)
+        self._owner._detach(q)
+        return q
+
+    def __setitem__(self, i, val):
+        old = list(self)
+        list.__setitem__(self, i, val)
+        self._owner._resync(old)
+
+    def __delitem__(self, i):
+        old = list(self)
+        list.__delitem__(self, i)
+        self._owner._resync(old)
+
+    def clear(self):
+        del self[:]
+
+
 class Queue(object):
     """
     An abstraction of a queue
@@ -49,6 +167,12 @@ class Queue(object):
         if name is None:
             raise KeyError('Queues must be named')
 
+        self._parent = None
+        self._validator = None
+        self._hash = None
+        self._cap_sum = 0.0
+        self._subqueues = QueueList(self)
+
         self.name = name
         self.admins = admins
         self.users = users
@@ -56,7 +180,6 @@ class Queue(object):
         self.user_limit_factor = Queue.DEFAULT_ULIM
         self.cap_max = Queue.DEFAULT_MAXCAP
         self.cap_min = Queue.DEFAULT_CAP
-        self.subqueues = []
 
     @classmethod
     def fqn_users(cls, queue_name):
@@ -143,7 +266,7 @@ class Queue(object):
             if subs is None:
                 subs = []
             else:
-                subs = subs.split(',')
+                subs = [sub for sub in subs.split(',') if sub]
 
         except KeyError:
             pass
@@ -156,7 +279,7 @@ class Queue(object):
                 running=running)
         q.cap_max = maxcap
         q.cap_min = cap
-        q.ulim = ulim
+        q.user_limit_factor = ulim
 
         for sub in subs:
             q.subqueues.append(Queue.from_hxml(hxml, '.'.join([fqn, sub])))
@@ -174,6 +297,159 @@ class Queue(object):
 
         return None
 
+    @property
+    def subqueues(self):
+        """
+        This queue's subqueues, as a :py:class:`QueueList`
+        """
+
+        return self._subqueues
+
+    @subqueues.setter
+    def subqueues(self, queues):
+        old = list(self._subqueues)
+        self._subqueues = QueueList(self, queues)
+        self._resync(old)
+
+    @property
+    def parent(self):
+        """
+        The queue this queue is a subqueue of, or None
+        """
+
+        return self._parent
+
+    @property
+    def fqn(self):
+        """
+        The fully qualified name of this queue, found by walking up through
+        its parents
+        """
+
+        parts = []
+        q = self
+        while q is not None:
+            parts.append(q.name)
+            q = q._parent
+
+        return '.'.join(reversed(parts))
+
+    @property
+    def capacity_sum(self):
+        """
+        Sum of the capacities of this queue's subqueues
+        """
+
+        return self._cap_sum
+
+    def _attach(self, q):
+        q._parent = self
+        self._cap_sum += q.cap_min
+        self._structure_changed([q], [])
+
+    def _detach(self, q):
+        if q not in self._subqueues:
+            q._parent = None
+
+        self._cap_sum -= q.cap_min
+        self._structure_changed([], [q])
+
+    def _resync(self, old):
+        removed = [q for q in old if q not in self._subqueues]
+        for q in removed:
+            q._parent = None
+
+        for q in self._subqueues:
+            q._parent = self
+
+        self._cap_sum = sum(q.cap_min for q in self._subqueues)
+        self._structure_changed(list(self._subqueues), removed)
+
+    @property
+    def validator(self):
+        """
+        The :py:class:`CapacityValidator` watching the tree this queue is in,
+        or None. Found by walking up to the root.
+        """
+
+        q = self
+        while q._parent is not None:
+            q = q._parent
+
+        return q._validator
+
+    def _invalidate(self):
+        """
+        Forget the cached content hash of this queue and of every queue
+        above it
+        """
+
+        q = self
+        while q is not None and q._hash is not None:
+            q._hash = None
+            q = q._parent
+
+    def attributes(self):
+        """
+        The attributes of this queue alone that end up in its configuration,
+        as a list of (attribute name, value) pairs. ACLs are frozensets.
+        """
+
+        return [
+            ('capacity', self.cap_min),
+            ('maximum-capacity', self.cap_max),
+            ('user-limit-factor', self.user_limit_factor),
+            ('state', self.get_state_str()),
+            ('users', frozenset(self.users)),
+            ('admins', frozenset(self.admins))
+            ]
+
+    @property
+    def content_hash(self):
+        """
+        A hash of this queue's attributes and, recursively, its subqueues.
+
+        The hash is cached, and the cache is cleared for this queue and all
+        queues above it whenever anything below changes. Two trees with the
+        same hash have the same configuration.
+        """
+
+        if self._hash is not None:
+            return self._hash
+
+        h = hashlib.sha1()
+        h.update(self.name.encode('utf-8'))
+
+        for attr, value in self.attributes():
+            if isinstance(value, frozenset):
+                value = ','.join(sorted(value))
+
+            h.update(('\0' + attr + '=' + str(value)).encode('utf-8'))
+
+        for name, sub_hash in sorted((q.name, q.content_hash)
+                                     for q in self._subqueues):
+            h.update(('\0' + name + ':' + sub_hash).encode('utf-8'))
+
+        self._hash = h.hexdigest()
+        return self._hash
+
+    def _structure_changed(self, added, removed):
+        self._invalidate()
+
+        v = self.validator
+        if v is not None:
+            v.structure_changed(self, added, removed)
+
+    def _capacity_changed(self, old_cap_min):
+        self._invalidate()
+
+        if self._parent is not None and old_cap_min is not None:
+            self._parent._cap_sum += self._cap_min - old_cap_min
+
+        v = self.validator
+        if v is not None:
+            v.capacity_changed(self)
+
     def check_capacities(self, fqn_prefix=None):
         """
         Check that this queue's subqueues have capacities that add to 100,
@@ -189,9 +465,9 @@ class Queue(object):
 
         for q in self.subqueues:
             cap += q.cap_min
-            failures += q.check_capacities()
+            failures += q.check_capacities(fqn)
 
-        if cap != 100.0:
+        if not capacity_sum_ok(cap):
             failures.append(fqn)
 
         return failures
@@ -284,7 +560,9 @@ class Queue(object):
 
         tmp = float(new_cap_min)
         if 0.0 <= tmp <= 100.0:
+            old = getattr(self, '_cap_min', None)
             self._cap_min = tmp
+            self._capacity_changed(old)
         else:
             raise ValueError("cap_min must be between 0 and 100")
 
@@ -308,6 +586,11 @@ class Queue(object):
         tmp = float(new_cap_max)
         if 0.0 <= tmp <= 100.0:
             self._cap_max = tmp
+            self._invalidate()
+
+            v = self.validator
+            if v is not None:
+                v.capacity_changed(self)
         else:
             raise ValueError("cap_max must be between 0 and 100")
 
@@ -333,6 +616,7 @@ class Queue(object):
             raise ValueError("cap_max must be between 0 and 100")
 
         self._ulim = tmp
+        self._invalidate()
 
     @property
     def users(self):
@@ -354,7 +638,8 @@ class Queue(object):
         Set the list of users
         """
 
-        self._users = new_val
+        self._users = AclList(self, new_val)
+        self._invalidate()
 
     @property
     def admins(self):
@@ -376,7 +661,133 @@ class Queue(object):
         Set the list of admins
         """
 
-        self._admins = new_val
+        self._admins = AclList(self, new_val)
+        self._invalidate()
+
+    @property
+    def name(self):
+        """
+        This queue's short name
+        """
+
+        return self._name
+
+    @name.setter
+    def name(self, new_val):
+        self._name = new_val
+        self._invalidate()
+
+    @property
+    def running(self):
+        """
+        Whether this queue accepts applications
+        """
+
+        return self._running
+
+    @running.setter
+    def running(self, new_val):
+        self._running = new_val
+        self._invalidate()
+
+
+class CapacityValidator:
+    """
+    Keeps the results of the CapacityScheduler sanity checks up to date as a
+    queue tree is modified.
+
+    The validator watches the tree rooted at root. Each change to a queue's
+    capacity only rechecks that queue and its parent, so asking for the
+    current failures never walks the whole tree.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._sum_failures = set()
+        self._max_failures = set()
+
+        root._validator = self
+        self._check_subtree(root)
+
+    def _check_sum(self, q):
+        if q.subqueues and not capacity_sum_ok(q.capacity_sum):
+            self._sum_failures.add(q)
+        else:
+            self._sum_failures.discard(q)
+
+    def _check_max(self, q):
+        if q.cap_max < q.cap_min:
+            self._max_failures.add(q)
+        else:
+            self._max_failures.discard(q)
+
+    def _walk(self, q):
+        stack = [q]
+        while stack:
+            tmp = stack.pop()
+            yield tmp
+            stack.extend(tmp.subqueues)
+
+    def _check_subtree(self, q):
+        for tmp in self._walk(q):
+            self._check_sum(tmp)
+            self._check_max(tmp)
+
+    def _forget_subtree(self, q):
+        for tmp in self._walk(q):
+            self._sum_failures.discard(tmp)
+            self._max_failures.discard(tmp)
+
+    def capacity_changed(self, q):
+        """
+        Recheck after the capacity or maximum capacity of q changed
+        """
+
+        self._check_max(q)
+
+        if q.parent is not None:
+            self._check_sum(q.parent)
+
+    def structure_changed(self, q, added, removed):
+        """
+        Recheck after subqueues were added to or removed from q
+        """
+
+        for tmp in removed:
+            self._forget_subtree(tmp)
+
+        for tmp in added:
+            self._check_subtree(tmp)
+
+        self._check_sum(q)
+
+    def check_capacities(self):
+        """
+        Sorted names of queues whose subqueues' capacities do not sum to 100
+        """
+
+        return sorted(q.fqn for q in self._sum_failures)
+
+    def check_maximum_capacities(self):
+        """
+        Sorted names of queues whose maximum capacity is below their capacity
+        """
+
+        return sorted(q.fqn for q in self._max_failures)
+
+    def problems(self):
+        """
+        All current failures as a set of (check, queue name) tuples, where
+        check is 'capacity' or 'maximum-capacity'
+        """
+
+        return (set(('capacity', n) for n in self.check_capacities()) |
+                set(('maximum-capacity', n)
+                    for n in self.check_maximum_capacities()))
+
+    @property
+    def valid(self):
+        return not self._sum_failures and not self._max_failures
 
 
 class CapacityScheduler:
@@ -392,11 +803,50 @@ class CapacityScheduler:
     """
 
     def __init__(self, hxml):
+        self._root_queue = None
+        self.validator = None
         self.root_queue = Queue(name='root')
 
         if hxml is not None:
             self.root_queue = Queue.from_hxml(hxml, 'root')
 
+        self.mark_saved()
+
+    @property
+    def root_queue(self):
+        return self._root_queue
+
+    @root_queue.setter
+    def root_queue(self, q):
+        if self._root_queue is not None:
+            self._root_queue._validator = None
+
+        self._root_queue = q
+        self.validator = CapacityValidator(q)
+
+    @property
+    def content_hash(self):
+        """
+        The content hash of the root queue. See :py:attr:`Queue.content_hash`
+        """
+
+        return self.root_queue.content_hash
+
+    def mark_saved(self):
+        """
+        Remember the current configuration as the one on disk
+        """
+
+        self.saved_hash = self.content_hash
+
+    @property
+    def changed(self):
+        """
+        Whether the configuration differs from the one last loaded or saved
+        """
+
+        return self.content_hash != self.saved_hash
+
     @classmethod
     def from_file(cls, fname):
         """
@@ -457,7 +907,7 @@ class CapacityScheduler:
         100.0
         """
 
-        return sorted(self.root_queue.check_capacities())
+        return self.validator.check_capacities()
 
     def check_maximum_capacities(self):
         """
@@ -468,33 +918,170 @@ class CapacityScheduler:
         their guaranteed capacity.
         """
 
-        return sorted(self.root_queue.check_maximum_capacities())
+        return self.validator.check_maximum_capacities()
+
+    def problems(self):
+        """
+        All current sanity check failures. See
+        :py:meth:`CapacityValidator.problems`.
+        """
+
+        return self.validator.problems()
+
+
+class QueueReloader:
+    """
+    Runs ``yarn rmadmin -refreshQueues`` on behalf of many queue changes.
+
+    Each call to :py:meth:`request` marks a refresh as pending. With a
+    debounce of 0 the refresh runs right away; otherwise it runs once
+    debounce seconds pass without another request, so a burst of changes
+    costs a single refresh (and a single JVM start). A refresh is skipped
+    entirely when the content hash it is given is the one that was last
+    refreshed successfully.
+
+    If state_file is given, the last refreshed hash is kept there so that
+    separate processes share it.
+    """
+
+    def __init__(self, command=None, debounce=0, state_file=None):
+        self.command = command or REFRESH_QUEUES_COMMAND
+        self.debounce = debounce
+        self.state_file = state_file
+        self.refreshes = 0
+
+        self._lock = threading.Lock()
+        self._timer = None
+        self._pending = False
+        self._pending_hash = None
+        self._last_hash = None
+
+        if self.state_file:
+            self._last_hash = self._load_state()
+
+    @property
+    def last_hash(self):
+        """
+        The content hash of the last successful refresh, if known
+        """
+
+        return self._last_hash
+
+    def request(self, content_hash=None):
+        """
+        Ask for a refresh of the queues, which are now described by
+        content_hash. Returns the refresh's exit code if it ran right away,
+        or 0 if it was deferred.
+        """
+
+        with self._lock:
+            self._pending = True
+            self._pending_hash = content_hash
+
+            if self.debounce <= 0:
+                return self._flush()
+
+            if self._timer is not None:
+                self._timer.cancel()
+
+            self._timer = threading.Timer(self.debounce, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+        return 0
+
+    def flush(self):
+        """
+        Run the pending refresh now, if there is one. Returns its exit code.
+        """
+
+        with self._lock:
+            return self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self._pending:
+            return 0
+
+        self._pending = False
+        content_hash = self._pending_hash
+
+        if content_hash is not None and content_hash == self._last_hash:
+            return 0
+
+        ret = self._run()
+        if ret == 0:
+            self._last_hash = content_hash
+            self._save_state()
+
+        return ret
+
+    def _run(self):
+        import hadmin.runner
+
+        ret = hadmin.runner.run(self.command)
+
+        if ret.status == hadmin.runner.NOT_FOUND:
+            print('You do not have the ' + self.command[0] +
+                  ' binary on your system')
+            print("Please manually run '" + ' '.join(self.command) + "'")
+            return 1
+
+        self.refreshes += 1
+        if ret.status != 0:
+            print(ret.errors.strip())
+            print("Refreshing queues failed, please manually run '" +
+                  ' '.join(self.command) + "'")
+
+        return ret.status
+
+    def _load_state(self):
+        import json
+
+        try:
+            with open(self.state_file, 'r') as f:
+                raw = f.read().strip()
+        except (IOError, OSError):
+            return None
+
+        try:
+            return json.loads(raw).get('hash')
+        except (ValueError, AttributeError):
+            # Written before the state was JSON: just the hash
+            return raw or None
+
+    def _save_state(self):
+        import hadmin.cache
+
+        if not self.state_file:
+            return
+
+        # The queues are already refreshed, so failing to remember that is
+        # only a warning
+        hadmin.cache.write_json(self.state_file, {'hash': self._last_hash})
 
 
 class ResourceManager:
 
-    def __init__(self, hxml):
+    def __init__(self, hxml, reloader=None):
         self.hxml = hxml
+        self.reloader = reloader or QueueReloader()
 
     @property
     def address(self):
         return self.hxml['yarn.resourcemanager.hostname'] + ':8088'
 
-    def reload_queues():
-        """
-        Reloads queues. This calls other binaries using subprocess.
+    def reload_queues(self, content_hash=None):
         """
+        Reloads queues through this ResourceManager's
+        :py:class:`QueueReloader`. This calls other binaries using
+        :py:mod:`hadmin.runner`.
 
-        ret = subprocess.call('which yarn', shell=True)
-        if ret != 0:
-            print('You do not have the yarn binary on your system')
-            print("Please manually run 'yarn rmadmin -refreshQueues'")
-            return ret
-
-        ret = subprocess.call('yarn rmadmin -refreshQueues', shell=True)
-        if ret != 0:
-            print("Refreshing queues failed, please manually run " +
-                  "'yarn rmadmin -refreshQueues'")
-            return ret
+        If content_hash is given and matches the last refresh, nothing is
+        run.
+        """
 
-        return 0
+        return self.reloader.request(content_hash)
@@ -1,5 +1,12 @@
+from contextlib import redirect_stderr
+from io import StringIO
 from unittest2 import TestCase
-from hadmin.yarn import CapacityScheduler, Queue
+from hadmin.yarn import CapacityScheduler, Queue, QueueReloader
+import os
+import shutil
+import sys
+import tempfile
+import time
 
 
 class CapacitySchedulerTest(TestCase):
@@ -33,6 +40,15 @@ class CapacitySchedulerTest(TestCase):
         self.man.root_queue.subqueues.append(q)
         self.assertEqual(self.man.to_hxml()[tmp], 'a,b,staff')
 
+    def testRoundTrip(self):
+        copy = CapacityScheduler(self.man.to_hxml())
+
+        self.assertEqual(['root', 'root.a', 'root.b'], copy.queue_list())
+        self.assertEqual(self.man.content_hash, copy.content_hash)
+
+    def testUserLimitFactorLoaded(self):
+        self.assertEqual(25.0, self.man.queue('a').user_limit_factor)
+
     def testCapacityCheckSuccess(self):
         self.assertEqual(0, len(self.man.check_capacities()))
 
@@ -161,3 +177,247 @@ class QueueTest(TestCase):
     def testRootAdminsWithSubqueues(self):
         self.root.subqueues.append(Queue(name='test'))
         self.assertEqual(['*'], self.root.admins)
+
+
+class CapacityValidatorTest(TestCase):
+
+    def setUp(self):
+        self.man = CapacityScheduler.from_file('data/capacity-scheduler.xml')
+        self.a = self.man.queue('a')
+        self.b = self.man.queue('b')
+
+    def testValid(self):
+        self.assertTrue(self.man.validator.valid)
+
+    def testCapacityChange(self):
+        self.a.cap_min = self.a.cap_min + 1
+        self.assertEqual(['root'], self.man.check_capacities())
+
+    def testCapacityChangeFixed(self):
+        self.a.cap_min = self.a.cap_min + 1
+        self.b.cap_min = self.b.cap_min - 1
+        self.assertEqual([], self.man.check_capacities())
+
+    def testMaximumCapacity(self):
+        self.a.cap_max = 0
+        self.assertEqual(['root.a'], self.man.check_maximum_capacities())
+
+    def testProblems(self):
+        self.a.cap_max = 0
+        self.a.cap_min = self.a.cap_min + 1
+        self.assertEqual(set([('capacity', 'root'),
+                              ('maximum-capacity', 'root.a')]),
+                         self.man.problems())
+
+    def testNestedQueueNames(self):
+        q = Queue(name='sub')
+        q.cap_min = 50
+        self.a.subqueues.append(q)
+        self.assertEqual(['root.a'], self.man.check_capacities())
+        q.cap_min = 100
+        self.assertEqual([], self.man.check_capacities())
+
+    def testRemovedSubtreeForgotten(self):
+        self.a.cap_max = 0
+        self.man.root_queue.subqueues.remove(self.a)
+        self.assertEqual([], self.man.check_maximum_capacities())
+        self.assertEqual(['root'], self.man.check_capacities())
+
+    def testSubqueuesReplaced(self):
+        q = Queue(name='c')
+        self.man.root_queue.subqueues = [q]
+        self.assertEqual([], self.man.check_capacities())
+        self.assertEqual(self.man.root_queue, q.parent)
+
+    def testDeleteItem(self):
+        del self.man.root_queue.subqueues[0]
+        self.assertEqual(['root'], self.man.check_capacities())
+
+    def testPrecision(self):
+        self.a.cap_min = 100.0 / 3
+        self.b.cap_min = 100.0 / 3
+        q = Queue(name='c')
+        q.cap_min = 100.0 / 3
+        self.man.root_queue.subqueues.append(q)
+        self.assertEqual([], self.man.check_capacities())
+
+    def testRoundedThirds(self):
+        # Adds up to 99.99, which the ResourceManager accepts
+        for q in [self.a, self.b]:
+            q.cap_min = 33.33
+        q = Queue(name='c')
+        q.cap_min = 33.33
+        self.man.root_queue.subqueues.append(q)
+        self.assertEqual([], self.man.check_capacities())
+
+        q.cap_min = 33.2
+        self.assertEqual(['root'], self.man.check_capacities())
+
+    def testNewRootQueue(self):
+        q = Queue(name='root')
+        q.subqueues.append(Queue(name='x'))
+        q.subqueue('x').cap_min = 10
+        self.man.root_queue = q
+        self.assertEqual(['root'], self.man.check_capacities())
+
+    def testFqn(self):
+        self.assertEqual('root.a', self.a.fqn)
+
+
+class ContentHashTest(TestCase):
+
+    def setUp(self):
+        self.man = CapacityScheduler.from_file('data/capacity-scheduler.xml')
+        self.other = CapacityScheduler.from_file(
+                'data/capacity-scheduler.xml')
+        self.a = self.man.queue('a')
+        self.b = self.man.queue('b')
+
+    def testSameConfigSameHash(self):
+        self.assertEqual(self.other.content_hash, self.man.content_hash)
+
+    def testUnchanged(self):
+        self.assertFalse(self.man.changed)
+
+    def testCached(self):
+        self.man.content_hash
+        self.assertIsNotNone(self.a._hash)
+
+    def testCapacityInvalidatesUpward(self):
+        b_hash = self.b.content_hash
+        self.a.cap_min = 60
+        self.assertNotEqual(self.other.content_hash, self.man.content_hash)
+        self.assertEqual(b_hash, self.b.content_hash)
+        self.assertTrue(self.man.changed)
+
+    def testUserAppend(self):
+        self.man.content_hash
+        self.a.users.append('bob')
+        self.assertTrue(self.man.changed)
+
+    def testUserSetter(self):
+        self.man.content_hash
+        self.a.admins = ['bob']
+        self.assertTrue(self.man.changed)
+
+    def testRunning(self):
+        self.man.content_hash
+        self.b.running = False
+        self.assertTrue(self.man.changed)
+
+    def testUserLimitFactor(self):
+        self.man.content_hash
+        self.b.user_limit_factor = 3
+        self.assertTrue(self.man.changed)
+
+    def testSubqueueAdded(self):
+        self.man.content_hash
+        self.a.subqueues.append(Queue(name='x'))
+        self.assertTrue(self.man.changed)
+
+    def testChangedBack(self):
+        self.b.running = False
+        self.b.running = True
+        self.assertFalse(self.man.changed)
+
+    def testMarkSaved(self):
+        self.b.running = False
+        self.man.mark_saved()
+        self.assertFalse(self.man.changed)
+
+    def testDefaultAclNotShared(self):
+        q = Queue(name='x')
+        q.users.append('bob')
+        self.assertEqual([], Queue.DEFAULT_USER_LIST)
+
+
+class QueueReloaderTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.state = os.path.join(self.dir, 'refreshed-queues')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testRunsImmediately(self):
+        r = QueueReloader(command=['true'])
+        self.assertEqual(0, r.request('a'))
+        self.assertEqual(1, r.refreshes)
+        self.assertEqual('a', r.last_hash)
+
+    def testSkipsSameHash(self):
+        r = QueueReloader(command=['true'])
+        r.request('a')
+        r.request('a')
+        self.assertEqual(1, r.refreshes)
+        r.request('b')
+        self.assertEqual(2, r.refreshes)
+
+    def testNoHashAlwaysRuns(self):
+        r = QueueReloader(command=['true'])
+        r.request()
+        r.request()
+        self.assertEqual(2, r.refreshes)
+
+    def testFailureNotRecorded(self):
+        r = QueueReloader(command=['false'])
+        self.assertNotEqual(0, r.request('a'))
+        self.assertIsNone(r.last_hash)
+
+    def testMissingBinary(self):
+        r = QueueReloader(command=['hadmin-no-such-binary'])
+        self.assertEqual(1, r.request('a'))
+        self.assertEqual(0, r.refreshes)
+
+    def testExit127(self):
+        r = QueueReloader(command=[sys.executable, '-c',
+                                   'import sys; sys.exit(127)'])
+        self.assertEqual(127, r.request('a'))
+        self.assertEqual(1, r.refreshes)
+
+    def testDebounceCoalesces(self):
+        r = QueueReloader(command=['true'], debounce=60)
+        for h in ['a', 'b', 'c']:
+            self.assertEqual(0, r.request(h))
+        self.assertEqual(0, r.refreshes)
+        r.flush()
+        self.assertEqual(1, r.refreshes)
+        self.assertEqual('c', r.last_hash)
+        r.flush()
+        self.assertEqual(1, r.refreshes)
+
+    def testDebounceTimer(self):
+        r = QueueReloader(command=['true'], debounce=0.05)
+        r.request('a')
+        r.request('b')
+        for _ in range(100):
+            if r.last_hash is not None:
+                break
+            time.sleep(0.05)
+        self.assertEqual(1, r.refreshes)
+        self.assertEqual('b', r.last_hash)
+
+    def testStateFileShared(self):
+        QueueReloader(command=['true'], state_file=self.state).request('a')
+        r = QueueReloader(command=['true'], state_file=self.state)
+        self.assertEqual('a', r.last_hash)
+        r.request('a')
+        self.assertEqual(0, r.refreshes)
+
+    def testOldStateFile(self):
+        with open(self.state, 'w') as f:
+            f.write('a\n')
+
+        self.assertEqual('a', QueueReloader(state_file=self.state).last_hash)
+
+    def testUnwritableStateFile(self):
+        r = QueueReloader(command=['true'],
+                          state_file='/proc/nope/refreshed-queues')
+
+        err = StringIO()
+        with redirect_stderr(err):
+            self.assertEqual(0, r.request('a'))
+
+        self.assertEqual('a', r.last_hash)
+        self.assertIn('could not save', err.getvalue())